@@ -7,12 +7,19 @@ from typing import List, Dict, Optional, Union, Any
 import httpx
 import logging
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 # Добавляем корневую директорию проекта в sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config import ANTHROPIC_API_KEY, CLAUDE_MODEL, MAX_TOKENS_RESPONSE, GEMINI_API_KEY
+from config import (
+    ANTHROPIC_API_KEY, MAX_TOKENS_RESPONSE, MAX_INPUT_TOKENS, GEMINI_API_KEY,
+    MAX_DOCUMENT_CHARS, DOCUMENT_CHUNK_CHARS, SUMMARY_CONCURRENCY, SUMMARY_TREE_DIR
+)
 from ai.gemini_api import get_text_response as gemini_get_text_response
+from ai.image_payload import prepare_image, to_claude_content
+from ai.model_router import route_request, get_model_for_tier, track_latency
+from ai.token_budget import PromptBudget, estimate_tokens, PRIORITY_SYSTEM, PRIORITY_QUESTION, PRIORITY_DOCUMENT, PRIORITY_SUMMARY, PRIORITY_HISTORY
 
 # Инициализация клиента Claude
 client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
@@ -25,23 +32,15 @@ def encode_image_to_base64(image_path: str) -> str:
 def create_image_content(image_path: str) -> Dict[str, Any]:
     """Создает содержимое с изображением для отправки в Claude"""
     mime_type, _ = mimetypes.guess_type(image_path)
-    if not mime_type:
-        mime_type = 'application/octet-stream'
-    
-    if not mime_type.startswith('image/'):
+    if mime_type and not mime_type.startswith('image/'):
         raise ValueError(f"Файл {image_path} не является изображением")
     
-    base64_image = encode_image_to_base64(image_path)
-    return {
-        "type": "image",
-        "source": {
-            "type": "base64",
-            "media_type": mime_type,
-            "data": base64_image
-        }
-    }
+    # Формат определяется по содержимому, размер приводится к ограничениям Claude
+    return to_claude_content(prepare_image(image_path, "claude"))
 
-def get_text_response(user_message: str, system_prompt: str = None, max_tokens: int = MAX_TOKENS_RESPONSE) -> str:
+def get_text_response(user_message: str, system_prompt: str = None, max_tokens: int = MAX_TOKENS_RESPONSE, command: Optional[str] = None,
+                      history: Optional[List[Dict[str, str]]] = None, context_summary: Optional[str] = None,
+                      fit_budget: bool = True) -> str:
     """
     Получает ответ от модели Claude на текстовый запрос
     
@@ -49,22 +48,50 @@ def get_text_response(user_message: str, system_prompt: str = None, max_tokens:
         user_message: Сообщение пользователя
         system_prompt: Системный промпт для модели (опционально)
         max_tokens: Максимальное количество токенов в ответе
+        command: Тип команды для выбора модели (опционально)
+        history: Предыдущие реплики диалога [{"role", "content"}] (опционально)
+        context_summary: Сводка более ранней части диалога (опционально)
+        fit_budget: Укладывать промпт в бюджет входных токенов (False, если вызывающий код уже сделал это)
         
     Returns:
         Ответ модели
     """
+    history = history or []
+    
+    # Выбираем модель по сложности запроса
+    tier, model = route_request(user_message, command)
+    
     try:
         # Если system_prompt не указан, используем дефолтное значение
         if not system_prompt:
             system_prompt = "Вы полезный ассистент, который отвечает на вопросы пользователя. Ваши ответы должны быть информативными и точными."
         
+        # Укладываем промпт в бюджет входных токенов (старые реплики сокращаются первыми)
+        budget = (PromptBudget("Claude: текстовый запрос")
+                  .add("system", system_prompt, PRIORITY_SYSTEM)
+                  .add("question", user_message, PRIORITY_QUESTION)
+                  .add("summary", context_summary, PRIORITY_SUMMARY))
+        for i, item in enumerate(history):
+            budget.add(f"history_{i}", item["content"], PRIORITY_HISTORY - len(history) + i)
+        # Промпт, уже уложенный в бюджет вызывающим кодом, повторно не сокращаем
+        texts = budget.fit() if fit_budget else {section["name"]: section["text"] for section in budget.sections}
+        
+        system_prompt, user_message = texts["system"], texts["question"]
+        if texts["summary"]:
+            system_prompt += f"\n\nКраткое содержание предыдущей части диалога:\n{texts['summary']}"
+        history = [
+            {"role": item["role"], "content": texts[f"history_{i}"]}
+            for i, item in enumerate(history) if texts[f"history_{i}"]
+        ]
+        
         # Создаем сообщение
-        response = client.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=max_tokens,
-            system=system_prompt,
-            messages=[{"role": "user", "content": user_message}]
-        )
+        with track_latency(tier, model):
+            response = client.messages.create(
+                model=model,
+                max_tokens=max_tokens,
+                system=system_prompt,
+                messages=[*history, {"role": "user", "content": user_message}]
+            )
         
         # Возвращаем текст ответа
         return response.content[0].text
@@ -74,7 +101,7 @@ def get_text_response(user_message: str, system_prompt: str = None, max_tokens:
         # Если произошла ошибка, пробуем использовать Gemini API
         try:
             logging.info("Пробуем использовать Gemini API для получения ответа")
-            gemini_response = gemini_get_text_response(user_message, system_prompt)
+            gemini_response = gemini_get_text_response(user_message, system_prompt, get_model_for_tier(tier, "gemini"), history, fit_budget=False)
             return gemini_response
         except Exception as gemini_error:
             logging.error(f"Ошибка при использовании Gemini API: {gemini_error}")
@@ -93,36 +120,34 @@ def get_response_with_images(user_message: str, image_paths: List[str], system_p
     Returns:
         Ответ модели
     """
+    tier, model = route_request(user_message, "image")
+    
     try:
         # Если system_prompt не указан, используем дефолтное значение
         if not system_prompt:
             system_prompt = "Вы полезный ассистент, который анализирует изображения и отвечает на вопросы пользователя. Ваши ответы должны быть информативными и точными."
         
+        texts = (PromptBudget("Claude: запрос с изображениями")
+                 .add("system", system_prompt, PRIORITY_SYSTEM)
+                 .add("question", user_message, PRIORITY_QUESTION)
+                 .fit())
+        system_prompt, user_message = texts["system"], texts["question"]
+        
         # Создаем сообщение
         messages = [{"role": "user", "content": [{"type": "text", "text": user_message}]}]
         
         # Добавляем изображения
         for image_path in image_paths:
-            with open(image_path, "rb") as f:
-                image_data = f.read()
-            
-            # Добавляем изображение в сообщение
-            messages[0]["content"].append({
-                "type": "image",
-                "source": {
-                    "type": "base64",
-                    "media_type": "image/jpeg",
-                    "data": image_data.hex()
-                }
-            })
+            messages[0]["content"].append(create_image_content(image_path))
         
         # Отправляем запрос
-        response = client.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=max_tokens,
-            system=system_prompt,
-            messages=messages
-        )
+        with track_latency(tier, model):
+            response = client.messages.create(
+                model=model,
+                max_tokens=max_tokens,
+                system=system_prompt,
+                messages=messages
+            )
         
         # Возвращаем текст ответа
         return response.content[0].text
@@ -132,10 +157,9 @@ def get_response_with_images(user_message: str, image_paths: List[str], system_p
         # Если произошла ошибка, пробуем использовать Gemini API
         try:
             logging.info("Пробуем использовать Gemini API для анализа изображений")
-            from ai.gemini_api import analyze_image
-            # Используем первое изображение для анализа (если есть)
+            from ai.gemini_api import get_response_with_images as gemini_get_response_with_images
             if image_paths:
-                gemini_response = analyze_image(image_paths[0], user_message)
+                gemini_response = gemini_get_response_with_images(user_message, image_paths, system_prompt)
                 return gemini_response
             else:
                 return f"Произошла ошибка при обработке изображений: {e}"
@@ -143,31 +167,85 @@ def get_response_with_images(user_message: str, image_paths: List[str], system_p
             logging.error(f"Ошибка при использовании Gemini API для изображений: {gemini_error}")
             return f"Произошла ошибка при обработке вашего запроса с изображениями: {e}"
 
-def analyze_document(text: str, question: Optional[str] = None) -> str:
+def build_cached_system(system_prompt: str) -> List[Dict[str, Any]]:
+    """Создает системный промпт с точкой кэширования для Claude"""
+    return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+
+def get_document_block(text: str) -> Dict[str, Any]:
+    """
+    Создает блок с текстом документа и точкой кэширования
+    
+    Блок детерминирован: одинаковый текст дает тот же префикс запроса, поэтому
+    повторные вопросы к документу попадают в кэш Anthropic.
+    
+    Args:
+        text: Текст документа
+        
+    Returns:
+        Блок содержимого для сообщения Claude
+    """
+    return {
+        "type": "text",
+        "text": f"Вот документ для анализа:\n\n{text}",
+        "cache_control": {"type": "ephemeral"}
+    }
+
+def log_cache_usage(response: Any, label: str) -> None:
+    """Записывает в лог статистику использования кэша промптов"""
+    usage = getattr(response, "usage", None)
+    if not usage:
+        return
+    
+    cache_read = getattr(usage, "cache_read_input_tokens", 0) or 0
+    cache_write = getattr(usage, "cache_creation_input_tokens", 0) or 0
+    logging.info(
+        f"{label}: входные токены {usage.input_tokens}, прочитано из кэша {cache_read}, "
+        f"записано в кэш {cache_write}, выходные токены {usage.output_tokens}"
+    )
+
+def analyze_document(text: str, question: Optional[str] = None, file_path: Optional[str] = None) -> str:
     """
     Анализирует документ с помощью Claude
     
     Args:
         text: Текст документа
         question: Вопрос о документе (опционально)
+        file_path: Путь к файлу документа для кэширования промпта (опционально)
         
     Returns:
         Результат анализа
     """
+    system_prompt = "Вы эксперт по анализу документов. Ваша задача - анализировать документы и отвечать на вопросы о них."
+    
     try:
-        # Подготавливаем промпт
+        tier, model = route_request(text, "document")
+        
+        # Подготавливаем промпт: документ идет первым блоком, чтобы вопросы к нему использовали кэш
         if question:
-            prompt = f"Вот документ для анализа:\n\n{text}\n\nВопрос: {question}\n\nПожалуйста, дайте подробный ответ на вопрос на основе содержимого документа."
+            instruction = f"Вопрос: {question}\n\nПожалуйста, дайте подробный ответ на вопрос на основе содержимого документа."
         else:
-            prompt = f"Вот документ для анализа:\n\n{text}\n\nПожалуйста, проанализируйте его и выделите основные идеи, ключевые моменты и важные детали."
+            instruction = "Пожалуйста, проанализируйте его и выделите основные идеи, ключевые моменты и важные детали."
+        
+        # Сокращаем документ, если промпт не помещается в бюджет входных токенов
+        texts = (PromptBudget(f"Анализ документа {file_path or ''}".strip())
+                 .add("system", system_prompt, PRIORITY_SYSTEM)
+                 .add("question", instruction, PRIORITY_QUESTION)
+                 .add("document", text, PRIORITY_DOCUMENT, min_tokens=1000)
+                 .fit())
+        text = texts["document"]
+        
+        content = [get_document_block(text), {"type": "text", "text": instruction}]
         
         # Получаем ответ от модели
-        response = client.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=MAX_TOKENS_RESPONSE,
-            system="Вы эксперт по анализу документов. Ваша задача - анализировать документы и отвечать на вопросы о них.",
-            messages=[{"role": "user", "content": prompt}]
-        )
+        with track_latency(tier, model):
+            response = client.messages.create(
+                model=model,
+                max_tokens=MAX_TOKENS_RESPONSE,
+                system=build_cached_system(system_prompt),
+                messages=[{"role": "user", "content": content}]
+            )
+        
+        log_cache_usage(response, f"Анализ документа {file_path or ''}".strip())
         
         # Возвращаем ответ
         return response.content[0].text
@@ -179,7 +257,8 @@ def analyze_document(text: str, question: Optional[str] = None) -> str:
             logging.info("Пробуем использовать Gemini API для анализа документа")
             gemini_response = gemini_get_text_response(
                 f"Анализ документа:\n\n{text}\n\n{'Вопрос: ' + question if question else 'Проанализируйте документ и выделите основные идеи, ключевые моменты и важные детали.'}",
-                "Вы эксперт по анализу документов. Ваша задача - анализировать документы и отвечать на вопросы о них."
+                system_prompt,
+                fit_budget=False
             )
             return gemini_response
         except Exception as gemini_error:
@@ -199,19 +278,31 @@ def generate_project_ideas(field: str, goals: str, constraints: Optional[str] =
         Сгенерированные идеи
     """
     try:
+        tier, model = route_request(goals, "ideas")
+        
         # Подготавливаем промпт
         if constraints:
             prompt = f"Генерация идей для проекта в области: {field}.\n\nЦели проекта: {goals}.\n\nОграничения: {constraints}.\n\nПредложите 5-7 креативных и практичных идей для маркетингового проекта, учитывая указанные цели и ограничения."
         else:
             prompt = f"Генерация идей для проекта в области: {field}.\n\nЦели проекта: {goals}.\n\nПредложите 5-7 креативных и практичных идей для маркетингового проекта, учитывая указанные цели."
         
+        system_prompt = "Вы креативный маркетолог с опытом генерации идей для проектов в различных областях. Ваша задача - предложить креативные и практичные идеи для маркетинговых проектов, учитывая цели и ограничения."
+        
+        # Укладываем промпт в бюджет входных токенов
+        texts = (PromptBudget("Генерация идей")
+                 .add("system", system_prompt, PRIORITY_SYSTEM)
+                 .add("question", prompt, PRIORITY_QUESTION)
+                 .fit())
+        prompt = texts["question"]
+        
         # Получаем ответ от модели
-        response = client.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=MAX_TOKENS_RESPONSE,
-            system="Вы креативный маркетолог с опытом генерации идей для проектов в различных областях. Ваша задача - предложить креативные и практичные идеи для маркетинговых проектов, учитывая цели и ограничения.",
-            messages=[{"role": "user", "content": prompt}]
-        )
+        with track_latency(tier, model):
+            response = client.messages.create(
+                model=model,
+                max_tokens=MAX_TOKENS_RESPONSE,
+                system=system_prompt,
+                messages=[{"role": "user", "content": prompt}]
+            )
         
         # Возвращаем ответ
         return response.content[0].text
@@ -223,7 +314,8 @@ def generate_project_ideas(field: str, goals: str, constraints: Optional[str] =
             logging.info("Пробуем использовать Gemini API для генерации идей")
             gemini_response = gemini_get_text_response(
                 prompt,
-                "Вы креативный маркетолог с опытом генерации идей для проектов в различных областях. Ваша задача - предложить креативные и практичные идеи для маркетинговых проектов, учитывая цели и ограничения."
+                system_prompt,
+                fit_budget=False
             )
             return gemini_response
         except Exception as gemini_error:
@@ -241,16 +333,28 @@ def analyze_market_trends(industry: str) -> str:
         Результат анализа
     """
     try:
+        tier, model = route_request(industry, "market")
+        
         # Подготавливаем промпт
         prompt = f"Анализ рыночных трендов в отрасли: {industry}.\n\nПожалуйста, проанализируйте текущие тренды, тенденции и перспективы развития в этой отрасли. Включите информацию о ключевых игроках, инновациях, потребительских предпочтениях и прогнозах на ближайшие 1-2 года."
         
+        system_prompt = "Вы эксперт по рыночным исследованиям и анализу трендов. Ваша задача - предоставить комплексный анализ трендов и тенденций в указанной отрасли, основываясь на ваших знаниях о рынке."
+        
+        # Укладываем промпт в бюджет входных токенов
+        texts = (PromptBudget("Анализ рыночных трендов")
+                 .add("system", system_prompt, PRIORITY_SYSTEM)
+                 .add("question", prompt, PRIORITY_QUESTION)
+                 .fit())
+        prompt = texts["question"]
+        
         # Получаем ответ от модели
-        response = client.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=MAX_TOKENS_RESPONSE,
-            system="Вы эксперт по рыночным исследованиям и анализу трендов. Ваша задача - предоставить комплексный анализ трендов и тенденций в указанной отрасли, основываясь на ваших знаниях о рынке.",
-            messages=[{"role": "user", "content": prompt}]
-        )
+        with track_latency(tier, model):
+            response = client.messages.create(
+                model=model,
+                max_tokens=MAX_TOKENS_RESPONSE,
+                system=system_prompt,
+                messages=[{"role": "user", "content": prompt}]
+            )
         
         # Возвращаем ответ
         return response.content[0].text
@@ -262,9 +366,243 @@ def analyze_market_trends(industry: str) -> str:
             logging.info("Пробуем использовать Gemini API для анализа рыночных трендов")
             gemini_response = gemini_get_text_response(
                 prompt,
-                "Вы эксперт по рыночным исследованиям и анализу трендов. Ваша задача - предоставить комплексный анализ трендов и тенденций в указанной отрасли, основываясь на ваших знаниях о рынке."
+                system_prompt,
+                fit_budget=False
             )
             return gemini_response
         except Exception as gemini_error:
             logging.error(f"Ошибка при использовании Gemini API для анализа трендов: {gemini_error}")
-            return f"Произошла ошибка при анализе трендов рынка: {e}" 
\ No newline at end of file
+            return f"Произошла ошибка при анализе трендов рынка: {e}"
+
+def summarize_chunk(text: str, index: int, total: int, level: int = 0) -> str:
+    """
+    Составляет резюме одного фрагмента документа или группы резюме
+    
+    Args:
+        text: Текст фрагмента
+        index: Номер фрагмента (с 1)
+        total: Общее количество фрагментов на уровне
+        level: Уровень дерева (0 - исходный текст, далее - резюме резюме)
+        
+    Returns:
+        Резюме фрагмента
+        
+    Raises:
+        RuntimeError: Если фрагмент не удалось суммировать ни через Claude, ни через Gemini
+    """
+    system_prompt = "Вы эксперт по анализу документов. Ваша задача - сжимать фрагменты документов без потери фактов, цифр, названий и выводов."
+    if level == 0:
+        prompt = f"Это фрагмент {index} из {total} большого документа:\n\n{text}\n\nСоставьте подробное конспективное резюме фрагмента. Сохраните все важные факты, цифры, даты, названия и выводы."
+    else:
+        prompt = f"Это резюме частей документа (группа {index} из {total}):\n\n{text}\n\nОбъедините их в одно связное резюме, сохранив все важные факты, цифры, даты, названия и выводы."
+    
+    texts = (PromptBudget(f"Суммирование фрагмента {index}/{total}")
+             .add("system", system_prompt, PRIORITY_SYSTEM)
+             .add("document", prompt, PRIORITY_DOCUMENT)
+             .fit())
+    prompt = texts["document"]
+    
+    tier, model = route_request(text, "summary")
+    
+    try:
+        with track_latency(tier, model):
+            response = client.messages.create(
+                model=model,
+                max_tokens=MAX_TOKENS_RESPONSE,
+                system=system_prompt,
+                messages=[{"role": "user", "content": prompt}]
+            )
+        return response.content[0].text
+    except Exception as e:
+        logging.error(f"Ошибка при суммировании фрагмента {index}/{total} (уровень {level}): {e}")
+        
+        # Пробуем Gemini, если Claude недоступен
+        logging.info("Пробуем использовать Gemini API для суммирования фрагмента")
+        summary = gemini_get_text_response(prompt, system_prompt, get_model_for_tier(tier, "gemini"), fit_budget=False)
+        # Gemini возвращает ошибку строкой - она не должна попасть в дерево резюме
+        if summary.startswith("Ошибка"):
+            raise RuntimeError(f"Не удалось суммировать фрагмент {index}/{total} (уровень {level}): {summary}")
+        return summary
+
+def _group_summaries(summaries: List[str], max_chars: int) -> List[List[str]]:
+    """Группирует резюме так, чтобы каждая группа помещалась в один запрос (минимум по два резюме)"""
+    groups = []
+    current = []
+    size = 0
+    for summary in summaries:
+        if current and len(current) >= 2 and size + len(summary) > max_chars:
+            groups.append(current)
+            current = []
+            size = 0
+        current.append(summary)
+        size += len(summary)
+    if current:
+        # Одиночное резюме присоединяем к предыдущей группе, чтобы дерево сходилось
+        if len(current) == 1 and groups:
+            groups[-1].extend(current)
+        else:
+            groups.append(current)
+    return groups
+
+def _summary_tree_path(document_key: str) -> str:
+    """Возвращает путь к файлу дерева резюме документа"""
+    return os.path.join(SUMMARY_TREE_DIR, f"{document_key}.json")
+
+def load_summary_tree(document_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Загружает сохраненное дерево резюме документа
+    
+    Args:
+        document_key: Ключ документа (SHA-256 текста)
+        
+    Returns:
+        Дерево резюме или None, если оно еще не построено
+    """
+    tree_path = _summary_tree_path(document_key)
+    if not os.path.exists(tree_path):
+        return None
+    
+    try:
+        with open(tree_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logging.error(f"Ошибка при чтении дерева резюме {tree_path}: {e}")
+        return None
+
+def build_summary_tree(chunks: List[str], document_key: str) -> Dict[str, Any]:
+    """
+    Строит дерево резюме документа (map-reduce) и сохраняет его на диск
+    
+    Фрагменты суммируются параллельно (не более SUMMARY_CONCURRENCY запросов одновременно),
+    затем резюме иерархически объединяются, пока не останется одно.
+    
+    Args:
+        chunks: Фрагменты документа
+        document_key: Ключ документа (SHA-256 текста)
+        
+    Returns:
+        Дерево резюме: {"document_key", "levels": [[резюме уровня 0], ...], "root"}
+        
+    Raises:
+        RuntimeError: Если не удалось суммировать хотя бы один фрагмент (дерево при этом не сохраняется)
+    """
+    levels = []
+    current = chunks
+    level = 0
+    
+    with ThreadPoolExecutor(max_workers=max(1, SUMMARY_CONCURRENCY)) as executor:
+        while True:
+            total = len(current)
+            logging.info(f"Суммирование документа {document_key[:12]}: уровень {level}, фрагментов {total}")
+            summaries = list(executor.map(
+                lambda item: summarize_chunk(item[1], item[0] + 1, total, level),
+                enumerate(current)
+            ))
+            levels.append(summaries)
+            
+            if len(summaries) == 1:
+                break
+            
+            current = ["\n\n".join(group) for group in _group_summaries(summaries, DOCUMENT_CHUNK_CHARS)]
+            level += 1
+    
+    tree = {
+        "document_key": document_key,
+        "chunk_count": len(chunks),
+        "levels": levels,
+        "root": levels[-1][0]
+    }
+    
+    # Сохраняем дерево, чтобы повторные вопросы не требовали повторного чтения документа
+    try:
+        os.makedirs(SUMMARY_TREE_DIR, exist_ok=True)
+        with open(_summary_tree_path(document_key), "w", encoding="utf-8") as f:
+            json.dump(tree, f, ensure_ascii=False)
+    except Exception as e:
+        logging.error(f"Ошибка при сохранении дерева резюме: {e}")
+    
+    return tree
+
+def analyze_document_with_tree(tree: Dict[str, Any], question: Optional[str] = None, file_path: Optional[str] = None) -> str:
+    """
+    Отвечает на вопрос о большом документе по его дереву резюме
+    
+    Используется самый подробный уровень дерева, который помещается в контекст.
+    
+    Args:
+        tree: Дерево резюме документа
+        question: Вопрос о документе (опционально)
+        file_path: Путь к файлу документа для кэширования промпта (опционально)
+        
+    Returns:
+        Результат анализа
+    """
+    for summaries in tree["levels"]:
+        if sum(len(summary) for summary in summaries) <= MAX_DOCUMENT_CHARS:
+            break
+    else:
+        summaries = [tree["root"]]
+    
+    text = "Документ слишком большой, поэтому ниже приведены резюме его частей по порядку.\n\n"
+    text += "\n\n".join(f"[Часть {i}]\n{summary}" for i, summary in enumerate(summaries, 1))
+    
+    return analyze_document(text, question, file_path)
+
+def answer_with_passages(question: str, passages: List[Dict[str, Any]]) -> str:
+    """
+    Отвечает на вопрос по найденным фрагментам документов
+    
+    Args:
+        question: Вопрос пользователя
+        passages: Фрагменты документов из поискового индекса
+        
+    Returns:
+        Ответ модели
+    """
+    system_prompt = "Вы эксперт по анализу документов. Отвечайте на вопросы строго на основе приведенных фрагментов документов и указывайте, из какого документа взята информация. Если во фрагментах нет ответа, так и скажите."
+    
+    blocks = [
+        f"[Фрагмент {i}, документ «{passage['document_name']}»]\n{passage['text']}"
+        for i, passage in enumerate(passages, 1)
+    ]
+    # Фрагменты отсортированы по релевантности: отбрасываем целые фрагменты с конца списка,
+    # пока они не уложатся в бюджет, чтобы не резать середину самых релевантных
+    available = MAX_INPUT_TOKENS - estimate_tokens(system_prompt) - estimate_tokens(question)
+    used = 0
+    for count, block in enumerate(blocks):
+        used += estimate_tokens(block)
+        if count and used > available:
+            logging.info(f"Ответ по фрагментам документов: отброшено фрагментов {len(blocks) - count} из {len(blocks)}")
+            blocks = blocks[:count]
+            break
+    context = "\n\n".join(blocks)
+    # Единственный оставшийся фрагмент или слишком длинный вопрос по-прежнему сокращаются бюджетом
+    texts = (PromptBudget("Ответ по фрагментам документов")
+             .add("system", system_prompt, PRIORITY_SYSTEM)
+             .add("question", question, PRIORITY_QUESTION)
+             .add("document", context, PRIORITY_DOCUMENT, min_tokens=500)
+             .fit())
+    prompt = f"Фрагменты документов проекта:\n\n{texts['document']}\n\nВопрос: {texts['question']}"
+    
+    tier, model = route_request(prompt, "document")
+    
+    try:
+        with track_latency(tier, model):
+            response = client.messages.create(
+                model=model,
+                max_tokens=MAX_TOKENS_RESPONSE,
+                system=system_prompt,
+                messages=[{"role": "user", "content": prompt}]
+            )
+        
+        return response.content[0].text
+    except Exception as e:
+        logging.error(f"Ошибка при ответе по фрагментам документов: {e}")
+        
+        # Если произошла ошибка, пробуем использовать Gemini API
+        try:
+            logging.info("Пробуем использовать Gemini API для ответа по фрагментам документов")
+            return gemini_get_text_response(prompt, system_prompt, fit_budget=False)
+        except Exception as gemini_error:
+            logging.error(f"Ошибка при использовании Gemini API для ответа по фрагментам: {gemini_error}")
+            return f"Произошла ошибка при поиске ответа в документах: {e}"
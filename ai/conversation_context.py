@@ -0,0 +1,131 @@
+import sys
+import os
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import CONTEXT_RECENT_TURNS, CONTEXT_MESSAGE_MAX_TOKENS, CONTEXT_SUMMARY_MAX_TOKENS
+from database.db_operations import get_conversation_by_id, get_recent_messages, get_messages_in_range, update_conversation_summary
+from ai.token_budget import truncate_to_tokens
+from ai.claude_api import get_text_response
+
+# Минимальное количество новых сообщений вне окна для обновления сводки
+SUMMARY_MIN_BATCH = 2
+
+# Диалоги, сводка которых обновляется прямо сейчас
+_summaries_in_progress = set()
+_summaries_lock = threading.Lock()
+
+# Ссылки на фоновые задачи, чтобы их не удалил сборщик мусора
+_background_tasks = set()
+
+def _message_role(sender_type: str) -> str:
+    """Преобразует тип отправителя из базы данных в роль для API модели"""
+    return "assistant" if sender_type == "bot" else "user"
+
+def build_conversation_context(conversation_id: int) -> Tuple[Optional[str], List[Dict[str, str]]]:
+    """
+    Собирает контекст диалога: сводку старой части и последние реплики целиком
+
+    Размер контекста ограничен независимо от длины диалога: не более
+    CONTEXT_RECENT_TURNS пар реплик по CONTEXT_MESSAGE_MAX_TOKENS токенов и сводка.
+
+    Args:
+        conversation_id: ID диалога
+
+    Returns:
+        Кортеж (сводка или None, список сообщений [{"role", "content"}])
+    """
+    conversation = get_conversation_by_id(conversation_id)
+    recent = get_recent_messages(conversation_id, CONTEXT_RECENT_TURNS * 2)
+
+    history = []
+    for message in recent:
+        role = _message_role(message.sender_type)
+        content = truncate_to_tokens(message.content, CONTEXT_MESSAGE_MAX_TOKENS)
+        # API требует чередования ролей, поэтому подряд идущие реплики объединяем
+        if history and history[-1]["role"] == role:
+            history[-1]["content"] += f"\n\n{content}"
+        else:
+            history.append({"role": role, "content": content})
+
+    # Диалог для модели должен начинаться с реплики пользователя
+    while history and history[0]["role"] != "user":
+        history.pop(0)
+
+    # Последняя реплика перед новым вопросом должна быть ответом ассистента
+    if history and history[-1]["role"] == "user":
+        history.pop()
+
+    summary = conversation.summary if conversation else None
+    return summary, history
+
+def update_rolling_summary(conversation_id: int) -> bool:
+    """
+    Добавляет в сводку диалога сообщения, вышедшие за окно последних реплик
+
+    Args:
+        conversation_id: ID диалога
+
+    Returns:
+        True, если сводка обновлена
+    """
+    with _summaries_lock:
+        if conversation_id in _summaries_in_progress:
+            return False
+        _summaries_in_progress.add(conversation_id)
+
+    try:
+        conversation = get_conversation_by_id(conversation_id)
+        recent = get_recent_messages(conversation_id, CONTEXT_RECENT_TURNS * 2)
+        if not conversation or not recent:
+            return False
+
+        # Сообщения старше окна, которые еще не вошли в сводку
+        pending = get_messages_in_range(conversation_id, conversation.summarized_until_id, recent[0].id)
+        if len(pending) < SUMMARY_MIN_BATCH:
+            return False
+
+        dialog = "\n".join(
+            f"{'Пользователь' if message.sender_type == 'user' else 'Ассистент'}: "
+            f"{truncate_to_tokens(message.content, CONTEXT_MESSAGE_MAX_TOKENS)}"
+            for message in pending
+        )
+
+        system_prompt = "Вы ведете краткую сводку диалога маркетолога с ассистентом. Сохраняйте факты о проекте, бизнесе, решения, цифры и договоренности, опускайте приветствия и повторы."
+        prompt = (
+            f"Текущая сводка диалога:\n{conversation.summary or '(пока пусто)'}\n\n"
+            f"Новые сообщения:\n{dialog}\n\n"
+            "Обновите сводку с учетом новых сообщений. Верните только текст сводки."
+        )
+
+        summary = get_text_response(prompt, system_prompt, max_tokens=CONTEXT_SUMMARY_MAX_TOKENS, command="summary")
+
+        # При недоступности моделей вместо сводки возвращается текст ошибки
+        if not summary or summary.startswith(("Произошла ошибка", "Ошибка")):
+            return False
+
+        update_conversation_summary(conversation_id, summary, pending[-1].id)
+        logging.info(f"Сводка диалога {conversation_id} обновлена: добавлено {len(pending)} сообщений")
+        return True
+    except Exception as e:
+        logging.error(f"Ошибка при обновлении сводки диалога {conversation_id}: {e}")
+        return False
+    finally:
+        with _summaries_lock:
+            _summaries_in_progress.discard(conversation_id)
+
+def schedule_summary_update(conversation_id: int) -> None:
+    """
+    Запускает обновление сводки диалога в фоне, не задерживая ответ пользователю
+
+    Args:
+        conversation_id: ID диалога
+    """
+    task = asyncio.get_running_loop().create_task(asyncio.to_thread(update_rolling_summary, conversation_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
@@ -1,36 +1,100 @@
 import google.generativeai as genai
 import sys
 import os
-import PIL.Image
+import json
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Optional, Union, Any
 
 # Добавляем корневую директорию проекта в sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import GEMINI_API_KEY, GEMINI_MODEL, MAX_TOKENS_RESPONSE
+from ai.token_budget import PromptBudget, PRIORITY_SYSTEM, PRIORITY_QUESTION, PRIORITY_DOCUMENT
+from ai.image_payload import prepare_image, to_gemini_part
 
 # Инициализация клиента Gemini
 genai.configure(api_key=GEMINI_API_KEY)
 
-def get_text_response(prompt: str, system_prompt: Optional[str] = None) -> str:
+# Максимальное количество настроенных моделей в пуле
+MAX_POOLED_MODELS = 32
+
+# Пул моделей: (модель, системная инструкция, параметры генерации) -> GenerativeModel
+_models: "OrderedDict[tuple, genai.GenerativeModel]" = OrderedDict()
+_pool_lock = threading.Lock()
+
+def get_model(model_name: Optional[str] = None, system_instruction: Optional[str] = None,
+              generation_config: Optional[Dict[str, Any]] = None) -> genai.GenerativeModel:
+    """
+    Возвращает настроенную модель Gemini из пула, создавая ее при первом обращении
+    
+    Args:
+        model_name: Имя модели (опционально, по умолчанию GEMINI_MODEL)
+        system_instruction: Системная инструкция (опционально)
+        generation_config: Параметры генерации (опционально)
+        
+    Returns:
+        Объект модели Gemini
+    """
+    key = (
+        model_name or GEMINI_MODEL,
+        system_instruction or None,
+        json.dumps(generation_config, sort_keys=True) if generation_config else None
+    )
+    
+    with _pool_lock:
+        model = _models.get(key)
+        if model is not None:
+            _models.move_to_end(key)
+            return model
+        
+        model = genai.GenerativeModel(
+            key[0],
+            system_instruction=key[1],
+            generation_config=generation_config
+        )
+        _models[key] = model
+        while len(_models) > MAX_POOLED_MODELS:
+            _models.popitem(last=False)
+        return model
+
+def to_gemini_history(history: Optional[List[Dict[str, str]]]) -> List[Dict[str, Any]]:
+    """Преобразует историю диалога [{"role", "content"}] в формат Gemini"""
+    return [
+        {"role": "model" if item["role"] == "assistant" else "user", "parts": [item["content"]]}
+        for item in history or []
+    ]
+
+def get_text_response(prompt: str, system_prompt: Optional[str] = None, model_name: Optional[str] = None,
+                      history: Optional[List[Dict[str, str]]] = None, fit_budget: bool = True) -> str:
     """
     Получает текстовый ответ от Gemini по текстовому запросу
     
     Args:
         prompt: Текст запроса
         system_prompt: Системный промпт (инструкции для модели)
+        model_name: Имя модели (опционально, по умолчанию GEMINI_MODEL)
+        history: Предыдущие реплики диалога [{"role", "content"}] (опционально)
+        fit_budget: Укладывать промпт в бюджет входных токенов (False, если вызывающий код уже сделал это)
         
     Returns:
         Текстовый ответ от модели
     """
     try:
-        model = genai.GenerativeModel(GEMINI_MODEL)
+        # Укладываем промпт в бюджет входных токенов
+        if fit_budget:
+            texts = (PromptBudget("Gemini: текстовый запрос")
+                     .add("system", system_prompt, PRIORITY_SYSTEM)
+                     .add("question", prompt, PRIORITY_QUESTION)
+                     .fit())
+            prompt = texts["question"]
+        
+        # Системный промпт передается нативно как system_instruction модели из пула
+        model = get_model(model_name, system_prompt)
         
-        if system_prompt:
-            chat = model.start_chat(history=[])
-            response = chat.send_message(
-                f"{system_prompt}\n\n{prompt}"
-            )
+        if history:
+            # История передается репликами одного запроса, без промежуточной чат-сессии
+            response = model.generate_content([*to_gemini_history(history), {"role": "user", "parts": [prompt]}])
         else:
             response = model.generate_content(prompt)
             
@@ -52,18 +116,13 @@ def get_response_with_images(prompt: str, image_paths: List[str], system_prompt:
         Текстовый ответ от модели
     """
     try:
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        
-        # Загружаем изображения
-        images = [PIL.Image.open(image_path) for image_path in image_paths]
+        model = get_model(system_instruction=system_prompt)
         
-        # Формируем системный промпт при необходимости
-        full_prompt = prompt
-        if system_prompt:
-            full_prompt = f"{system_prompt}\n\n{prompt}"
+        # Подготавливаем изображения (формат и разрешение под ограничения Gemini)
+        images = [to_gemini_part(prepare_image(image_path, "gemini")) for image_path in image_paths]
         
         # Отправляем запрос с изображениями
-        response = model.generate_content([full_prompt, *images])
+        response = model.generate_content([prompt, *images])
         
         return response.text
     except Exception as e:
@@ -82,14 +141,20 @@ def analyze_document(document_text: str, question: Optional[str] = None) -> str:
         Текстовый ответ от модели с анализом документа
     """
     try:
-        prompt = f"Вот документ для анализа:\n\n{document_text}\n\n"
-        
         if question:
-            prompt += f"Вопрос: {question}"
+            instruction = f"Вопрос: {question}"
         else:
-            prompt += "Пожалуйста, проанализируйте этот документ, выделите основные идеи, ключевые моменты и предоставьте краткое резюме."
+            instruction = "Пожалуйста, проанализируйте этот документ, выделите основные идеи, ключевые моменты и предоставьте краткое резюме."
+        
+        # Сокращаем документ, если промпт не помещается в бюджет входных токенов
+        texts = (PromptBudget("Gemini: анализ документа")
+                 .add("question", instruction, PRIORITY_QUESTION)
+                 .add("document", document_text, PRIORITY_DOCUMENT, min_tokens=1000)
+                 .fit())
+        
+        prompt = f"Вот документ для анализа:\n\n{texts['document']}\n\n{texts['question']}"
         
-        model = genai.GenerativeModel(GEMINI_MODEL)
+        model = get_model()
         response = model.generate_content(prompt)
         
         return response.text
@@ -97,27 +162,30 @@ def analyze_document(document_text: str, question: Optional[str] = None) -> str:
         print(f"Ошибка при анализе документа: {e}")
         return f"Ошибка при анализе документа: {e}"
 
-def analyze_image(image_path: str, question: Optional[str] = None) -> str:
+def analyze_image(image_path: str, question: Optional[str] = None, ocr_text: Optional[str] = None) -> str:
     """
     Анализирует изображение с помощью Gemini
     
     Args:
         image_path: Путь к изображению
         question: Вопрос об изображении (опционально)
+        ocr_text: Текст, распознанный на изображении через OCR (опционально)
         
     Returns:
         Текстовый ответ от модели с анализом изображения
     """
     try:
-        model = genai.GenerativeModel(GEMINI_MODEL)
+        model = get_model()
         
-        # Загружаем изображение
-        image = PIL.Image.open(image_path)
+        # Подготавливаем изображение (формат и разрешение под ограничения Gemini)
+        image = to_gemini_part(prepare_image(image_path, "gemini"))
         
         # Формируем запрос
         prompt = "Проанализируйте это изображение и опишите, что на нем."
         if question:
             prompt = f"Проанализируйте это изображение. {question}"
+        if ocr_text:
+            prompt += f"\n\nТекст, распознанный на изображении (OCR, возможны ошибки распознавания):\n{ocr_text}"
         
         # Отправляем запрос с изображением
         response = model.generate_content([prompt, image])
@@ -159,12 +227,8 @@ def generate_marketing_strategy(business_type: str, target_audience: str, goals:
         prompt += "6. Ключевые метрики для отслеживания эффективности\n"
         prompt += "7. Примерный план действий на 3 месяца\n"
         
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        
-        chat = model.start_chat(history=[])
-        response = chat.send_message(
-            f"{system_prompt}\n\n{prompt}"
-        )
+        model = get_model(system_instruction=system_prompt)
+        response = model.generate_content(prompt)
             
         return response.text
     except Exception as e:
@@ -193,12 +257,8 @@ def analyze_competitor(competitor_name: str, industry: str) -> str:
         prompt += "4. Сильные и слабые стороны\n"
         prompt += "5. Возможности для конкуренции с этой компанией\n"
         
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        
-        chat = model.start_chat(history=[])
-        response = chat.send_message(
-            f"{system_prompt}\n\n{prompt}"
-        )
+        model = get_model(system_instruction=system_prompt)
+        response = model.generate_content(prompt)
             
         return response.text
     except Exception as e:
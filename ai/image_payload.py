@@ -0,0 +1,169 @@
+import sys
+import os
+import io
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from PIL import Image, ImageOps
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import IMAGE_TARGET_BYTES, IMAGE_ENCODE_FORMAT, IMAGE_CACHE_MAX_BYTES
+
+# Ограничения провайдеров: максимальная полезная сторона изображения и поддерживаемые форматы
+PROVIDER_LIMITS = {
+    "claude": {
+        "max_side": 1568,
+        "max_bytes": 5 * 1024 * 1024,
+        "mime_types": {"image/jpeg", "image/png", "image/gif", "image/webp"}
+    },
+    "gemini": {
+        "max_side": 3072,
+        "max_bytes": 7 * 1024 * 1024,
+        "mime_types": {"image/jpeg", "image/png", "image/webp", "image/heic", "image/heif"}
+    }
+}
+
+# Ступени качества при перекодировании
+QUALITY_STEPS = (85, 75, 65, 55, 45)
+
+# Кэш подготовленных изображений: (хэш содержимого, провайдер) -> payload
+_payload_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_payload_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+def detect_mime_type(data: bytes) -> Optional[str]:
+    """
+    Определяет MIME-тип изображения по сигнатуре файла
+
+    Args:
+        data: Содержимое файла
+
+    Returns:
+        MIME-тип или None, если формат не распознан
+    """
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data.startswith(b"BM"):
+        return "image/bmp"
+    if data[:4] in (b"II*\x00", b"MM\x00*"):
+        return "image/tiff"
+    if data[4:12] in (b"ftypheic", b"ftypheix", b"ftypmif1"):
+        return "image/heic"
+    return None
+
+def _encode(image: Image.Image, target_bytes: int, max_bytes: int) -> tuple:
+    """Перекодирует изображение, подбирая качество под целевой размер в байтах"""
+    image_format = "WEBP" if IMAGE_ENCODE_FORMAT.upper() == "WEBP" else "JPEG"
+    mime_type = f"image/{image_format.lower()}"
+
+    data = b""
+    while True:
+        for quality in QUALITY_STEPS:
+            buffer = io.BytesIO()
+            image.save(buffer, format=image_format, quality=quality, optimize=True)
+            data = buffer.getvalue()
+            if len(data) <= target_bytes:
+                return data, mime_type
+
+        # Даже минимальное качество не уложилось в бюджет - уменьшаем разрешение
+        if len(data) <= max_bytes and min(image.size) <= 512:
+            return data, mime_type
+        image = image.resize((max(1, image.width * 3 // 4), max(1, image.height * 3 // 4)), Image.LANCZOS)
+
+def _prepare(data: bytes, provider: str) -> Dict[str, Any]:
+    """Приводит изображение к формату, разрешению и размеру, подходящим провайдеру"""
+    limits = PROVIDER_LIMITS[provider]
+    mime_type = detect_mime_type(data)
+
+    image = Image.open(io.BytesIO(data))
+    width, height = image.size
+
+    # Подходящее изображение отправляем как есть, без перекодирования
+    if (mime_type in limits["mime_types"]
+            and max(width, height) <= limits["max_side"]
+            and len(data) <= min(IMAGE_TARGET_BYTES, limits["max_bytes"])):
+        return {"mime_type": mime_type, "data": data, "width": width, "height": height}
+
+    # Учитываем ориентацию из EXIF и берем первый кадр анимации
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "L"):
+        # Прозрачный фон заливаем белым
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        rgba = image.convert("RGBA")
+        background.paste(rgba, mask=rgba.split()[-1])
+        image = background
+    elif image.mode == "L":
+        image = image.convert("RGB")
+
+    image.thumbnail((limits["max_side"], limits["max_side"]), Image.LANCZOS)
+    encoded, encoded_mime = _encode(image, min(IMAGE_TARGET_BYTES, limits["max_bytes"]), limits["max_bytes"])
+
+    logging.info(
+        f"Изображение подготовлено для {provider}: {mime_type or 'неизвестный формат'} {width}x{height} "
+        f"{len(data) // 1024} КБ -> {encoded_mime} {image.width}x{image.height} {len(encoded) // 1024} КБ"
+    )
+    return {"mime_type": encoded_mime, "data": encoded, "width": image.width, "height": image.height}
+
+def prepare_image(image_path: str, provider: str = "claude") -> Dict[str, Any]:
+    """
+    Подготавливает изображение для отправки провайдеру с кэшированием по хэшу содержимого
+
+    Args:
+        image_path: Путь к изображению
+        provider: Провайдер ('claude' или 'gemini')
+
+    Returns:
+        Словарь {mime_type, data (bytes), width, height}
+    """
+    global _payload_cache_bytes
+
+    with open(image_path, "rb") as f:
+        data = f.read()
+
+    key = (hashlib.sha256(data).hexdigest(), provider)
+    with _cache_lock:
+        payload = _payload_cache.get(key)
+        if payload is not None:
+            _payload_cache.move_to_end(key)
+            return payload
+
+    payload = _prepare(data, provider)
+
+    with _cache_lock:
+        if key not in _payload_cache:
+            _payload_cache[key] = payload
+            _payload_cache_bytes += len(payload["data"])
+        while _payload_cache_bytes > IMAGE_CACHE_MAX_BYTES and len(_payload_cache) > 1:
+            _, evicted = _payload_cache.popitem(last=False)
+            _payload_cache_bytes -= len(evicted["data"])
+
+    return payload
+
+def to_claude_content(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Создает блок изображения для сообщения Claude"""
+    # Base64 сохраняем в payload, чтобы повторные запросы не кодировали изображение заново
+    if "base64" not in payload:
+        payload["base64"] = base64.b64encode(payload["data"]).decode("utf-8")
+    return {
+        "type": "image",
+        "source": {
+            "type": "base64",
+            "media_type": payload["mime_type"],
+            "data": payload["base64"]
+        }
+    }
+
+def to_gemini_part(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Создает часть запроса с изображением для Gemini"""
+    return {"mime_type": payload["mime_type"], "data": payload["data"]}
@@ -0,0 +1,171 @@
+import sys
+import os
+import re
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple, Any
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (
+    CLAUDE_MODEL, CLAUDE_FAST_MODEL, GEMINI_MODEL, GEMINI_FAST_MODEL,
+    MODEL_ROUTING_ENABLED, MODEL_TIER_OVERRIDES
+)
+
+# Уровни моделей
+TIER_FAST = "fast"
+TIER_HEAVY = "heavy"
+
+# Длина запроса (в символах), начиная с которой он считается тяжелым
+HEAVY_LENGTH_THRESHOLD = 1500
+# Длина запроса, до которой он почти наверняка легкий
+LIGHT_LENGTH_THRESHOLD = 200
+
+# Основы слов, указывающие на аналитическую или творческую задачу
+HEAVY_KEYWORDS = (
+    "стратег", "анализ", "проанализ", "исследова", "сравни", "сравнен", "бизнес-план",
+    "медиаплан", "контент-план", "конкурент", "прогноз", "подробн", "детальн", "пошагов",
+    "обоснуй", "аудит", "воронк", "сегментац", "позиционир", "unit-эконом", "roi", "romi",
+    "strategy", "analy", "research", "compare", "forecast", "detailed", "step by step",
+)
+
+# Короткие реплики, которым достаточно быстрой модели
+LIGHT_PATTERNS = re.compile(
+    r"^\s*(привет|здравствуй|здравствуйте|добрый (день|вечер|утро)|спасибо|благодарю|ок|окей|"
+    r"хорошо|понятно|да|нет|пока|hi|hello|thanks|thank you|ok)\b",
+    re.IGNORECASE
+)
+
+# Статистика задержек по уровням моделей
+_latency_stats: Dict[str, Dict[str, float]] = {}
+_stats_lock = threading.Lock()
+
+def classify_request(text: str, command: Optional[str] = None) -> str:
+    """
+    Определяет уровень модели для запроса по простым эвристикам
+
+    Args:
+        text: Текст запроса
+        command: Тип команды (chat, search, ideas, market, document, image)
+
+    Returns:
+        Уровень модели (fast или heavy)
+    """
+    # Если маршрутизация выключена, все запросы идут в основную модель
+    if not MODEL_ROUTING_ENABLED:
+        return TIER_HEAVY
+
+    # Принудительный уровень для команды из настроек
+    override = MODEL_TIER_OVERRIDES.get(command or "chat")
+    if override in (TIER_FAST, TIER_HEAVY):
+        return override
+
+    text = text or ""
+    length = len(text)
+
+    if length >= HEAVY_LENGTH_THRESHOLD:
+        return TIER_HEAVY
+
+    lowered = text.lower()
+
+    # Считаем признаки сложного запроса: одного ключевого слова достаточно для тяжелой модели,
+    # вопросы, переносы строк и списки сами по себе весят меньше
+    score = 0
+    score += sum(2 for keyword in HEAVY_KEYWORDS if keyword in lowered)
+    score += min(lowered.count("?"), 3) // 2
+    score += lowered.count("\n") // 5
+    if re.search(r"^\s*(\d+[.)]|[-•*])\s", text, re.MULTILINE):
+        score += 1
+
+    # Приветствие без признаков сложной задачи ("Привет! Разработай стратегию..." сюда не попадает)
+    if score == 0 and LIGHT_PATTERNS.match(lowered) and length < LIGHT_LENGTH_THRESHOLD:
+        return TIER_FAST
+
+    if length < LIGHT_LENGTH_THRESHOLD:
+        return TIER_HEAVY if score >= 2 else TIER_FAST
+
+    return TIER_HEAVY if score >= 1 else TIER_FAST
+
+def get_model_for_tier(tier: str, provider: str = "claude") -> str:
+    """
+    Возвращает имя модели для указанного уровня и провайдера
+
+    Args:
+        tier: Уровень модели (fast или heavy)
+        provider: Провайдер ('claude' или 'gemini')
+
+    Returns:
+        Имя модели
+    """
+    if provider == "gemini":
+        return GEMINI_FAST_MODEL if tier == TIER_FAST else GEMINI_MODEL
+    return CLAUDE_FAST_MODEL if tier == TIER_FAST else CLAUDE_MODEL
+
+def route_request(text: str, command: Optional[str] = None, provider: str = "claude") -> Tuple[str, str]:
+    """
+    Выбирает уровень и модель для запроса
+
+    Args:
+        text: Текст запроса
+        command: Тип команды (опционально)
+        provider: Провайдер ('claude' или 'gemini')
+
+    Returns:
+        Кортеж (уровень, имя модели)
+    """
+    tier = classify_request(text, command)
+    return tier, get_model_for_tier(tier, provider)
+
+def record_latency(tier: str, model: str, seconds: float) -> None:
+    """
+    Сохраняет время ответа модели в статистику уровня
+
+    Args:
+        tier: Уровень модели
+        model: Имя модели
+        seconds: Время ответа в секундах
+    """
+    with _stats_lock:
+        stats = _latency_stats.setdefault(tier, {"count": 0, "total": 0.0, "min": seconds, "max": seconds})
+        stats["count"] += 1
+        stats["total"] += seconds
+        stats["min"] = min(stats["min"], seconds)
+        stats["max"] = max(stats["max"], seconds)
+        average = stats["total"] / stats["count"]
+
+    logging.info(f"Модель {model} (уровень {tier}): ответ за {seconds:.2f} с, среднее по уровню {average:.2f} с")
+
+def get_latency_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Возвращает статистику задержек по уровням моделей
+
+    Returns:
+        Словарь {уровень: {count, avg, min, max}}
+    """
+    with _stats_lock:
+        return {
+            tier: {
+                "count": int(stats["count"]),
+                "avg": stats["total"] / stats["count"] if stats["count"] else 0.0,
+                "min": stats["min"],
+                "max": stats["max"]
+            }
+            for tier, stats in _latency_stats.items()
+        }
+
+@contextmanager
+def track_latency(tier: str, model: str):
+    """
+    Контекстный менеджер для замера времени ответа модели
+
+    Args:
+        tier: Уровень модели
+        model: Имя модели
+    """
+    start = time.perf_counter()
+    yield
+    # Неудачные вызовы не учитываем, чтобы не искажать статистику
+    record_latency(tier, model, time.perf_counter() - start)
@@ -0,0 +1,149 @@
+import sys
+import os
+import re
+import logging
+from typing import Dict, List, Optional
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import MAX_INPUT_TOKENS
+
+# Приоритеты секций промпта: секции с меньшим приоритетом сокращаются первыми
+PRIORITY_SYSTEM = 100
+PRIORITY_QUESTION = 90
+PRIORITY_DOCUMENT = 50
+PRIORITY_SEARCH = 40
+PRIORITY_SUMMARY = 35
+PRIORITY_HISTORY = 30
+
+# Средняя длина токена в символах для разных алфавитов (приближение токенизатора Claude)
+CHARS_PER_TOKEN_CYRILLIC = 2.8
+CHARS_PER_TOKEN_LATIN = 4.0
+
+# Маркер сокращенного текста
+TRUNCATION_MARKER = "\n[...текст сокращен...]\n"
+
+_cyrillic_re = re.compile(r"[а-яёА-ЯЁ]")
+_latin_re = re.compile(r"[a-zA-Z0-9]")
+_space_re = re.compile(r"\s")
+
+def estimate_tokens(text: str) -> int:
+    """
+    Оценивает количество токенов в тексте без обращения к API
+
+    Args:
+        text: Текст
+
+    Returns:
+        Приблизительное количество токенов
+    """
+    if not text:
+        return 0
+
+    cyrillic = len(_cyrillic_re.findall(text))
+    latin = len(_latin_re.findall(text))
+    spaces = len(_space_re.findall(text))
+    # Знаки препинания и прочие символы обычно являются отдельными токенами
+    other = len(text) - cyrillic - latin - spaces
+
+    return int(cyrillic / CHARS_PER_TOKEN_CYRILLIC + latin / CHARS_PER_TOKEN_LATIN + other) + 1
+
+def compress_text(text: str) -> str:
+    """Убирает лишние пробелы и пустые строки без потери содержания"""
+    text = re.sub(r"[ \t]+", " ", text)
+    text = re.sub(r" ?\n ?", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Сокращает текст до указанного количества токенов, сохраняя начало и конец
+
+    Args:
+        text: Текст
+        max_tokens: Максимальное количество токенов
+
+    Returns:
+        Сокращенный текст
+    """
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+
+    # Переводим бюджет в символы по средней плотности этого текста
+    max_chars = int(len(text) * max_tokens / tokens) - len(TRUNCATION_MARKER)
+
+    # Плотность токенов неравномерна, поэтому уменьшаем длину, пока не уложимся в бюджет
+    while max_chars > 0:
+        head = max_chars * 3 // 4
+        tail = max_chars - head
+        truncated = text[:head] + TRUNCATION_MARKER + (text[-tail:] if tail > 0 else "")
+        if estimate_tokens(truncated) <= max_tokens:
+            return truncated
+        max_chars = int(max_chars * 0.9)
+
+    return ""
+
+class PromptBudget:
+    """Распределяет бюджет входных токенов между секциями промпта"""
+
+    def __init__(self, label: str, max_input_tokens: int = MAX_INPUT_TOKENS):
+        self.label = label
+        self.max_input_tokens = max_input_tokens
+        self.sections: List[Dict] = []
+
+    def add(self, name: str, text: Optional[str], priority: int, min_tokens: int = 0) -> "PromptBudget":
+        """
+        Добавляет секцию промпта
+
+        Args:
+            name: Название секции (system, document, search, history, question и т.д.)
+            text: Текст секции
+            priority: Приоритет (секции с меньшим приоритетом сокращаются первыми)
+            min_tokens: Сколько токенов секции сохранить при сокращении
+
+        Returns:
+            Этот же объект для цепочки вызовов
+        """
+        self.sections.append({"name": name, "text": text or "", "priority": priority, "min_tokens": min_tokens})
+        return self
+
+    def fit(self) -> Dict[str, str]:
+        """
+        Укладывает секции в бюджет и записывает итоговый размер в лог
+
+        Сначала сжимаются пробелы в секциях с наименьшим приоритетом, затем они
+        сокращаются до min_tokens, после чего очередь доходит до следующего приоритета.
+
+        Returns:
+            Словарь {название секции: итоговый текст}
+        """
+        texts = {section["name"]: section["text"] for section in self.sections}
+        total = sum(estimate_tokens(text) for text in texts.values())
+        original_total = total
+
+        for section in sorted(self.sections, key=lambda item: item["priority"]):
+            if total <= self.max_input_tokens:
+                break
+
+            name = section["name"]
+            before = estimate_tokens(texts[name])
+
+            # Дешевое сжатие без потери содержания
+            texts[name] = compress_text(texts[name])
+            current = estimate_tokens(texts[name])
+            total -= before - current
+
+            if total > self.max_input_tokens:
+                allowed = max(section["min_tokens"], current - (total - self.max_input_tokens))
+                texts[name] = truncate_to_tokens(texts[name], allowed)
+                total -= current - estimate_tokens(texts[name])
+
+            logging.info(f"{self.label}: секция '{name}' сокращена с {before} до {estimate_tokens(texts[name])} токенов")
+
+        details = ", ".join(f"{name}={estimate_tokens(text)}" for name, text in texts.items())
+        logging.info(f"{self.label}: входные токены ~{total} (до сокращения ~{original_total}): {details}")
+
+        return texts
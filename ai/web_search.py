@@ -9,6 +9,7 @@ from typing import List, Dict, Any, Optional
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import SERP_API_KEY
+from ai.token_budget import PromptBudget, PRIORITY_SYSTEM, PRIORITY_QUESTION, PRIORITY_SEARCH
 
 def search_web(query: str, num_results: int = 5) -> List[Dict[str, str]]:
     """
@@ -189,21 +190,27 @@ def search_and_summarize(query: str, model: str = "claude") -> str:
             if content:
                 summary_text += f"   Содержание: {content[:300]}...\n\n"
         
+        system_prompt = "Вы опытный исследователь и аналитик информации. Ваша задача - суммировать результаты поиска в интернете и выделить самую важную информацию."
+        instruction = f"Проанализируйте следующие результаты поиска по запросу '{query}' и создайте краткое, но информативное резюме. Сфокусируйтесь на ключевых фактах, общих темах и выводах."
+        
+        # Укладываем результаты поиска в бюджет входных токенов
+        texts = (PromptBudget("Суммирование результатов поиска")
+                 .add("system", system_prompt, PRIORITY_SYSTEM)
+                 .add("question", instruction, PRIORITY_QUESTION)
+                 .add("search", summary_text, PRIORITY_SEARCH, min_tokens=500)
+                 .fit())
+        prompt = f"{texts['question']}\n\n{texts['search']}"
+        
         # Выбираем модель для суммирования
         if model.lower() == "claude":
             from ai.claude_api import get_text_response
             
-            system_prompt = "Вы опытный исследователь и аналитик информации. Ваша задача - суммировать результаты поиска в интернете и выделить самую важную информацию."
-            prompt = f"Проанализируйте следующие результаты поиска по запросу '{query}' и создайте краткое, но информативное резюме. Сфокусируйтесь на ключевых фактах, общих темах и выводах.\n\n{summary_text}"
-            
-            summary = get_text_response(prompt, system_prompt)
+            # Промпт уже уложен в бюджет выше
+            summary = get_text_response(prompt, system_prompt, command="search", fit_budget=False)
         else:  # gemini
             from ai.gemini_api import get_text_response
             
-            system_prompt = "Вы опытный исследователь и аналитик информации. Ваша задача - суммировать результаты поиска в интернете и выделить самую важную информацию."
-            prompt = f"Проанализируйте следующие результаты поиска по запросу '{query}' и создайте краткое, но информативное резюме. Сфокусируйтесь на ключевых фактах, общих темах и выводах.\n\n{summary_text}"
-            
-            summary = get_text_response(prompt, system_prompt)
+            summary = get_text_response(prompt, system_prompt, fit_budget=False)
         
         return summary
     except Exception as e:
@@ -0,0 +1,63 @@
+"""
+Бенчмарк: извлечение текста из DOCX через python-docx и потоковым разбором XML
+
+Каждый способ запускается в отдельном процессе, чтобы пиковое потребление
+памяти (RSS) одного не влияло на другой. Для python-docx берутся только
+абзацы, как это делалось раньше; потоковый разбор дополнительно извлекает
+таблицы, колонтитулы и сноски.
+
+Запуск:
+    python benchmarks/docx_extraction.py путь/к/файлу.docx
+"""
+import os
+import sys
+import time
+import resource
+import multiprocessing
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def python_docx_path(file_path: str) -> str:
+    """Прежний способ: объектная модель python-docx, только абзацы"""
+    import docx
+    doc = docx.Document(file_path)
+    return "".join(paragraph.text + "\n" for paragraph in doc.paragraphs)
+
+def streaming_path(file_path: str) -> str:
+    """Потоковый разбор XML из utils.extractors"""
+    from utils.extractors import extract_text_from_docx
+    return extract_text_from_docx(file_path)
+
+def measure(method: str, file_path: str, queue) -> None:
+    """Выполняет извлечение в дочернем процессе и возвращает время, объем текста и прирост RSS"""
+    func = python_docx_path if method == "python-docx" else streaming_path
+    # Импорты делаем до замера, чтобы учитывать только разбор документа
+    if method == "python-docx":
+        import docx
+    else:
+        import utils.extractors
+    
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    text = func(file_path)
+    seconds = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((seconds, len(text), (rss_after - rss_before) / 1024))
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    file_path = sys.argv[1]
+    context = multiprocessing.get_context("spawn")
+
+    print(f"Файл: {file_path} ({os.path.getsize(file_path) / 1024 / 1024:.1f} МБ)")
+    for method in ("python-docx", "потоковый"):
+        queue = context.Queue()
+        process = context.Process(target=measure, args=(method, file_path, queue))
+        process.start()
+        seconds, chars, rss_mb = queue.get()
+        process.join()
+        print(f"{method:<12} {seconds:8.2f} с  {chars:>10} символов  прирост пиковой памяти {rss_mb:8.1f} МБ")
@@ -0,0 +1,166 @@
+"""
+Бенчмарк: сравнение движков извлечения текста на локальном наборе файлов
+
+Для каждого файла набора (PDF, DOCX, изображения, таблицы) запускаются все
+установленные движки его формата из реестров utils.extractors. Каждый замер
+выполняется в отдельном процессе, чтобы пиковое потребление памяти (RSS)
+одного движка не влияло на другой. По каждому движку выводятся скорость
+(страниц и символов в секунду), наибольший прирост пиковой памяти и точность.
+
+Точность - F1 по словам относительно эталона. Эталоном служит файл с текстом
+рядом с исходным (report.pdf -> report.pdf.txt), а если его нет - результат
+движка по умолчанию (такая точность помечена звездочкой). Для таблиц
+извлечение одно (сводка pandas), поэтому точность не считается.
+
+Запуск (список движков необязателен - по умолчанию сравниваются все установленные):
+    python benchmarks/extraction_backends.py путь/к/набору [движок ...]
+"""
+import os
+import re
+import sys
+import time
+import resource
+import multiprocessing
+from collections import Counter
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import EXTRACTION_TIMEOUT, OCR_LANGUAGES
+from utils import extractors
+from utils.spreadsheets import SPREADSHEET_EXTENSIONS
+
+# Формат -> (расширения, реестр движков)
+FORMATS = {
+    "pdf": ((".pdf",), extractors.PDF_BACKENDS),
+    "docx": ((".docx",), extractors.DOCX_BACKENDS),
+    "image": ((".jpg", ".jpeg", ".png", ".bmp", ".tiff"), extractors.OCR_BACKENDS),
+    "spreadsheet": (SPREADSHEET_EXTENSIONS, {"pandas": (None, "pandas")})
+}
+
+def extract(kind: str, backend: str, file_path: str) -> tuple:
+    """Извлекает текст файла выбранным движком, возвращает (текст, количество страниц)"""
+    if kind == "pdf":
+        pages = extractors.extract_pages_from_pdf(file_path, backend)
+        return "\n".join(pages), len(pages)
+    if kind == "docx":
+        return extractors.extract_text_from_docx(file_path, backend=backend), 0
+    if kind == "image":
+        return extractors.extract_text_from_image(file_path, OCR_LANGUAGES, backend), 1
+    from utils.spreadsheets import summarize_spreadsheet
+    return summarize_spreadsheet(file_path), 0
+
+def measure(kind: str, backend: str, file_path: str, queue) -> None:
+    """Выполняет извлечение в дочернем процессе и возвращает время, текст, страницы и прирост RSS"""
+    try:
+        # Необязательные модули движок импортирует при первом вызове: это входит в замер,
+        # как и при первом файле в процессе пула
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        text, pages = extract(kind, backend, file_path)
+        seconds = time.perf_counter() - start
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        queue.put((seconds, text, pages, (rss_after - rss_before) / 1024, None))
+    except Exception as e:
+        queue.put((0.0, "", 0, 0.0, str(e)))
+
+def run_isolated(kind: str, backend: str, file_path: str) -> tuple:
+    """Запускает замер в отдельном процессе с ограничением по времени"""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=measure, args=(kind, backend, file_path, queue))
+    process.start()
+    try:
+        return queue.get(timeout=EXTRACTION_TIMEOUT)
+    except Exception:
+        process.terminate()
+        return (0.0, "", 0, 0.0, f"превышено время ({EXTRACTION_TIMEOUT} с)")
+    finally:
+        process.join()
+
+def word_f1(text: str, reference: str) -> float:
+    """F1 по совпадению слов (без учета порядка и регистра)"""
+    words = Counter(re.findall(r"\w+", text.lower()))
+    reference_words = Counter(re.findall(r"\w+", reference.lower()))
+    common = sum((words & reference_words).values())
+    if not common:
+        return 1.0 if not words and not reference_words else 0.0
+    precision = common / sum(words.values())
+    recall = common / sum(reference_words.values())
+    return 2 * precision * recall / (precision + recall)
+
+def collect_corpus(corpus_dir: str) -> dict:
+    """Распределяет файлы набора по форматам"""
+    corpus = {kind: [] for kind in FORMATS}
+    for root, _, files in os.walk(corpus_dir):
+        for name in sorted(files):
+            ext = os.path.splitext(name)[1].lower()
+            for kind, (extensions, _) in FORMATS.items():
+                if ext in extensions:
+                    corpus[kind].append(os.path.join(root, name))
+    return corpus
+
+def benchmark_format(kind: str, files: list, only: list) -> None:
+    """Прогоняет все движки формата по его файлам и печатает сводку"""
+    backends = FORMATS[kind][1]
+    names = [name for name in backends if name == "pandas" or name in extractors.available_backends(backends)]
+    if only:
+        names = [name for name in names if name in only] or names[:1]
+    default = next(iter(backends))
+
+    print(f"\n{kind}: {len(files)} файлов")
+    print(f"{'движок':<12} {'с':>8} {'стр/с':>8} {'симв/с':>10} {'RSS, МБ':>8} {'точность':>9} ошибки")
+
+    results = {name: [] for name in names}
+    for file_path in files:
+        for name in names:
+            results[name].append(run_isolated(kind, name, file_path))
+
+    # Эталоны: текстовые файлы рядом с исходными, иначе результат движка по умолчанию
+    references = []
+    for index, file_path in enumerate(files):
+        reference_path = file_path + ".txt"
+        if os.path.exists(reference_path):
+            with open(reference_path, "r", encoding="utf-8", errors="replace") as f:
+                references.append((f.read(), True))
+        elif default in results:
+            references.append((results[default][index][1], False))
+        else:
+            references.append((None, False))
+
+    for name in names:
+        runs = results[name]
+        seconds = sum(run[0] for run in runs)
+        pages = sum(run[2] for run in runs)
+        chars = sum(len(run[1]) for run in runs)
+        rss = max((run[3] for run in runs), default=0.0)
+        errors = [run[4] for run in runs if run[4]]
+
+        scores = [
+            (word_f1(run[1], reference), own)
+            for run, (reference, own) in zip(runs, references)
+            if reference is not None and not run[4] and kind != "spreadsheet"
+        ]
+        if scores:
+            fidelity = f"{sum(score for score, _ in scores) / len(scores):.3f}" + ("" if all(own for _, own in scores) else "*")
+        else:
+            fidelity = "-"
+
+        page_rate = f"{pages / seconds:8.1f}" if seconds and pages else f"{'-':>8}"
+        char_rate = chars / seconds if seconds else 0.0
+        print(f"{name:<12} {seconds:8.2f} {page_rate} {char_rate:10.0f} {rss:8.1f} {fidelity:>9} {len(errors)}")
+        for error in errors[:3]:
+            print(f"    {error}")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    corpus_dir = sys.argv[1]
+    only = sys.argv[2:]
+    corpus = collect_corpus(corpus_dir)
+
+    for kind, files in corpus.items():
+        if files:
+            benchmark_format(kind, files, only)
@@ -0,0 +1,50 @@
+"""
+Микробенчмарк: накладные расходы на подготовку модели Gemini перед запросом
+
+Сравнивает прежний путь (новый GenerativeModel и пустая чат-сессия на каждый вызов)
+с пулом настроенных моделей из ai.gemini_api. Сетевые запросы не выполняются.
+
+Запуск:
+    python benchmarks/gemini_model_pool.py [количество вызовов]
+"""
+import os
+import sys
+import time
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import google.generativeai as genai
+
+from config import GEMINI_MODEL
+from ai.gemini_api import get_model
+
+SYSTEM_PROMPT = "Вы опытный маркетолог-стратег. Создавайте детальные, практические маркетинговые стратегии."
+
+def old_path():
+    """Подготовка модели так, как это делалось до пула"""
+    model = genai.GenerativeModel(GEMINI_MODEL)
+    return model.start_chat(history=[])
+
+def pooled_path():
+    """Подготовка модели через пул с нативной системной инструкцией"""
+    return get_model(GEMINI_MODEL, SYSTEM_PROMPT)
+
+def measure(func, calls: int) -> float:
+    """Возвращает среднее время одного вызова в микросекундах"""
+    func()
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e6
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    old_us = measure(old_path, calls)
+    pooled_us = measure(pooled_path, calls)
+
+    print(f"Вызовов: {calls}")
+    print(f"Новая модель + пустой чат: {old_us:.1f} мкс/вызов")
+    print(f"Модель из пула:            {pooled_us:.1f} мкс/вызов")
+    print(f"Экономия:                  {old_us - pooled_us:.1f} мкс/вызов ({old_us / max(pooled_us, 1e-9):.0f}x)")
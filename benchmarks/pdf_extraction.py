@@ -0,0 +1,64 @@
+"""
+Бенчмарк: извлечение текста из PDF последовательно и постранично в пуле процессов
+
+Последовательный путь - текстовый слой всех страниц в одном процессе и OCR
+сканированных страниц там же. Параллельный - utils.file_processor.extract_pages_from_pdf.
+Для оценки берите большой смешанный документ (например, 300 страниц, часть из
+которых - сканы): выводится пропускная способность в страницах в секунду на ядро.
+
+Запуск:
+    python benchmarks/pdf_extraction.py путь/к/файлу.pdf [количество процессов]
+"""
+import os
+import sys
+import time
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if len(sys.argv) > 2:
+    os.environ["EXTRACTION_WORKERS"] = sys.argv[2]
+
+from config import EXTRACTION_WORKERS, PDF_OCR_MIN_CHARS, PDF_OCR_DPI, OCR_LANGUAGES, PDF_BACKEND, OCR_BACKEND
+from utils import extractors
+from utils.extraction_service import run_extraction, shutdown_extraction_service
+from utils.file_processor import extract_pages_from_pdf
+
+def sequential(file_path: str) -> list:
+    """Текстовый слой и OCR сканов в текущем процессе, страница за страницей"""
+    pages = extractors.extract_pages_from_pdf(file_path, PDF_BACKEND)
+    scanned = [number for number, text in enumerate(pages) if len(text.strip()) < PDF_OCR_MIN_CHARS]
+    for number, text in zip(scanned, extractors.ocr_pdf_pages(file_path, scanned, PDF_OCR_DPI, OCR_LANGUAGES, OCR_BACKEND)):
+        if text and len(text.strip()) > len(pages[number].strip()):
+            pages[number] = text
+    return pages
+
+def report(name: str, pages: list, seconds: float, cores: int):
+    """Печатает пропускную способность"""
+    rate = len(pages) / seconds if seconds else 0.0
+    chars = sum(len(page) for page in pages)
+    print(f"{name:<14} {seconds:8.2f} с  {rate:8.1f} стр/с  {rate / cores:8.1f} стр/с на ядро  {chars} символов")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    file_path = sys.argv[1]
+
+    start = time.perf_counter()
+    sequential_pages = sequential(file_path)
+    report("Последовательно", sequential_pages, time.perf_counter() - start, 1)
+
+    # Прогреваем пул, чтобы не учитывать запуск процессов
+    run_extraction(extractors.count_pdf_pages, file_path)
+
+    start = time.perf_counter()
+    parallel_pages = extract_pages_from_pdf(file_path)
+    report("Пул процессов", parallel_pages, time.perf_counter() - start, EXTRACTION_WORKERS)
+
+    scanned = sum(1 for page in extractors.extract_pages_from_pdf(file_path, PDF_BACKEND) if len(page.strip()) < PDF_OCR_MIN_CHARS)
+    print(f"Страниц: {len(parallel_pages)}, из них без текстового слоя: {scanned}, процессов: {EXTRACTION_WORKERS}")
+    print(f"Результаты совпадают: {sequential_pages == parallel_pages}")
+
+    shutdown_extraction_service()
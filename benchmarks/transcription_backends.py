@@ -0,0 +1,67 @@
+"""
+Бенчмарк: скорость движков распознавания речи (ElevenLabs и локальный faster-whisper)
+
+Каждая запись распознается целиком каждым доступным движком. Выводится
+коэффициент реального времени (RTF - секунды распознавания на секунду записи)
+и RTF на ядро для локальной модели (RTF, умноженный на число потоков CTranslate2:
+сколько секунд процессорного времени одного ядра стоит секунда записи). Первый
+вызов локального движка загружает модель, поэтому его время выводится отдельно.
+
+Запуск:
+    python benchmarks/transcription_backends.py запись.ogg [запись.mp3 ...]
+"""
+import os
+import sys
+import time
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import WHISPER_MODEL, WHISPER_COMPUTE_TYPE, WHISPER_CPU_THREADS
+from utils import extractors
+from utils.transcription import TRANSCRIPTION_BACKENDS, available_backends, shutdown_transcription_service
+
+def benchmark_backend(name: str, files: list, durations: dict) -> None:
+    """Распознает все записи движком и печатает RTF"""
+    transcribe = TRANSCRIPTION_BACKENDS[name]
+
+    if name == "local":
+        # Прогрев: запуск процесса и загрузка модели
+        start = time.perf_counter()
+        transcribe(files[0], None)
+        print(f"{name}: загрузка модели {WHISPER_MODEL} ({WHISPER_COMPUTE_TYPE}) и первый прогон {time.perf_counter() - start:.1f} с")
+
+    total_seconds = total_audio = 0.0
+    for file_path in files:
+        start = time.perf_counter()
+        try:
+            result = transcribe(file_path, None)
+        except Exception as e:
+            print(f"{name:<11} {os.path.basename(file_path)}: ошибка {e}")
+            continue
+        seconds = time.perf_counter() - start
+        audio = durations[file_path]
+        total_seconds += seconds
+        total_audio += audio
+        rtf = seconds / audio if audio else 0.0
+        print(f"{name:<11} {os.path.basename(file_path):<30} {audio:8.1f} с записи  {seconds:8.2f} с  RTF {rtf:6.3f}  {len(result['text'])} символов")
+
+    if total_audio:
+        rtf = total_seconds / total_audio
+        per_core = f"  RTF на ядро {rtf * WHISPER_CPU_THREADS:6.3f} ({WHISPER_CPU_THREADS} потоков)" if name == "local" else ""
+        print(f"{name:<11} итого: RTF {rtf:6.3f}{per_core}\n")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    files = sys.argv[1:]
+    durations = {file_path: extractors.probe_audio_duration(file_path) for file_path in files}
+    print(f"Записей: {len(files)}, общая длительность {sum(durations.values()):.1f} с\n")
+
+    try:
+        for name in available_backends():
+            benchmark_backend(name, files, durations)
+    finally:
+        shutdown_transcription_service()
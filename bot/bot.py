@@ -9,28 +9,57 @@ from aiogram.types import Message, CallbackQuery, FSInputFile, InlineKeyboardMar
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from contextlib import suppress
+from typing import Any, Dict, List, Optional, Tuple
 
 # Добавляем корневую директорию проекта в sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config import BOT_TOKEN
-from database.db_operations import get_or_create_user, create_project, get_projects_by_user, get_active_conversation, create_conversation, add_message
-from utils.file_processor import save_file, process_file, analyze_file_with_ai, transcribe_audio
-from ai.claude_api import get_text_response, get_response_with_images, generate_project_ideas, analyze_market_trends
+from config import BOT_TOKEN, TELEGRAM_API_SERVER, TELEGRAM_API_LOCAL, MAX_FILE_SIZE_MB, MAX_DOCUMENT_CHARS
+from database.db_operations import get_or_create_user, create_project, get_projects_by_user, get_active_conversation, create_conversation, add_message, save_document
+from utils.file_processor import get_save_path, process_file, analyze_file_with_ai, transcribe_audio
+from utils.document_index import index_document, search_project, get_document_chars, is_global_question
+from utils.upload_index import get_upload, register_upload, update_upload
+from utils.transcription import format_segment, get_transcription_stats, shutdown_transcription_service
+from utils.extraction_service import get_extraction_stats, shutdown_extraction_service
+from ai.claude_api import get_text_response, get_response_with_images, generate_project_ideas, analyze_market_trends, answer_with_passages
 from ai.gemini_api import get_text_response as gemini_get_text_response
 from ai.web_search import search_and_summarize
+from ai.conversation_context import build_conversation_context, schedule_summary_update
+from bot.media_group import MediaGroupMiddleware
 from utils.yandex_metrika import get_daily_report, get_weekly_report, get_monthly_report
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 
 # Создаем объекты бота и диспетчера
-bot = Bot(token=BOT_TOKEN)
+if TELEGRAM_API_SERVER:
+    # Собственный сервер Bot API позволяет принимать файлы больше 20 МБ
+    bot = Bot(token=BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_SERVER, is_local=TELEGRAM_API_LOCAL)))
+else:
+    bot = Bot(token=BOT_TOKEN)
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
 router = Router()
 
+# Облачный Bot API не отдает боту файлы больше 20 МБ
+TELEGRAM_DOWNLOAD_LIMIT_MB = 20
+LOCAL_API_MODE = bool(TELEGRAM_API_SERVER) and TELEGRAM_API_LOCAL
+UPLOAD_LIMIT_MB = MAX_FILE_SIZE_MB if LOCAL_API_MODE else min(MAX_FILE_SIZE_MB, TELEGRAM_DOWNLOAD_LIMIT_MB)
+
+# Размер блока и таймаут (в секундах) при скачивании файла на диск
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+DOWNLOAD_TIMEOUT = 300
+
+# Максимальная длина сообщения Telegram и время ожидания отправки части транскрипции (в секундах)
+TELEGRAM_MESSAGE_LIMIT = 4096
+PARTIAL_SEND_TIMEOUT = 60
+
+# Фото альбома обрабатываются одним запросом
+router.message.middleware(MediaGroupMiddleware())
+
 # Определение состояний для FSM
 class States(StatesGroup):
     main = State()
@@ -43,6 +72,16 @@ class States(StatesGroup):
     waiting_idea_goals = State()
     waiting_idea_constraints = State()
     waiting_audio_language = State()
+    waiting_project_question = State()
+
+async def get_current_project_id(user_id: int, state: FSMContext):
+    """Возвращает ID текущего проекта пользователя (выбранного в сессии или последнего созданного)"""
+    data = await state.get_data()
+    if data.get("project_id"):
+        return data["project_id"]
+    
+    projects = get_projects_by_user(user_id)
+    return projects[0].id if projects else None
 
 # Инициализация бота
 async def bot_startup():
@@ -93,6 +132,7 @@ async def cmd_help(message: Message):
         "/project - Создать новый проект\n"
         "/projects - Показать список ваших проектов\n"
         "/search - Поиск информации в интернете\n"
+        "/ask - Вопрос по документам текущего проекта\n"
         "/ideas - Генерация идей для проекта\n"
         "/market - Анализ рыночных трендов\n"
         "/metrika - Получить отчет по Яндекс.Метрике\n\n"
@@ -132,8 +172,9 @@ async def process_project_description(message: Message, state: FSMContext):
     # Получаем пользователя
     user = get_or_create_user(telegram_id=message.from_user.id)
     
-    # Создаем проект
+    # Создаем проект и делаем его текущим
     project_id = create_project(user.id, project_name, description)
+    await state.update_data(project_id=project_id)
     
     # Отправляем сообщение об успешном создании проекта
     await message.answer(
@@ -195,6 +236,42 @@ async def process_search_query(message: Message, state: FSMContext):
     # Возвращаемся в основное состояние
     await state.set_state(States.main)
 
+# Обработчик команды /ask
+@router.message(Command("ask"))
+async def cmd_ask(message: Message, state: FSMContext):
+    """Обработчик команды для вопроса по документам проекта"""
+    user = get_or_create_user(telegram_id=message.from_user.id)
+    project_id = await get_current_project_id(user.id, state)
+    
+    if not project_id:
+        await message.answer("У вас пока нет проектов. Используйте команду /project, чтобы создать новый проект.")
+        return
+    
+    await state.update_data(project_id=project_id)
+    await message.answer("Введите вопрос по документам проекта:")
+    await state.set_state(States.waiting_project_question)
+
+# Обработчик вопроса по документам проекта
+@router.message(States.waiting_project_question)
+async def process_project_question(message: Message, state: FSMContext):
+    """Обработка вопроса по всем документам проекта"""
+    data = await state.get_data()
+    project_id = data.get("project_id")
+    
+    await message.answer("🔍 Ищу ответ в документах проекта...")
+    
+    # Ищем релевантные фрагменты во всех документах проекта
+    passages = await asyncio.to_thread(search_project, project_id, message.text)
+    
+    if not passages:
+        await message.answer("В документах проекта не найдено информации по вашему вопросу.")
+    else:
+        result = await asyncio.to_thread(answer_with_passages, message.text, passages)
+        await message.answer(result)
+    
+    # Возвращаемся в основное состояние
+    await state.set_state(States.main)
+
 # Обработчик команды /market
 @router.message(Command("market"))
 async def cmd_market(message: Message, state: FSMContext):
@@ -314,31 +391,182 @@ async def process_metrika_report(callback_query: CallbackQuery):
     # Отвечаем на колбэк
     await callback_query.answer()
 
+def get_analysis_markup() -> InlineKeyboardMarkup:
+    """Кнопки для анализа загруженного файла"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="Общий анализ", callback_data="analyze_general")],
+        [InlineKeyboardButton(text="Выделить ключевые моменты", callback_data="analyze_key_points")],
+        [InlineKeyboardButton(text="Создать резюме", callback_data="analyze_summary")]
+    ])
+
+def is_upload_too_large(file_size: Optional[int]) -> bool:
+    """Проверяет размер файла по метаданным Telegram, до скачивания"""
+    return bool(file_size) and file_size > UPLOAD_LIMIT_MB * 1024 * 1024
+
+async def download_telegram_file(file_id: str, file_name: str, file_unique_id: Optional[str] = None) -> str:
+    """Скачивает файл из Telegram потоково, блоками прямо на диск"""
+    try:
+        file = await bot.get_file(file_id)
+        # Уникальный префикс: разные файлы с одинаковым именем ("image.jpg", "Отчет.pdf") не перезаписывают друг друга,
+        # а имя от пользователя хранится отдельно в индексе загрузок
+        destination = get_save_path(file_name, prefix=file_unique_id or uuid.uuid4().hex)
+        
+        # Локальный сервер Bot API отдает путь к файлу на диске: создаем жесткую ссылку вместо копирования
+        if LOCAL_API_MODE and os.path.isabs(file.file_path):
+            try:
+                with suppress(FileNotFoundError):
+                    os.remove(destination)
+                os.link(file.file_path, destination)
+                return destination
+            except OSError:
+                # Файл на другом разделе диска - используем его на месте
+                return file.file_path
+        
+        await bot.download_file(file.file_path, destination=destination, timeout=DOWNLOAD_TIMEOUT, chunk_size=DOWNLOAD_CHUNK_SIZE)
+        return destination
+    except Exception as e:
+        logging.error(f"Ошибка при скачивании файла {file_name}: {e}")
+        return ""
+
+async def fetch_telegram_file(file_id: str, file_unique_id: str, file_name: str, file_type: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Возвращает путь к файлу из Telegram: повторно присланный файл берется с диска без скачивания
+    
+    Returns:
+        Кортеж (путь к файлу, запись о прошлой загрузке или None)
+    """
+    upload = await asyncio.to_thread(get_upload, file_unique_id)
+    if upload:
+        logging.info(f"Файл {file_unique_id} уже загружался, повторное скачивание пропущено")
+        return upload["file_path"], upload
+    
+    saved_path = await download_telegram_file(file_id, file_name, file_unique_id)
+    if saved_path:
+        await asyncio.to_thread(register_upload, file_unique_id, saved_path, file_name, file_type)
+    return saved_path, None
+
+def is_error_result(result: str) -> bool:
+    """Проверяет, является ли ответ сообщением об ошибке (такие ответы не кэшируются)"""
+    return not result or result.startswith(("Ошибка", "Произошла ошибка", "Не удалось"))
+
+def split_message_text(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """Делит длинный текст на части не длиннее лимита сообщения, по возможности по строкам и словам"""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip()
+    if text:
+        parts.append(text)
+    return parts
+
+async def answer_long(message: Message, text: str):
+    """Отправляет текст одним или несколькими сообщениями"""
+    for part in split_message_text(text):
+        await message.answer(part)
+
+def is_image_message(message: Message) -> bool:
+    """Проверяет, содержит ли сообщение изображение (фото или документ-картинку)"""
+    return bool(message.photo or (message.document and (message.document.mime_type or "").startswith("image/")))
+
+async def process_album(message: Message, album: List[Message], state: FSMContext):
+    """Обработка альбома: все изображения скачиваются параллельно и анализируются одним запросом"""
+    images = [item for item in album if is_image_message(item)]
+    
+    # Слишком большие изображения отбрасываем до скачивания
+    oversized = [item for item in images if is_upload_too_large(item.photo[-1].file_size if item.photo else item.document.file_size)]
+    if oversized:
+        await message.answer(f"Пропущено изображений больше {UPLOAD_LIMIT_MB} МБ: {len(oversized)}")
+        images = [item for item in images if item not in oversized]
+    
+    others = [item for item in album if not is_image_message(item)]
+    
+    # Прочие файлы альбома (документы, аудио) обрабатываем по одному
+    for item in others:
+        await process_document(item, state)
+    
+    if not images:
+        return
+    
+    await message.answer(f"📥 Загружаю изображения альбома ({len(images)} шт.)...")
+    
+    # Скачиваем все изображения одновременно
+    downloads = []
+    for item in images:
+        if item.photo:
+            photo = item.photo[-1]
+            downloads.append(fetch_telegram_file(photo.file_id, photo.file_unique_id, f"photo_{uuid.uuid4()}.jpg", "image"))
+        else:
+            document = item.document
+            downloads.append(fetch_telegram_file(document.file_id, document.file_unique_id, document.file_name or f"image_{uuid.uuid4()}.jpg", "image"))
+    image_paths = [path for path, _ in await asyncio.gather(*downloads) if path]
+    
+    if not image_paths:
+        await message.answer("Не удалось сохранить изображения альбома.")
+        return
+    
+    await state.update_data(file_path=image_paths[0], file_type="image", image_paths=image_paths, document_id=None, upload_id=None)
+    
+    # Подпись альбома считаем вопросом к изображениям
+    caption = next((item.caption for item in album if item.caption), None)
+    if caption:
+        await message.answer("🔍 Анализирую изображения альбома...\nЭто может занять некоторое время.")
+        result = await asyncio.to_thread(get_response_with_images, caption, image_paths)
+        await message.answer(result)
+        await state.set_state(States.main)
+        return
+    
+    await message.answer(
+        f"Альбом из {len(image_paths)} изображений загружен. Что вы хотите узнать о нем? "
+        "Введите вопрос или нажмите на одну из кнопок:",
+        reply_markup=get_analysis_markup()
+    )
+    await state.set_state(States.waiting_document_question)
+
 # Обработчик получения документа или фото
 @router.message(lambda message: message.document or message.photo or message.voice or message.audio)
-async def process_document(message: Message, state: FSMContext):
+async def process_document(message: Message, state: FSMContext, album: Optional[List[Message]] = None):
     """Обработчик получения документа, фото или аудио"""
+    # Альбом обрабатываем целиком
+    if album and len(album) > 1:
+        await process_album(message, album, state)
+        return
+    
     # Определяем тип файла и получаем его
     file_id = None
+    file_unique_id = None
+    file_size = None
     file_name = None
     file_type = None
     
     if message.document:
         file_id = message.document.file_id
+        file_unique_id = message.document.file_unique_id
+        file_size = message.document.file_size
         file_name = message.document.file_name
         file_type = "document"
     elif message.photo:
         # Берем последнее (самое крупное) фото
         file_id = message.photo[-1].file_id
+        file_unique_id = message.photo[-1].file_unique_id
+        file_size = message.photo[-1].file_size
         # Генерируем имя для фото
         file_name = f"photo_{uuid.uuid4()}.jpg"
         file_type = "photo"
     elif message.voice:
         file_id = message.voice.file_id
+        file_unique_id = message.voice.file_unique_id
+        file_size = message.voice.file_size
         file_name = f"voice_{uuid.uuid4()}.ogg"
         file_type = "audio"
     elif message.audio:
         file_id = message.audio.file_id
+        file_unique_id = message.audio.file_unique_id
+        file_size = message.audio.file_size
         file_name = message.audio.file_name or f"audio_{uuid.uuid4()}.mp3"
         file_type = "audio"
     
@@ -346,13 +574,15 @@ async def process_document(message: Message, state: FSMContext):
         await message.answer("Не удалось получить файл.")
         return
     
-    # Скачиваем файл
-    file = await bot.get_file(file_id)
-    file_path = file.file_path
-    file_content = await bot.download_file(file_path)
+    # Проверяем размер до скачивания, по метаданным Telegram
+    if is_upload_too_large(file_size):
+        await message.answer(
+            f"Файл слишком большой ({file_size / 1024 / 1024:.1f} МБ). Максимальный размер: {UPLOAD_LIMIT_MB} МБ."
+        )
+        return
     
-    # Сохраняем файл
-    saved_path = await asyncio.to_thread(save_file, file_content.read(), file_name)
+    # Скачиваем и сохраняем файл (повторно присланный файл уже есть на диске)
+    saved_path, upload = await fetch_telegram_file(file_id, file_unique_id, file_name, file_type)
     
     if not saved_path:
         await message.answer("Не удалось сохранить файл.")
@@ -361,7 +591,7 @@ async def process_document(message: Message, state: FSMContext):
     # Обрабатываем файл в зависимости от типа
     if file_type == "audio":
         # Сохраняем путь к файлу в состоянии
-        await state.update_data(audio_file_path=saved_path)
+        await state.update_data(audio_file_path=saved_path, upload_id=file_unique_id)
         
         # Предлагаем выбрать язык для транскрибации
         markup = InlineKeyboardMarkup(inline_keyboard=[
@@ -381,31 +611,58 @@ async def process_document(message: Message, state: FSMContext):
         
         await state.set_state(States.waiting_audio_language)
     else:
-        # Обрабатываем документы и изображения
-        processing_result = await asyncio.to_thread(process_file, saved_path)
-        
-        if not processing_result["success"]:
-            await message.answer(f"Ошибка при обработке файла: {processing_result['message']}")
-            return
+        # Обрабатываем документы и изображения (повторно присланный файл уже обработан)
+        processing_result = None
+        if upload and upload.get("processed"):
+            processed_type = upload["file_type"]
+            has_text = upload.get("has_text", False)
+        else:
+            processing_result = await asyncio.to_thread(process_file, saved_path)
+            
+            if not processing_result["success"]:
+                await message.answer(f"Ошибка при обработке файла: {processing_result['message']}")
+                return
+            
+            processed_type = processing_result["file_type"]
+            has_text = bool(processing_result["text"])
+            await asyncio.to_thread(
+                update_upload, file_unique_id,
+                file_type=processed_type, has_text=has_text,
+                content_hash=processing_result.get("content_hash"), processed=True
+            )
         
         # Сохраняем путь к файлу и его тип в состоянии
-        await state.update_data(file_path=saved_path, file_type=processing_result["file_type"])
+        await state.update_data(file_path=saved_path, file_type=processed_type, image_paths=None, document_id=None, upload_id=file_unique_id)
+        
+        # Добавляем документ в поисковый индекс текущего проекта, если он еще не добавлен
+        if has_text:
+            user = get_or_create_user(telegram_id=message.from_user.id)
+            project_id = await get_current_project_id(user.id, state)
+            if project_id:
+                try:
+                    document_id = upload["documents"].get(str(project_id)) if upload else None
+                    if not document_id:
+                        if processing_result is None:
+                            # Текст берется из кэша извлечения
+                            processing_result = await asyncio.to_thread(process_file, saved_path)
+                        document_id = save_document(project_id, file_name, saved_path, processed_type, os.path.getsize(saved_path))
+                        await asyncio.to_thread(index_document, project_id, document_id, processing_result["text"], file_name)
+                        await asyncio.to_thread(update_upload, file_unique_id, "documents", project_id, document_id)
+                    await state.update_data(project_id=project_id, document_id=document_id)
+                except Exception as e:
+                    logging.error(f"Ошибка при индексации документа: {e}")
         
         # Если это изображение или документ, предлагаем проанализировать его
-        if processing_result["file_type"] in ["image", "document", "text"]:
+        if processed_type in ["image", "document", "text"]:
             await message.answer(
                 "Файл успешно загружен. Что вы хотите узнать о нем? "
                 "Введите вопрос или нажмите на одну из кнопок:",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="Общий анализ", callback_data="analyze_general")],
-                    [InlineKeyboardButton(text="Выделить ключевые моменты", callback_data="analyze_key_points")],
-                    [InlineKeyboardButton(text="Создать резюме", callback_data="analyze_summary")]
-                ])
+                reply_markup=get_analysis_markup()
             )
             await state.set_state(States.waiting_document_question)
         else:
             await message.answer(
-                f"Файл типа '{processing_result['file_type']}' успешно загружен, но его автоматическая обработка не поддерживается."
+                f"Файл типа '{processed_type}' успешно загружен, но его автоматическая обработка не поддерживается."
             )
 
 # Обработчик выбора языка для транскрибации аудио
@@ -428,14 +685,49 @@ async def process_audio_language(callback_query: CallbackQuery, state: FSMContex
     if lang_code != "auto":
         language = lang_code
     
-    # Отправляем сообщение о начале транскрибации
-    await callback_query.message.answer("🎤 Транскрибирую аудио файл...\nЭто может занять некоторое время.")
+    # Транскрипция повторно присланного аудио берется из индекса загрузок
+    upload_id = data.get("upload_id")
+    upload = await asyncio.to_thread(get_upload, upload_id)
+    transcription = upload["transcriptions"].get(lang_code) if upload else None
     
-    # Выполняем транскрибацию
-    transcription = await asyncio.to_thread(transcribe_audio, audio_file_path, language)
+    streamed_parts = 0
+    if not transcription:
+        # Отправляем сообщение о начале транскрибации
+        await callback_query.message.answer("🎤 Транскрибирую аудио файл...\nЭто может занять некоторое время.")
+        
+        loop = asyncio.get_running_loop()
+        
+        def send_segment(segment: Dict[str, Any], done: int, total: int):
+            # Длинная запись отправляется по частям, по мере распознавания
+            nonlocal streamed_parts
+            if total == 1:
+                return
+            streamed_parts = done
+            future = asyncio.run_coroutine_threadsafe(
+                answer_long(callback_query.message, f"📝 Часть {done} из {total}:\n\n{format_segment(segment)}"),
+                loop
+            )
+            # Ждем отправки, чтобы части пришли в чат по порядку
+            try:
+                future.result(timeout=PARTIAL_SEND_TIMEOUT)
+            except Exception as e:
+                logging.error(f"Ошибка при отправке части транскрипции: {e}")
+        
+        # Выполняем транскрибацию
+        transcription, errors = await asyncio.to_thread(transcribe_audio, audio_file_path, language, send_segment)
+        # Транскрипцию с нераспознанными фрагментами не сохраняем, чтобы следующая попытка распознала их заново
+        if not errors:
+            await asyncio.to_thread(update_upload, upload_id, "transcriptions", lang_code, transcription)
+        elif not is_error_result(transcription):
+            await callback_query.message.answer(
+                f"⚠️ Не удалось распознать частей: {len(errors)}. Транскрипция не сохранена: при повторной попытке они будут распознаны заново."
+            )
     
-    # Отправляем результат транскрибации
-    await callback_query.message.answer(f"📝 Транскрипция аудио:\n\n{transcription}")
+    # Отправляем результат транскрибации (если он не был отправлен по частям)
+    if streamed_parts and not is_error_result(transcription):
+        await callback_query.message.answer(f"✅ Транскрипция готова (частей: {streamed_parts}).")
+    else:
+        await answer_long(callback_query.message, f"📝 Транскрипция аудио:\n\n{transcription}")
     
     # Возвращаемся в основное состояние
     await state.set_state(States.main)
@@ -468,11 +760,22 @@ async def process_document_analysis(callback_query: CallbackQuery, state: FSMCon
     elif analysis_type == "summary":
         question = "Создайте краткое резюме содержимого."
     
-    # Отправляем сообщение о начале анализа
-    await callback_query.message.answer(f"🔍 Анализирую файл...\nЭто может занять некоторое время.")
+    # Результат стандартного анализа повторно присланного файла берется из индекса загрузок
+    upload_id = None if data.get("image_paths") else data.get("upload_id")
+    upload = await asyncio.to_thread(get_upload, upload_id)
+    result = upload["analyses"].get(analysis_type) if upload else None
     
-    # Выполняем анализ
-    result = await asyncio.to_thread(analyze_file_with_ai, file_path, question)
+    if not result:
+        # Отправляем сообщение о начале анализа
+        await callback_query.message.answer(f"🔍 Анализирую файл...\nЭто может занять некоторое время.")
+        
+        # Выполняем анализ (альбом изображений анализируется одним запросом)
+        if data.get("image_paths"):
+            result = await asyncio.to_thread(get_response_with_images, question, data["image_paths"])
+        else:
+            result = await asyncio.to_thread(analyze_file_with_ai, file_path, question)
+            if not is_error_result(result):
+                await asyncio.to_thread(update_upload, upload_id, "analyses", analysis_type, result)
     
     # Отправляем результат
     await callback_query.message.answer(result)
@@ -500,8 +803,22 @@ async def process_document_question(message: Message, state: FSMContext):
     # Отправляем сообщение о начале анализа
     await message.answer(f"🔍 Анализирую файл для ответа на ваш вопрос...\nЭто может занять некоторое время.")
     
+    # Если документ проиндексирован и не помещается в промпт, отправляем модели только релевантные фрагменты.
+    # Документ, который помещается целиком, и вопросы обо всем документе (резюме, основные выводы)
+    # анализируем по полному тексту: по фрагментам ответ был бы неполным
+    passages = []
+    if data.get("document_id") and not is_global_question(message.text):
+        document_chars = await asyncio.to_thread(get_document_chars, data["project_id"], data["document_id"])
+        if document_chars > MAX_DOCUMENT_CHARS:
+            passages = await asyncio.to_thread(search_project, data["project_id"], message.text, document_id=data["document_id"])
+    
     # Выполняем анализ
-    result = await asyncio.to_thread(analyze_file_with_ai, file_path, message.text)
+    if data.get("image_paths"):
+        result = await asyncio.to_thread(get_response_with_images, message.text, data["image_paths"])
+    elif passages:
+        result = await asyncio.to_thread(answer_with_passages, message.text, passages)
+    else:
+        result = await asyncio.to_thread(analyze_file_with_ai, file_path, message.text)
     
     # Отправляем результат
     await message.answer(result)
@@ -523,18 +840,27 @@ async def process_message(message: Message):
     else:
         conversation_id = conversation.id
     
+    # Собираем контекст диалога до сохранения нового сообщения
+    context_summary, history = await asyncio.to_thread(build_conversation_context, conversation_id)
+    
     # Сохраняем сообщение пользователя
     add_message(conversation_id, "user", message.text)
     
     # Получаем ответ от ИИ
     system_prompt = "Вы помощник маркетолога. Отвечайте на вопросы пользователя, помогайте с маркетинговыми стратегиями, планированием и анализом. Всегда старайтесь давать конкретные и полезные советы. Отвечайте на русском языке."
-    response = await asyncio.to_thread(get_text_response, message.text, system_prompt)
+    response = await asyncio.to_thread(
+        get_text_response, message.text, system_prompt,
+        command="chat", history=history, context_summary=context_summary
+    )
     
     # Сохраняем ответ бота
     add_message(conversation_id, "bot", response)
     
     # Отправляем ответ
     await message.answer(response)
+    
+    # Обновляем сводку старой части диалога в фоне
+    schedule_summary_update(conversation_id)
 
 # Функция для запуска бота
 async def main():
@@ -546,7 +872,13 @@ async def main():
     dp.include_router(router)
     
     # Запускаем бота
-    await dp.start_polling(bot, skip_updates=True)
+    try:
+        await dp.start_polling(bot, skip_updates=True)
+    finally:
+        logging.info(f"Статистика извлечения: {get_extraction_stats()}")
+        shutdown_extraction_service()
+        logging.info(f"Статистика распознавания речи: {get_transcription_stats()}")
+        shutdown_transcription_service()
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
@@ -0,0 +1,53 @@
+import asyncio
+import os
+import sys
+from typing import Any, Awaitable, Callable, Dict, List
+from aiogram import BaseMiddleware
+from aiogram.types import Message, TelegramObject
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import MEDIA_GROUP_WAIT_SECONDS
+
+class MediaGroupMiddleware(BaseMiddleware):
+    """
+    Собирает сообщения одного альбома (media_group_id) в один вызов обработчика
+
+    Telegram присылает каждое фото альбома отдельным обновлением. Первое сообщение
+    альбома ждет, пока в течение MEDIA_GROUP_WAIT_SECONDS не перестанут приходить
+    новые, и передает обработчику весь альбом в параметре album. Остальные
+    сообщения альбома обработчик не получает.
+    """
+
+    def __init__(self, wait_seconds: float = MEDIA_GROUP_WAIT_SECONDS):
+        self.wait_seconds = wait_seconds
+        self.albums: Dict[str, List[Message]] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not isinstance(event, Message) or not event.media_group_id:
+            return await handler(event, data)
+
+        album = self.albums.get(event.media_group_id)
+        if album is not None:
+            # Альбом уже собирается первым сообщением
+            album.append(event)
+            return None
+
+        album = self.albums[event.media_group_id] = [event]
+
+        # Ждем, пока не перестанут приходить новые сообщения альбома
+        while True:
+            count = len(album)
+            await asyncio.sleep(self.wait_seconds)
+            if len(album) == count:
+                break
+
+        del self.albums[event.media_group_id]
+        data["album"] = sorted(album, key=lambda message: message.message_id)
+        return await handler(event, data)
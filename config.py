@@ -7,6 +7,11 @@ load_dotenv()
 # Telegram Bot API токен
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
+# Собственный сервер Telegram Bot API (опционально), например http://localhost:8081
+# В режиме --local сервер отдает файлы до 2000 МБ по пути на диске, без скачивания по HTTP
+TELEGRAM_API_SERVER = os.getenv("TELEGRAM_API_SERVER", "")
+TELEGRAM_API_LOCAL = os.getenv("TELEGRAM_API_LOCAL", "true").lower() == "true"
+
 # API ключи для ИИ сервисов
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -32,7 +37,111 @@ DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 CLAUDE_MODEL = os.getenv("CLAUDE_MODEL", "claude-3-opus-20240229")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
 
+# Быстрые модели для простых запросов
+CLAUDE_FAST_MODEL = os.getenv("CLAUDE_FAST_MODEL", "claude-3-5-haiku-20241022")
+GEMINI_FAST_MODEL = os.getenv("GEMINI_FAST_MODEL", "gemini-1.5-flash-8b")
+
+# Автоматический выбор модели по сложности запроса
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() == "true"
+
+# Принудительный уровень модели для команд (fast, heavy или auto), формат "команда:уровень,..."
+MODEL_TIER_OVERRIDES = dict(
+    item.split(":", 1) for item in os.getenv(
+        "MODEL_TIER_OVERRIDES",
+        "chat:auto,search:fast,ideas:heavy,market:heavy,document:heavy,image:heavy,summary:fast"
+    ).replace(" ", "").split(",") if ":" in item
+)
+
 # Другие настройки
+MEDIA_GROUP_WAIT_SECONDS = float(os.getenv("MEDIA_GROUP_WAIT_SECONDS", 1.0))
 MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", 50))
 MAX_TOKENS_RESPONSE = int(os.getenv("MAX_TOKENS_RESPONSE", 4000))
-DEFAULT_LANGUAGE = os.getenv("DEFAULT_LANGUAGE", "ru") 
\ No newline at end of file
+MAX_INPUT_TOKENS = int(os.getenv("MAX_INPUT_TOKENS", 150000))
+DEFAULT_LANGUAGE = os.getenv("DEFAULT_LANGUAGE", "ru")
+
+# Настройки анализа больших документов (map-reduce)
+MAX_DOCUMENT_CHARS = int(os.getenv("MAX_DOCUMENT_CHARS", 150000))
+DOCUMENT_CHUNK_CHARS = int(os.getenv("DOCUMENT_CHUNK_CHARS", 30000))
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", 4))
+SUMMARY_TREE_DIR = os.getenv("SUMMARY_TREE_DIR", os.path.join("temp_files", "summaries"))
+# Поисковый индекс документов проектов
+INDEX_DIR = os.getenv("INDEX_DIR", os.path.join("temp_files", "indexes"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 6))
+
+# Контекст диалога: последние реплики целиком, более старые - в виде сводки
+CONTEXT_RECENT_TURNS = int(os.getenv("CONTEXT_RECENT_TURNS", 6))
+CONTEXT_MESSAGE_MAX_TOKENS = int(os.getenv("CONTEXT_MESSAGE_MAX_TOKENS", 1500))
+CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", 1000))
+
+# Подготовка изображений для моделей
+IMAGE_TARGET_BYTES = int(os.getenv("IMAGE_TARGET_BYTES", 800 * 1024))
+IMAGE_ENCODE_FORMAT = os.getenv("IMAGE_ENCODE_FORMAT", "JPEG")  # JPEG или WEBP
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Кэш извлеченного текста по хэшу содержимого файла
+EXTRACTION_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", os.path.join("temp_files", "extractions"))
+EXTRACTION_CACHE_MAX_MB = int(os.getenv("EXTRACTION_CACHE_MAX_MB", 512))
+
+# Индекс загруженных файлов по file_unique_id Telegram (запись на файл) и лимит записей
+UPLOAD_INDEX_DIR = os.getenv("UPLOAD_INDEX_DIR", os.path.join("temp_files", "uploads"))
+UPLOAD_INDEX_MAX_ENTRIES = int(os.getenv("UPLOAD_INDEX_MAX_ENTRIES", 5000))
+
+# Пул процессов для ресурсоемкого разбора файлов (PDF, OCR, перекодирование аудио)
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", max(1, min(4, (os.cpu_count() or 2) - 1))))
+EXTRACTION_TIMEOUT = int(os.getenv("EXTRACTION_TIMEOUT", 300))
+
+# Извлечение текста из PDF: пачки страниц на процесс и OCR для сканированных страниц
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 16))
+PDF_OCR_ENABLED = os.getenv("PDF_OCR_ENABLED", "true").lower() == "true"
+PDF_OCR_MIN_CHARS = int(os.getenv("PDF_OCR_MIN_CHARS", 25))
+PDF_OCR_DPI = int(os.getenv("PDF_OCR_DPI", 200))
+PDF_OCR_PAGES_PER_TASK = int(os.getenv("PDF_OCR_PAGES_PER_TASK", 2))
+OCR_LANGUAGES = os.getenv("OCR_LANGUAGES", "rus+eng")
+
+# Максимальный объем текста, извлекаемого из одного документа (остаток файла не разбирается)
+DOCUMENT_READ_MAX_CHARS = int(os.getenv("DOCUMENT_READ_MAX_CHARS", 3000000))
+
+# Сводка таблиц (CSV, Excel): размер части при чтении, пример строк, топ значений
+SPREADSHEET_CHUNK_ROWS = int(os.getenv("SPREADSHEET_CHUNK_ROWS", 50000))
+SPREADSHEET_SAMPLE_ROWS = int(os.getenv("SPREADSHEET_SAMPLE_ROWS", 5))
+SPREADSHEET_TOP_N = int(os.getenv("SPREADSHEET_TOP_N", 5))
+SPREADSHEET_FULL_ROWS = int(os.getenv("SPREADSHEET_FULL_ROWS", 200))
+
+# Количество слайдов презентации на один процесс извлечения
+PPTX_SLIDES_PER_TASK = int(os.getenv("PPTX_SLIDES_PER_TASK", 20))
+
+# Движки извлечения текста (сравнить их можно бенчмарком benchmarks/extraction_backends.py)
+# PDF: pypdf2, pypdfium2, pdfminer (нужен пакет pdfminer.six); DOCX: stream, python-docx; OCR: tesseract
+PDF_BACKEND = os.getenv("PDF_BACKEND", "pypdf2")
+DOCX_BACKEND = os.getenv("DOCX_BACKEND", "stream")
+OCR_BACKEND = os.getenv("OCR_BACKEND", "tesseract")
+
+# Распознавание текста на изображениях: целевое разрешение и высота полосы (в пикселях) для параллельного OCR
+OCR_IMAGE_DPI = int(os.getenv("OCR_IMAGE_DPI", 300))
+OCR_TILE_HEIGHT = int(os.getenv("OCR_TILE_HEIGHT", 2000))
+
+# Транскрибация длинных записей: максимальная и минимальная длина фрагмента (в секундах),
+# порог и длительность паузы, по которым режется запись, число параллельных запросов и повторов
+TRANSCRIPTION_SEGMENT_SECONDS = int(os.getenv("TRANSCRIPTION_SEGMENT_SECONDS", 300))
+TRANSCRIPTION_MIN_SEGMENT_SECONDS = int(os.getenv("TRANSCRIPTION_MIN_SEGMENT_SECONDS", 60))
+TRANSCRIPTION_SILENCE_DB = float(os.getenv("TRANSCRIPTION_SILENCE_DB", -35))
+TRANSCRIPTION_SILENCE_SECONDS = float(os.getenv("TRANSCRIPTION_SILENCE_SECONDS", 0.5))
+TRANSCRIPTION_CONCURRENCY = int(os.getenv("TRANSCRIPTION_CONCURRENCY", 4))
+TRANSCRIPTION_RETRIES = int(os.getenv("TRANSCRIPTION_RETRIES", 3))
+
+# Кодек, в который перекодируются (моно, 16 кГц) форматы, не принимаемые API распознавания напрямую: opus или flac
+TRANSCRIPTION_AUDIO_CODEC = os.getenv("TRANSCRIPTION_AUDIO_CODEC", "opus")
+
+# Движок распознавания речи: elevenlabs, local (faster-whisper на CPU, нужен пакет faster-whisper) или auto.
+# В режиме auto записи до TRANSCRIPTION_LOCAL_MAX_SECONDS распознаются локально, длинные - исправным движком
+# с меньшим ожидаемым временем
+TRANSCRIPTION_BACKEND = os.getenv("TRANSCRIPTION_BACKEND", "auto")
+TRANSCRIPTION_LOCAL_MAX_SECONDS = int(os.getenv("TRANSCRIPTION_LOCAL_MAX_SECONDS", 120))
+
+# Локальная модель faster-whisper: размер модели, тип вычислений, количество процессов и потоков на процесс,
+# максимальное время распознавания одного фрагмента (в секундах)
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "small")
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", 1))
+WHISPER_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", max(1, min(4, (os.cpu_count() or 2) // 2))))
+WHISPER_TIMEOUT = int(os.getenv("WHISPER_TIMEOUT", 900))
@@ -9,7 +9,7 @@ from typing import List, Dict, Any, Optional, Tuple
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
-from database.models import Base, User, Project, Task, Document, Conversation, Message
+from database.models import Base, User, Project, Task, Document, Conversation, Message, apply_migrations
 
 # Создаем строку подключения к базе данных
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
@@ -22,9 +22,10 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def init_db():
     """
-    Инициализирует базу данных, создавая все таблицы
+    Инициализирует базу данных, создавая все таблицы и добавляя новые столбцы в существующие
     """
     Base.metadata.create_all(bind=engine)
+    apply_migrations(engine)
 
 def get_db_session():
     """
@@ -276,16 +277,16 @@ def update_task_status(task_id: int, status: str) -> bool:
     
     return True
 
-def save_document(user_id: int, project_id: int, name: str, file_path: str, file_type: str) -> int:
+def save_document(project_id: int, name: str, file_path: str, file_type: str, file_size: int = None) -> int:
     """
     Сохраняет документ
     
     Args:
-        user_id: ID пользователя
         project_id: ID проекта
         name: Название документа
         file_path: Путь к файлу
         file_type: Тип файла
+        file_size: Размер файла в байтах (опционально)
         
     Returns:
         ID сохраненного документа
@@ -294,11 +295,11 @@ def save_document(user_id: int, project_id: int, name: str, file_path: str, file
     
     # Создаем документ
     document = Document(
-        user_id=user_id,
         project_id=project_id,
         name=name,
         file_path=file_path,
-        file_type=file_type
+        document_type=file_type,
+        file_size=file_size
     )
     
     session.add(document)
@@ -344,7 +345,7 @@ def create_conversation(user_id: int, project_id: int = None) -> int:
     conversation = Conversation(
         user_id=user_id,
         project_id=project_id,
-        status="active"
+        is_active=True
     )
     
     session.add(conversation)
@@ -379,7 +380,7 @@ def get_active_conversation(user_id: int, project_id: int = None) -> Optional[Co
     # Получаем последний активный диалог
     conversation = session.execute(
         query.order_by(desc(Conversation.created_at))
-    ).scalar_one_or_none()
+    ).scalars().first()
     
     return conversation
 
@@ -400,7 +401,7 @@ def add_message(conversation_id: int, role: str, content: str) -> int:
     # Создаем сообщение
     message = Message(
         conversation_id=conversation_id,
-        role=role,
+        sender_type=role,
         content=content
     )
     
@@ -428,4 +429,94 @@ def get_conversation_messages(conversation_id: int) -> List[Message]:
         .order_by(Message.created_at)
     ).scalars().all()
     
-    return messages 
\ No newline at end of file
+    return messages
+
+def get_recent_messages(conversation_id: int, limit: int) -> List[Message]:
+    """
+    Возвращает последние сообщения диалога в хронологическом порядке
+    
+    Args:
+        conversation_id: ID диалога
+        limit: Количество сообщений
+        
+    Returns:
+        Список сообщений диалога
+    """
+    session = get_db_session()
+    
+    messages = session.execute(
+        select(Message)
+        .where(Message.conversation_id == conversation_id)
+        .order_by(desc(Message.id))
+        .limit(limit)
+    ).scalars().all()
+    
+    return list(reversed(messages))
+
+def get_messages_in_range(conversation_id: int, after_id: Optional[int], before_id: int) -> List[Message]:
+    """
+    Возвращает сообщения диалога с ID в диапазоне (after_id, before_id)
+    
+    Args:
+        conversation_id: ID диалога
+        after_id: ID сообщения, после которого начинать (None - с начала диалога)
+        before_id: ID сообщения, перед которым закончить
+        
+    Returns:
+        Список сообщений в хронологическом порядке
+    """
+    session = get_db_session()
+    
+    query = select(Message).where(
+        (Message.conversation_id == conversation_id) &
+        (Message.id < before_id)
+    )
+    if after_id:
+        query = query.where(Message.id > after_id)
+    
+    messages = session.execute(query.order_by(Message.id)).scalars().all()
+    
+    return messages
+
+def get_conversation_by_id(conversation_id: int) -> Optional[Conversation]:
+    """
+    Возвращает диалог по ID
+    
+    Args:
+        conversation_id: ID диалога
+        
+    Returns:
+        Объект диалога или None, если диалог не найден
+    """
+    session = get_db_session()
+    
+    conversation = session.execute(
+        select(Conversation)
+        .where(Conversation.id == conversation_id)
+    ).scalar_one_or_none()
+    
+    return conversation
+
+def update_conversation_summary(conversation_id: int, summary: str, summarized_until_id: int) -> bool:
+    """
+    Обновляет сводку старой части диалога
+    
+    Args:
+        conversation_id: ID диалога
+        summary: Новая сводка
+        summarized_until_id: ID последнего сообщения, вошедшего в сводку
+        
+    Returns:
+        True, если сводка обновлена, иначе False
+    """
+    session = get_db_session()
+    
+    result = session.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(summary=summary, summarized_until_id=summarized_until_id)
+    )
+    
+    session.commit()
+    
+    return result.rowcount > 0
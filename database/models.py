@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Float, create_engine, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Float, create_engine, JSON, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from datetime import datetime
@@ -113,6 +113,8 @@ class Conversation(Base):
     project_id = Column(Integer, ForeignKey('projects.id'), nullable=True)
     created_at = Column(DateTime, default=datetime.now)
     is_active = Column(Boolean, default=True)
+    summary = Column(Text, nullable=True)  # сводка старой части диалога
+    summarized_until_id = Column(Integer, nullable=True)  # ID последнего сообщения, вошедшего в сводку
     
     # Связи с другими таблицами
     user = relationship("User", back_populates="conversations")
@@ -144,10 +146,28 @@ class Message(Base):
     def get_metadata(self):
         return json.loads(self.message_metadata) if self.message_metadata else {}
 
+# Столбцы, добавленные в уже существующие таблицы (create_all не изменяет созданные таблицы)
+MIGRATIONS = [
+    "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS summary TEXT",
+    "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS summarized_until_id INTEGER",
+]
+
+def apply_migrations(engine):
+    """
+    Добавляет новые столбцы в существующие таблицы (повторный запуск ничего не меняет)
+    
+    Args:
+        engine: Движок SQLAlchemy
+    """
+    with engine.begin() as connection:
+        for statement in MIGRATIONS:
+            connection.execute(text(statement))
+
 # Функция для инициализации базы данных
 def init_db():
     engine = create_engine(DATABASE_URL)
     Base.metadata.create_all(engine)
+    apply_migrations(engine)
     Session = sessionmaker(bind=engine)
     return Session()
 
@@ -155,4 +175,5 @@ def init_db():
 if __name__ == "__main__":
     engine = create_engine(DATABASE_URL)
     Base.metadata.create_all(engine)
+    apply_migrations(engine)
     print("База данных успешно инициализирована.") 
\ No newline at end of file
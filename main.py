@@ -2,32 +2,37 @@ import asyncio
 import logging
 import os
 import sys
-from aiogram import Bot
 
 # Добавляем корневую директорию проекта в sys.path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from config import BOT_TOKEN
-from database.db_operations import init_db
-from bot.bot import main as bot_main
-from bot.scheduler import start_scheduler
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("bot.log"),
-        logging.StreamHandler()
-    ]
-)
+# Процессы пулов извлечения и распознавания речи (spawn) заново импортируют этот модуль
+# как __mp_main__, поэтому на уровне модуля нельзя поднимать бота, клиентов ИИ, базу и лог-файл:
+# они импортируются и настраиваются только при запуске приложения
 
 logger = logging.getLogger(__name__)
 
+def setup_logging():
+    """
+    Настраивает логирование в файл bot.log и в консоль
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler("bot.log"),
+            logging.StreamHandler()
+        ]
+    )
+
 async def startup():
     """
     Выполняет необходимые действия при запуске приложения
     """
+    from database.db_operations import init_db
+    from bot.bot import main as bot_main
+    from bot.scheduler import start_scheduler
+    
     try:
         # Инициализируем базу данных
         logger.info("Инициализация базы данных...")
@@ -47,6 +52,8 @@ async def startup():
         raise
 
 if __name__ == "__main__":
+    setup_logging()
+    
     # Запускаем приложение
     try:
         asyncio.run(startup())
@@ -0,0 +1,474 @@
+import os
+import sys
+import re
+import json
+import math
+import logging
+import threading
+import zlib
+import numpy as np
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import INDEX_DIR, RETRIEVAL_TOP_K
+
+# Параметры BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Размерность плотных векторов (хэширование признаков)
+VECTOR_DIM = 512
+
+# Вес BM25 в итоговой оценке (остальное - косинусная близость векторов)
+BM25_WEIGHT = 0.6
+
+# Размер фрагмента документа в символах
+PASSAGE_CHARS = 1200
+
+# Длина основы слова для BM25 (грубый стемминг для русского языка)
+STEM_LENGTH = 7
+
+# Вопросы обо всем документе, на которые отвечаем по полному тексту, а не по найденным фрагментам
+GLOBAL_QUESTION_RE = re.compile(
+    r"\b(?:о\s+ч[её]м|резюм|кратк|суммар|сводк|в\s+целом|целиком|весь\s+документ|всего\s+документа|"
+    r"основн[а-я]*\s+(?:иде|мысл|вывод|тез|момент)|ключев[а-я]*\s+(?:иде|мысл|вывод|тез|момент)|"
+    r"summar|overview|main\s+points|key\s+points|overall)",
+    re.IGNORECASE
+)
+
+# Загруженные индексы проектов
+_indexes: Dict[int, "ProjectIndex"] = {}
+_indexes_lock = threading.Lock()
+
+def tokenize(text: str) -> List[str]:
+    """Разбивает текст на нормализованные основы слов"""
+    return [word[:STEM_LENGTH] for word in re.findall(r"\w+", text.lower()) if len(word) > 1]
+
+def split_passages(text: str, max_chars: int = PASSAGE_CHARS) -> List[str]:
+    """
+    Разбивает текст документа на фрагменты для индекса по границам абзацев
+
+    Args:
+        text: Текст документа
+        max_chars: Максимальная длина фрагмента
+
+    Returns:
+        Список фрагментов
+    """
+    passages = []
+    current = ""
+    for paragraph in re.split(r"\f|\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        # Слишком длинный абзац режем по строкам и по длине
+        pieces = [paragraph] if len(paragraph) <= max_chars else [
+            line[i:i + max_chars] for line in paragraph.split("\n") for i in range(0, len(line), max_chars)
+        ]
+        for piece in pieces:
+            if current and len(current) + len(piece) + 1 > max_chars:
+                passages.append(current)
+                current = ""
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        passages.append(current)
+    return passages
+
+def embed_text(text: str) -> np.ndarray:
+    """
+    Строит плотный вектор текста хэшированием слов и символьных триграмм
+
+    Args:
+        text: Текст
+
+    Returns:
+        Нормированный вектор размерности VECTOR_DIM
+    """
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    words = re.findall(r"\w+", text.lower())
+    features = Counter(words)
+    for word in words:
+        padded = f" {word} "
+        features.update(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    for feature, count in features.items():
+        hashed = zlib.crc32(feature.encode("utf-8"))
+        sign = 1.0 if hashed & 0x80000000 else -1.0
+        vector[hashed % VECTOR_DIM] += sign * (1.0 + math.log(count))
+
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+class ProjectIndex:
+    """Поисковый индекс документов проекта: инвертированный индекс BM25 и плотные векторы"""
+
+    def __init__(self, project_id: int):
+        self.project_id = project_id
+        self.directory = os.path.join(INDEX_DIR, f"project_{project_id}")
+        self.lock = threading.RLock()
+        # passage_id -> {document_id, document_name, text, length, tf}
+        self.passages: Dict[int, Dict[str, Any]] = {}
+        # term -> {passage_id: tf}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        # document_id -> [passage_id, ...]
+        self.documents: Dict[int, List[int]] = {}
+        # passage_id -> строка в матрице векторов
+        self.rows: Dict[int, int] = {}
+        self.vectors = np.zeros((0, VECTOR_DIM), dtype=np.float32)
+        self.next_passage_id = 0
+        self.total_length = 0
+
+    def add_document(self, document_id: int, text: str, document_name: str = "") -> int:
+        """
+        Добавляет документ в индекс (повторное добавление заменяет старую версию)
+
+        Args:
+            document_id: ID документа
+            text: Текст документа
+            document_name: Название документа
+
+        Returns:
+            Количество добавленных фрагментов
+        """
+        passages = split_passages(text)
+        vectors = np.vstack([embed_text(passage) for passage in passages]) if passages else None
+
+        with self.lock:
+            self.remove_document(document_id)
+
+            passage_ids = []
+            for passage in passages:
+                passage_id = self.next_passage_id
+                self.next_passage_id += 1
+
+                tf = Counter(tokenize(passage))
+                length = sum(tf.values())
+                self.passages[passage_id] = {
+                    "document_id": document_id,
+                    "document_name": document_name,
+                    "text": passage,
+                    "length": length,
+                    "tf": dict(tf)
+                }
+                for term, count in tf.items():
+                    self.postings.setdefault(term, {})[passage_id] = count
+                self.total_length += length
+                self.rows[passage_id] = len(self.vectors) + len(passage_ids)
+                passage_ids.append(passage_id)
+
+            if vectors is not None:
+                self.vectors = np.vstack([self.vectors, vectors])
+            self.documents[document_id] = passage_ids
+
+        return len(passages)
+
+    def remove_document(self, document_id: int) -> bool:
+        """
+        Удаляет документ из индекса
+
+        Args:
+            document_id: ID документа
+
+        Returns:
+            True, если документ был в индексе
+        """
+        with self.lock:
+            passage_ids = self.documents.pop(document_id, None)
+            if passage_ids is None:
+                return False
+
+            for passage_id in passage_ids:
+                passage = self.passages.pop(passage_id)
+                for term in passage["tf"]:
+                    term_postings = self.postings.get(term)
+                    if term_postings is not None:
+                        term_postings.pop(passage_id, None)
+                        if not term_postings:
+                            del self.postings[term]
+                self.total_length -= passage["length"]
+                # Строку вектора обнуляем, матрица уплотняется, когда удаленных строк становится больше половины
+                self.vectors[self.rows.pop(passage_id)] = 0.0
+
+            if len(self.vectors) > 2 * len(self.rows):
+                self._compact()
+            return True
+
+    def _compact(self) -> None:
+        """Уплотняет матрицу векторов, отбрасывая строки удаленных фрагментов"""
+        order = sorted(self.rows, key=self.rows.get)
+        self.vectors = self.vectors[[self.rows[passage_id] for passage_id in order]] if order else np.zeros((0, VECTOR_DIM), dtype=np.float32)
+        self.rows = {passage_id: row for row, passage_id in enumerate(order)}
+
+    def document_chars(self, document_id: int) -> int:
+        """
+        Возвращает объем проиндексированного текста документа
+
+        Args:
+            document_id: ID документа
+
+        Returns:
+            Количество символов во фрагментах документа (0, если его нет в индексе)
+        """
+        with self.lock:
+            return sum(len(self.passages[passage_id]["text"]) for passage_id in self.documents.get(document_id, []))
+
+    def search(self, query: str, top_k: int = RETRIEVAL_TOP_K, document_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Ищет наиболее релевантные фрагменты (BM25 + косинусная близость)
+
+        Args:
+            query: Поисковый запрос
+            top_k: Количество фрагментов
+            document_id: Искать только в указанном документе (опционально)
+
+        Returns:
+            Список фрагментов {document_id, document_name, text, score} по убыванию релевантности
+        """
+        with self.lock:
+            if not self.passages:
+                return []
+
+            if document_id is not None:
+                candidates = self.documents.get(document_id, [])
+            else:
+                candidates = list(self.passages)
+            if not candidates:
+                return []
+
+            # BM25 по инвертированному индексу
+            total = len(self.passages)
+            average_length = self.total_length / total if total else 0.0
+            bm25: Dict[int, float] = {}
+            for term in set(tokenize(query)):
+                term_postings = self.postings.get(term)
+                if not term_postings:
+                    continue
+                idf = math.log(1 + (total - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+                for passage_id, tf in term_postings.items():
+                    length = self.passages[passage_id]["length"]
+                    denominator = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / (average_length or 1))
+                    bm25[passage_id] = bm25.get(passage_id, 0.0) + idf * tf * (BM25_K1 + 1) / denominator
+
+            # Косинусная близость плотных векторов
+            rows = np.array([self.rows[passage_id] for passage_id in candidates])
+            similarities = self.vectors[rows] @ embed_text(query)
+
+            max_bm25 = max(bm25.values()) if bm25 else 0.0
+            scores = np.clip(similarities, 0.0, None) * (1 - BM25_WEIGHT)
+            if max_bm25 > 0:
+                scores += BM25_WEIGHT * np.array([bm25.get(passage_id, 0.0) for passage_id in candidates]) / max_bm25
+
+            best = np.argsort(-scores)[:top_k]
+            return [
+                {
+                    "document_id": self.passages[candidates[i]]["document_id"],
+                    "document_name": self.passages[candidates[i]]["document_name"],
+                    "text": self.passages[candidates[i]]["text"],
+                    "score": float(scores[i])
+                }
+                for i in best if scores[i] > 0
+            ]
+
+    def _document_paths(self, document_id: int) -> tuple:
+        """Пути к файлам документа в индексе: фрагменты (JSON) и их векторы (.npy)"""
+        base = os.path.join(self.directory, f"document_{document_id}")
+        return f"{base}.json", f"{base}.npy"
+
+    def save_document(self, document_id: int) -> None:
+        """
+        Сохраняет на диск один документ индекса
+
+        Каждый документ хранится в своих файлах, поэтому добавление документа
+        не переписывает индекс всего проекта.
+
+        Args:
+            document_id: ID документа
+        """
+        with self.lock:
+            passage_ids = self.documents.get(document_id)
+            if passage_ids is None:
+                return
+            data = {
+                "document_id": document_id,
+                "passages": {str(passage_id): self.passages[passage_id] for passage_id in passage_ids}
+            }
+            vectors = self.vectors[[self.rows[passage_id] for passage_id in passage_ids]] if passage_ids else np.zeros((0, VECTOR_DIM), dtype=np.float32)
+
+        os.makedirs(self.directory, exist_ok=True)
+        json_path, vectors_path = self._document_paths(document_id)
+        # Пишем во временные файлы и переименовываем, чтобы не оставить поврежденный документ;
+        # векторы записываются первыми, документ без JSON при загрузке пропускается
+        with open(f"{vectors_path}.tmp", "wb") as f:
+            np.save(f, vectors)
+        os.replace(f"{vectors_path}.tmp", vectors_path)
+        with open(f"{json_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(f"{json_path}.tmp", json_path)
+
+    def delete_document(self, document_id: int) -> None:
+        """
+        Удаляет файлы документа с диска
+
+        Args:
+            document_id: ID документа
+        """
+        for path in self._document_paths(document_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def load(self) -> bool:
+        """
+        Загружает индекс с диска
+
+        Returns:
+            True, если найден хотя бы один документ
+        """
+        if not os.path.isdir(self.directory):
+            return False
+
+        passages: Dict[int, Dict[str, Any]] = {}
+        documents: Dict[int, List[int]] = {}
+        blocks = []
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith("document_") and name.endswith(".json")):
+                continue
+            json_path = os.path.join(self.directory, name)
+            vectors_path = json_path[:-len(".json")] + ".npy"
+            try:
+                with open(json_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                vectors = np.load(vectors_path)
+            except Exception as e:
+                logging.error(f"Ошибка при загрузке документа индекса {json_path}: {e}")
+                continue
+            ids = [int(passage_id) for passage_id in data["passages"]]
+            if len(ids) != len(vectors):
+                logging.error(f"Документ индекса {json_path} поврежден: фрагментов {len(ids)}, векторов {len(vectors)}")
+                continue
+            documents[int(data["document_id"])] = ids
+            passages.update((int(passage_id), passage) for passage_id, passage in data["passages"].items())
+            blocks.append(vectors)
+
+        with self.lock:
+            self.passages = passages
+            self.documents = documents
+            self.rows = {passage_id: row for row, passage_id in enumerate(passage_id for ids in documents.values() for passage_id in ids)}
+            self.vectors = np.vstack(blocks) if blocks else np.zeros((0, VECTOR_DIM), dtype=np.float32)
+            self.next_passage_id = max(passages, default=-1) + 1
+
+            # Восстанавливаем инвертированный индекс из частот терминов
+            self.postings = {}
+            self.total_length = 0
+            for passage_id, passage in self.passages.items():
+                for term, count in passage["tf"].items():
+                    self.postings.setdefault(term, {})[passage_id] = count
+                self.total_length += passage["length"]
+
+        return bool(documents)
+
+def get_project_index(project_id: int) -> ProjectIndex:
+    """
+    Возвращает индекс проекта, загружая его с диска при первом обращении
+
+    Args:
+        project_id: ID проекта
+
+    Returns:
+        Индекс проекта
+    """
+    with _indexes_lock:
+        index = _indexes.get(project_id)
+        if index is None:
+            index = ProjectIndex(project_id)
+            try:
+                index.load()
+            except Exception as e:
+                logging.error(f"Ошибка при загрузке индекса проекта {project_id}: {e}")
+                index = ProjectIndex(project_id)
+            _indexes[project_id] = index
+        return index
+
+def index_document(project_id: int, document_id: int, text: str, document_name: str = "") -> int:
+    """
+    Добавляет документ в индекс проекта и сохраняет его на диск
+
+    Args:
+        project_id: ID проекта
+        document_id: ID документа
+        text: Текст документа
+        document_name: Название документа
+
+    Returns:
+        Количество проиндексированных фрагментов
+    """
+    index = get_project_index(project_id)
+    count = index.add_document(document_id, text, document_name)
+    index.save_document(document_id)
+    logging.info(f"Документ {document_id} добавлен в индекс проекта {project_id}: {count} фрагментов")
+    return count
+
+def remove_document_from_index(project_id: int, document_id: int) -> bool:
+    """
+    Удаляет документ из индекса проекта и его файлы с диска
+
+    Args:
+        project_id: ID проекта
+        document_id: ID документа
+
+    Returns:
+        True, если документ был в индексе
+    """
+    index = get_project_index(project_id)
+    removed = index.remove_document(document_id)
+    if removed:
+        index.delete_document(document_id)
+    return removed
+
+def get_document_chars(project_id: int, document_id: int) -> int:
+    """
+    Возвращает объем проиндексированного текста документа
+
+    Args:
+        project_id: ID проекта
+        document_id: ID документа
+
+    Returns:
+        Количество символов
+    """
+    return get_project_index(project_id).document_chars(document_id)
+
+def is_global_question(question: str) -> bool:
+    """
+    Проверяет, относится ли вопрос ко всему документу (резюме, основные выводы), а не к отдельному факту
+
+    На такие вопросы найденные фрагменты дают неполный ответ.
+
+    Args:
+        question: Вопрос пользователя
+
+    Returns:
+        True для вопросов обо всем документе
+    """
+    return bool(GLOBAL_QUESTION_RE.search(question or ""))
+
+def search_project(project_id: int, query: str, top_k: int = RETRIEVAL_TOP_K, document_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Ищет фрагменты документов проекта, релевантные запросу
+
+    Args:
+        project_id: ID проекта
+        query: Поисковый запрос
+        top_k: Количество фрагментов
+        document_id: Искать только в указанном документе (опционально)
+
+    Returns:
+        Список найденных фрагментов
+    """
+    return get_project_index(project_id).search(query, top_k, document_id)
@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import EXTRACTION_CACHE_DIR, EXTRACTION_CACHE_MAX_MB
+from utils.json_store import write_json_atomic, evict_lru
+
+# Размер блока при хэшировании файла
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Сколько хэшей файлов помнить в памяти
+MAX_HASH_MEMO = 1024
+
+# Хэши уже прочитанных файлов: путь -> (размер, время изменения, хэш)
+_hash_memo: "OrderedDict[str, tuple]" = OrderedDict()
+_hash_lock = threading.Lock()
+
+# Текущий размер кэша на диске в байтах (None - еще не подсчитан)
+_cache_bytes: Optional[int] = None
+_cache_lock = threading.Lock()
+
+def file_sha256(file_path: str) -> str:
+    """
+    Вычисляет SHA-256 содержимого файла (потоково, без загрузки в память)
+
+    Args:
+        file_path: Путь к файлу
+
+    Returns:
+        Хэш в шестнадцатеричном виде
+    """
+    stat = os.stat(file_path)
+    with _hash_lock:
+        memo = _hash_memo.get(file_path)
+        if memo and memo[0] == stat.st_size and memo[1] == stat.st_mtime_ns:
+            _hash_memo.move_to_end(file_path)
+            return memo[2]
+
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha.update(block)
+    digest = sha.hexdigest()
+
+    with _hash_lock:
+        _hash_memo[file_path] = (stat.st_size, stat.st_mtime_ns, digest)
+        _hash_memo.move_to_end(file_path)
+        while len(_hash_memo) > MAX_HASH_MEMO:
+            _hash_memo.popitem(last=False)
+    return digest
+
+def _entry_path(content_hash: str, kind: str) -> str:
+    """Возвращает путь к записи кэша"""
+    return os.path.join(EXTRACTION_CACHE_DIR, content_hash[:2], f"{content_hash}.{kind}.json")
+
+def get_cached(content_hash: str, kind: str = "text") -> Optional[Dict[str, Any]]:
+    """
+    Возвращает запись кэша по хэшу содержимого
+
+    Args:
+        content_hash: SHA-256 содержимого файла
+        kind: Вид записи (text - извлеченный текст)
+
+    Returns:
+        Запись кэша или None
+    """
+    path = _entry_path(content_hash, kind)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+        # Обновляем время изменения - по нему работает вытеснение давно не используемых записей
+        os.utime(path, None)
+        return record
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.error(f"Ошибка при чтении кэша извлечения {path}: {e}")
+        return None
+
+def store_cached(content_hash: str, record: Dict[str, Any], kind: str = "text") -> None:
+    """
+    Сохраняет запись в кэш и вытесняет давно не используемые записи при переполнении
+
+    Args:
+        content_hash: SHA-256 содержимого файла
+        record: Данные записи
+        kind: Вид записи
+    """
+    global _cache_bytes
+
+    path = _entry_path(content_hash, kind)
+    try:
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        written = write_json_atomic(path, record)
+    except Exception as e:
+        logging.error(f"Ошибка при записи кэша извлечения {path}: {e}")
+        return
+
+    # Каталог обходим только при первом подсчете и при переполнении, а не на каждой записи
+    with _cache_lock:
+        if _cache_bytes is not None:
+            _cache_bytes += written - replaced
+        over_limit = _cache_bytes is None or _cache_bytes > EXTRACTION_CACHE_MAX_MB * 1024 * 1024
+    if over_limit:
+        evict_cache()
+
+def evict_cache(max_mb: int = EXTRACTION_CACHE_MAX_MB) -> int:
+    """
+    Удаляет давно не использовавшиеся записи, пока кэш не уложится в лимит
+
+    Args:
+        max_mb: Максимальный размер кэша в мегабайтах
+
+    Returns:
+        Количество удаленных записей
+    """
+    global _cache_bytes
+
+    with _cache_lock:
+        removed, _cache_bytes = evict_lru(EXTRACTION_CACHE_DIR, max_bytes=max_mb * 1024 * 1024)
+        if removed:
+            logging.info(f"Из кэша извлечения удалено записей: {removed}")
+        return removed
+
+def extract_with_cache(
+    file_path: str,
+    extractor: Callable[[str], Dict[str, Any]],
+    kind: str = "text",
+    accept: Optional[Callable[[Dict[str, Any]], bool]] = None
+) -> Dict[str, Any]:
+    """
+    Возвращает результат извлечения из кэша или выполняет извлечение и кэширует его
+
+    Args:
+        file_path: Путь к файлу
+        extractor: Функция извлечения, возвращающая {"text", "page_offsets", "metadata"} и, при сбоях, непустой "failed"
+        kind: Вид записи кэша
+        accept: Проверка, подходит ли запись из кэша (например, не обрезана ли она меньшим бюджетом)
+
+    Returns:
+        Результат извлечения с полем content_hash
+    """
+    content_hash = file_sha256(file_path)
+
+    record = get_cached(content_hash, kind)
+    if record is not None and (accept is None or accept(record)):
+        logging.info(f"Извлечение {os.path.basename(file_path)} взято из кэша ({content_hash[:12]})")
+        return record
+
+    start = time.perf_counter()
+    record = extractor(file_path)
+    record["content_hash"] = content_hash
+    record.setdefault("metadata", {})["extraction_seconds"] = round(time.perf_counter() - start, 3)
+
+    # Пустой результат и результат со сбоями (пачки или полосы с ошибкой или таймаутом)
+    # не кэшируем, чтобы можно было повторить попытку
+    if record.get("text") and not record.get("failed"):
+        store_cached(content_hash, record, kind)
+    return record
@@ -0,0 +1,237 @@
+import os
+import sys
+import time
+import signal
+import logging
+import threading
+import multiprocessing
+import concurrent.futures
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Any, Callable, Dict, List, Optional
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import EXTRACTION_WORKERS, EXTRACTION_TIMEOUT
+
+# Признак отсутствия значения по умолчанию в run_extraction
+_NO_DEFAULT = object()
+
+# Предупреждение о росте очереди: map_extraction ставит в очередь сразу все части
+# одного файла (волна страниц PDF, группы OCR, пачки слайдов, полосы изображения),
+# поэтому очередь в несколько раз больше числа процессов - обычная нагрузка
+QUEUE_WARNING_FACTOR = 8
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_futures: Dict[Future, ProcessPoolExecutor] = {}
+# Очереди, в которые рабочие процессы пула сообщают свой PID
+_executor_pids: Dict[ProcessPoolExecutor, Any] = {}
+# RLock: отмена задачи под блокировкой синхронно вызывает _on_done
+_executor_lock = threading.RLock()
+
+# Метрики сервиса
+_stats = {
+    "submitted": 0,
+    "completed": 0,
+    "failed": 0,
+    "timed_out": 0,
+    "cancelled": 0,
+    "max_queue_depth": 0,
+    "total_seconds": 0.0,
+    "pool_restarts": 0
+}
+
+class ExtractionTimeout(Exception):
+    """Задача извлечения не уложилась в отведенное время"""
+
+def register_worker(pid_queue, initializer: Optional[Callable] = None, *initargs) -> None:
+    """
+    Инициализатор рабочего процесса пула: сообщает его PID для принудительной остановки
+
+    Args:
+        pid_queue: Очередь PID рабочих процессов пула
+        initializer: Собственный инициализатор пула, вызываемый следом (опционально)
+        *initargs: Аргументы собственного инициализатора
+    """
+    pid_queue.put(os.getpid())
+    if initializer is not None:
+        initializer(*initargs)
+
+def terminate_workers(pid_queue) -> None:
+    """
+    Принудительно завершает рабочие процессы пула по PID из очереди register_worker
+
+    Публичного API для остановки выполняющейся задачи у ProcessPoolExecutor нет.
+
+    Args:
+        pid_queue: Очередь, переданная в инициализатор пула
+    """
+    while not pid_queue.empty():
+        pid = pid_queue.get()
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Возвращает пул процессов, создавая его при первом обращении"""
+    global _executor
+    if _executor is None:
+        # spawn вместо fork: процесс бота многопоточный, а fork копирует захваченные блокировки
+        context = multiprocessing.get_context("spawn")
+        pid_queue = context.SimpleQueue()
+        _executor = ProcessPoolExecutor(
+            max_workers=EXTRACTION_WORKERS,
+            mp_context=context,
+            initializer=register_worker,
+            initargs=(pid_queue,)
+        )
+        _executor_pids[_executor] = pid_queue
+        logging.info(f"Запущен пул извлечения: {EXTRACTION_WORKERS} процессов")
+    return _executor
+
+def _retire_executor(executor: ProcessPoolExecutor, hung_future: Future) -> None:
+    """
+    Выводит из работы пул с зависшей задачей
+
+    Новые задачи сразу уходят в новый пул, а процессы старого завершаются
+    принудительно, когда доработают остальные его задачи.
+    """
+    global _executor
+    if _executor is executor:
+        _executor = None
+        _stats["pool_restarts"] += 1
+
+    def terminate_when_idle():
+        others = [future for future, owner in list(_executor_futures.items()) if owner is executor and future is not hung_future]
+        concurrent.futures.wait(others, timeout=EXTRACTION_TIMEOUT)
+        with _executor_lock:
+            pid_queue = _executor_pids.pop(executor, None)
+        if pid_queue is not None:
+            terminate_workers(pid_queue)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    threading.Thread(target=terminate_when_idle, daemon=True).start()
+
+def _on_done(future: Future, submitted_at: float) -> None:
+    """Учитывает завершение задачи в метриках, время считается от постановки этой задачи в очередь"""
+    with _executor_lock:
+        _executor_futures.pop(future, None)
+        if future.cancelled():
+            _stats["cancelled"] += 1
+            return
+        if future.exception() is not None:
+            _stats["failed"] += 1
+        else:
+            _stats["completed"] += 1
+        _stats["total_seconds"] += time.perf_counter() - submitted_at
+
+def submit_extraction(func: Callable, *args) -> Future:
+    """
+    Ставит задачу извлечения в очередь пула процессов
+
+    Args:
+        func: Функция модуля utils.extractors
+        *args: Аргументы функции
+
+    Returns:
+        Future задачи (можно отменить, пока задача в очереди)
+    """
+    with _executor_lock:
+        executor = _get_executor()
+        submitted_at = time.perf_counter()
+        future = executor.submit(func, *args)
+        _executor_futures[future] = executor
+        _stats["submitted"] += 1
+        queue_depth = len(_executor_futures)
+        _stats["max_queue_depth"] = max(_stats["max_queue_depth"], queue_depth)
+    if queue_depth > EXTRACTION_WORKERS * QUEUE_WARNING_FACTOR:
+        logging.warning(f"Очередь извлечения растет: {queue_depth} задач на {EXTRACTION_WORKERS} процессов")
+    future.add_done_callback(lambda done: _on_done(done, submitted_at))
+    return future
+
+def _collect(future: Future, func: Callable, args: tuple, timeout: Optional[float], default: Any) -> Any:
+    """Ждет результат задачи, обрабатывая таймаут и ошибки"""
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        with _executor_lock:
+            _stats["timed_out"] += 1
+            # Задачу из очереди просто отменяем, а выполняющуюся останавливаем вместе с ее пулом
+            owner = _executor_futures.get(future)
+            if not future.cancel() and owner is not None:
+                _retire_executor(owner, future)
+        logging.error(f"Превышено время извлечения ({timeout} с): {func.__name__}{args}")
+        if default is _NO_DEFAULT:
+            raise ExtractionTimeout(f"Превышено время обработки файла ({timeout} с)")
+        return default
+    except Exception as e:
+        logging.error(f"Ошибка в задаче извлечения {func.__name__}{args}: {e}")
+        if default is _NO_DEFAULT:
+            raise
+        return default
+
+def run_extraction(func: Callable, *args, timeout: Optional[float] = EXTRACTION_TIMEOUT, default: Any = _NO_DEFAULT) -> Any:
+    """
+    Выполняет ресурсоемкую задачу в пуле процессов и ждет результат
+
+    Вызывается из рабочих потоков (asyncio.to_thread), поэтому ожидание не
+    блокирует цикл событий, а разбор файлов не конкурирует за GIL с запросами к ИИ.
+
+    Args:
+        func: Функция модуля utils.extractors
+        *args: Аргументы функции
+        timeout: Максимальное время выполнения в секундах
+        default: Значение, возвращаемое при ошибке или таймауте (если не задано - исключение)
+
+    Returns:
+        Результат функции
+    """
+    future = submit_extraction(func, *args)
+    return _collect(future, func, args, timeout, default)
+
+def map_extraction(func: Callable, args_list: List[tuple], timeout: Optional[float] = EXTRACTION_TIMEOUT, default: Any = _NO_DEFAULT) -> List[Any]:
+    """
+    Выполняет набор задач параллельно в пуле процессов
+
+    Args:
+        func: Функция модуля utils.extractors
+        args_list: Аргументы для каждой задачи
+        timeout: Общее время на все задачи в секундах
+        default: Результат задачи при ошибке или таймауте (если не задано - исключение)
+
+    Returns:
+        Результаты в порядке аргументов
+    """
+    start = time.perf_counter()
+    futures = [submit_extraction(func, *args) for args in args_list]
+
+    results = []
+    for future, args in zip(futures, args_list):
+        remaining = None if timeout is None else max(0.0, timeout - (time.perf_counter() - start))
+        results.append(_collect(future, func, args, remaining, default))
+    return results
+
+def get_extraction_stats() -> Dict[str, Any]:
+    """
+    Возвращает метрики сервиса извлечения
+
+    Returns:
+        Словарь с количеством задач, текущей глубиной очереди и средним временем
+    """
+    with _executor_lock:
+        stats = dict(_stats)
+        stats["queue_depth"] = len(_executor_futures)
+    finished = stats["completed"] + stats["failed"]
+    stats["avg_seconds"] = round(stats["total_seconds"] / finished, 3) if finished else 0.0
+    stats["workers"] = EXTRACTION_WORKERS
+    return stats
+
+def shutdown_extraction_service() -> None:
+    """Останавливает пул процессов, отменяя задачи в очереди"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor_pids.pop(_executor, None)
+            _executor = None
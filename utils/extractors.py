@@ -0,0 +1,1029 @@
+import os
+import sys
+import io
+import re
+import math
+import mmap
+import codecs
+import subprocess
+import zipfile
+import importlib.util
+import posixpath
+import xml.etree.ElementTree as ET
+from contextlib import suppress
+import pydub
+import pytesseract
+import PyPDF2
+import pypdfium2
+from PIL import Image, ImageOps
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Модуль выполняется в рабочих процессах извлечения (utils.extraction_service),
+# поэтому в нем только ресурсоемкий разбор файлов, без клиентов ИИ и базы данных
+
+# Элементы WordprocessingML
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+W_P = W_NS + "p"
+W_T = W_NS + "t"
+W_TAB = W_NS + "tab"
+W_BR = W_NS + "br"
+W_CR = W_NS + "cr"
+W_TBL = W_NS + "tbl"
+W_TR = W_NS + "tr"
+W_TC = W_NS + "tc"
+
+# Элементы PresentationML и DrawingML
+P_SLD_ID = "{http://schemas.openxmlformats.org/presentationml/2006/main}sldId"
+R_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+REL = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+REL_NOTES = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/notesSlide"
+A_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+A_P = A_NS + "p"
+A_R = A_NS + "r"
+A_T = A_NS + "t"
+A_FLD = A_NS + "fld"
+A_BR = A_NS + "br"
+A_TR = A_NS + "tr"
+A_TC = A_NS + "tc"
+
+# Размер блока при чтении текстовых файлов и объем пробы для определения кодировки (в байтах)
+TEXT_BLOCK_BYTES = 256 * 1024
+ENCODING_SAMPLE_BYTES = 1024 * 1024
+
+# Метки порядка байтов: кодеки utf-8-sig и utf-16 сами пропускают метку
+TEXT_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16")
+)
+# Подготовка изображений к OCR: допустимый масштаб, разрешение экранных снимков без метаданных,
+# предел размера после масштабирования, диапазон и шаг поиска наклона (в градусах),
+# минимальная высота полосы в пикселях
+OCR_MIN_SCALE = 0.5
+OCR_MAX_SCALE = 2.0
+SCREEN_DPI = 96
+OCR_MAX_PIXELS = 60_000_000
+DESKEW_MAX_ANGLE = 5.0
+DESKEW_STEP = 0.5
+MIN_OCR_TILE_HEIGHT = 200
+
+# Отметки начала и конца тишины в выводе фильтра silencedetect ffmpeg
+SILENCE_START_RE = re.compile(r"silence_start: (-?[\d.]+)")
+SILENCE_END_RE = re.compile(r"silence_end: (-?[\d.]+)")
+
+# Кодеки нормализации аудио для распознавания речи: расширение результата и параметры ffmpeg
+AUDIO_CODECS = {
+    "opus": (".ogg", ["-c:a", "libopus", "-b:a", "32k", "-application", "voip"]),
+    "flac": (".flac", ["-c:a", "flac"])
+}
+SPEECH_SAMPLE_RATE = 16000
+
+# Однобайтовые кириллические кодировки и самые частые буквы русского текста в обоих регистрах
+# (в cp1251 и koi8_r строчные и прописные буквы меняются местами, поэтому текст
+# заглавными буквами без прописных букв в наборе определялся бы как koi8_r)
+CYRILLIC_ENCODINGS = ("cp1251", "koi8_r", "cp866")
+FREQUENT_CYRILLIC = set("оеаинтсрвлкмдпу") | set("оеаинтсрвлкмдпу".upper())
+
+def collect_text(chunks: Iterator[str], max_chars: Optional[int] = None) -> str:
+    """
+    Собирает текст из генератора, останавливая чтение при достижении бюджета
+    
+    Args:
+        chunks: Генератор фрагментов текста
+        max_chars: Максимальное количество символов (None - без ограничения)
+        
+    Returns:
+        Собранный текст
+    """
+    parts = []
+    total = 0
+    for chunk in chunks:
+        parts.append(chunk)
+        total += len(chunk)
+        if max_chars and total >= max_chars:
+            # Закрываем генератор, чтобы остаток файла не разбирался
+            chunks.close()
+            break
+    return "".join(parts)
+
+def guess_encoding(sample: bytes, complete: bool = False) -> str:
+    """
+    Определяет кодировку по пробе байтов за один проход
+    
+    Args:
+        sample: Начало файла
+        complete: Проба содержит файл целиком
+        
+    Returns:
+        Название кодировки
+    """
+    for bom, encoding in TEXT_BOMS:
+        if sample.startswith(bom):
+            return encoding
+    
+    try:
+        # Проба может оборваться посреди многобайтового символа
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=complete)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    
+    # Частоты байтов старшей половины таблицы считаем один раз для всех кандидатов
+    counts = {byte: sample.count(bytes((byte,))) for byte in range(0x80, 0x100)}
+    high_total = sum(counts.values())
+    
+    best_encoding, best_score = "latin-1", 0
+    for encoding in CYRILLIC_ENCODINGS:
+        score = sum(
+            count for byte, count in counts.items()
+            if count and bytes((byte,)).decode(encoding, errors="replace") in FREQUENT_CYRILLIC
+        )
+        if score > best_score:
+            best_encoding, best_score = encoding, score
+    
+    # В русском тексте частые буквы составляют больше половины не-ASCII символов
+    return best_encoding if best_score * 2 >= high_total else "latin-1"
+
+def detect_text_encoding(file_path: str) -> str:
+    """
+    Определяет кодировку текстового файла по его началу
+    
+    Args:
+        file_path: Путь к файлу
+        
+    Returns:
+        Название кодировки
+    """
+    with open(file_path, "rb") as f:
+        sample = f.read(ENCODING_SAMPLE_BYTES)
+    return guess_encoding(sample, complete=len(sample) < ENCODING_SAMPLE_BYTES)
+
+def iter_text_from_txt(file_path: str, block_bytes: int = TEXT_BLOCK_BYTES) -> Iterator[str]:
+    """
+    Читает текстовый файл блоками через отображение в память, не загружая его целиком
+    
+    Кодировка определяется по началу файла, после чего файл декодируется
+    инкрементально за один проход.
+    
+    Args:
+        file_path: Путь к файлу
+        block_bytes: Размер блока в байтах
+        
+    Yields:
+        Блоки текста
+    """
+    try:
+        with open(file_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # Пустой файл отобразить в память нельзя
+            if not size:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mapped, "madvise"):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                encoding = guess_encoding(mapped[:ENCODING_SAMPLE_BYTES], complete=size <= ENCODING_SAMPLE_BYTES)
+                # Переводы строк приводим к \n, как при чтении файла в текстовом режиме
+                decoder = io.IncrementalNewlineDecoder(
+                    codecs.getincrementaldecoder(encoding)(errors="replace"), translate=True
+                )
+                for offset in range(0, size, block_bytes):
+                    block = decoder.decode(mapped[offset:offset + block_bytes], final=offset + block_bytes >= size)
+                    if block:
+                        yield block
+    except Exception as e:
+        print(f"Ошибка при чтении текстового файла: {e}")
+
+def extract_text_from_txt(file_path: str, max_chars: Optional[int] = None) -> str:
+    """
+    Извлекает текст из текстового файла
+    
+    Args:
+        file_path: Путь к файлу
+        max_chars: Максимальное количество символов (опционально)
+        
+    Returns:
+        Извлеченный текст
+    """
+    return collect_text(iter_text_from_txt(file_path), max_chars)
+
+def _docx_paragraph_text(paragraph: ET.Element, in_table: bool) -> str:
+    """Собирает текст абзаца DOCX из его прогонов"""
+    parts = []
+    for node in paragraph.iter():
+        if node.tag == W_T and node.text:
+            parts.append(node.text)
+        elif node.tag == W_TAB:
+            parts.append(" ")
+        elif node.tag in (W_BR, W_CR):
+            # Внутри ячейки перевод строки сломал бы TSV
+            parts.append(" " if in_table else "\n")
+    return "".join(parts)
+
+def _iter_docx_part(archive: zipfile.ZipFile, part_name: str) -> Iterator[str]:
+    """
+    Потоково разбирает XML-часть DOCX: абзацы и таблицы в порядке документа
+    
+    Разобранные элементы очищаются и удаляются из дерева, поэтому память
+    не растет с размером документа. Таблицы выводятся в формате TSV.
+    """
+    stack = []
+    # Для каждой открытой таблицы: ячейки текущей строки и абзацы текущей ячейки
+    tables = []
+    
+    with archive.open(part_name) as f:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                stack.append(elem)
+                if elem.tag == W_TBL:
+                    tables.append({"cells": [], "paragraphs": []})
+                continue
+            
+            stack.pop()
+            tag = elem.tag
+            
+            if tag == W_P:
+                text = _docx_paragraph_text(elem, bool(tables))
+                if tables:
+                    tables[-1]["paragraphs"].append(text.strip())
+                elif text.strip():
+                    yield text + "\n"
+                elem.clear()
+            elif tag == W_TC and tables:
+                table = tables[-1]
+                table["cells"].append(" ".join(p for p in table["paragraphs"] if p).replace("\t", " "))
+                table["paragraphs"] = []
+                elem.clear()
+            elif tag == W_TR and tables:
+                table = tables[-1]
+                row = "\t".join(table["cells"])
+                table["cells"] = []
+                if len(tables) == 1:
+                    if row.strip():
+                        yield row + "\n"
+                else:
+                    # Вложенная таблица становится текстом ячейки внешней
+                    tables[-2]["paragraphs"].append(row.replace("\t", " | "))
+                elem.clear()
+            elif tag == W_TBL and tables:
+                tables.pop()
+                if not tables:
+                    yield "\n"
+                elem.clear()
+            else:
+                continue
+            
+            # Обработанный элемент верхнего уровня удаляем из родителя
+            if stack and not tables and tag in (W_P, W_TBL):
+                with suppress(ValueError):
+                    stack[-1].remove(elem)
+
+def _iter_docx_stream(file_path: str) -> Iterator[str]:
+    """
+    Потоково извлекает текст файла .docx: абзацы, таблицы (TSV), колонтитулы и сноски
+    
+    Args:
+        file_path: Путь к файлу
+        
+    Yields:
+        Абзацы и строки таблиц с переводом строки
+    """
+    try:
+        archive = zipfile.ZipFile(file_path)
+    except Exception as e:
+        print(f"Ошибка при чтении файла docx: {e}")
+        return
+    
+    with archive:
+        names = set(archive.namelist())
+        # (заголовок раздела, части документа, убирать ли повторы)
+        sections = [
+            ("", ["word/document.xml"], False),
+            ("Колонтитулы", sorted((name for name in names if re.fullmatch(r"word/(header|footer)\d*\.xml", name)), key=lambda name: (not name.startswith("word/header"), name)), True),
+            ("Сноски", [name for name in ("word/footnotes.xml", "word/endnotes.xml") if name in names], False)
+        ]
+        
+        seen = set()
+        for title, parts, unique in sections:
+            title_pending = bool(title)
+            for part_name in parts:
+                if part_name not in names:
+                    continue
+                try:
+                    for chunk in _iter_docx_part(archive, part_name):
+                        # Одинаковые колонтитулы разных разделов выводим один раз
+                        if unique:
+                            if chunk in seen:
+                                continue
+                            seen.add(chunk)
+                        if title_pending:
+                            yield f"\n{title}:\n"
+                            title_pending = False
+                        yield chunk
+                except ET.ParseError as e:
+                    print(f"Ошибка при разборе {part_name} в файле docx: {e}")
+
+def _iter_docx_python_docx(file_path: str) -> Iterator[str]:
+    """Абзацы и таблицы (TSV) тела документа через объектную модель python-docx"""
+    import docx
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+    
+    try:
+        document = docx.Document(file_path)
+    except Exception as e:
+        print(f"Ошибка при чтении файла docx: {e}")
+        return
+    
+    for element in document.element.body.iterchildren():
+        if element.tag == W_P:
+            yield Paragraph(element, document).text + "\n"
+        elif element.tag == W_TBL:
+            for row in Table(element, document).rows:
+                yield "\t".join(cell.text.replace("\n", " ") for cell in row.cells) + "\n"
+
+def iter_text_from_docx(file_path: str, backend: str = "stream") -> Iterator[str]:
+    """
+    Извлекает текст файла .docx по частям
+    
+    Args:
+        file_path: Путь к файлу
+        backend: Движок из DOCX_BACKENDS
+        
+    Yields:
+        Абзацы и строки таблиц с переводом строки
+    """
+    return resolve_backend(DOCX_BACKENDS, backend)(file_path)
+
+def extract_text_from_docx(file_path: str, max_chars: Optional[int] = None, backend: str = "stream") -> str:
+    """
+    Извлекает текст из файла .docx
+    
+    Args:
+        file_path: Путь к файлу
+        max_chars: Максимальное количество символов (опционально)
+        backend: Движок из DOCX_BACKENDS
+        
+    Returns:
+        Извлеченный текст
+    """
+    return collect_text(iter_text_from_docx(file_path, backend), max_chars)
+
+def _iter_pdf_pages_pypdf2(file_path: str, start: int, end: Optional[int]) -> Iterator[str]:
+    """Текстовый слой страниц PDF через PyPDF2"""
+    try:
+        f = open(file_path, "rb")
+    except Exception as e:
+        print(f"Ошибка при чтении файла PDF: {e}")
+        return
+    
+    with f:
+        try:
+            pdf_reader = PyPDF2.PdfReader(f)
+            page_count = len(pdf_reader.pages)
+        except Exception as e:
+            print(f"Ошибка при чтении файла PDF: {e}")
+            return
+        
+        for number in range(start, min(end if end is not None else page_count, page_count)):
+            try:
+                text = pdf_reader.pages[number].extract_text() or ""
+            except Exception as e:
+                # Поврежденная страница не должна терять остальные
+                print(f"Ошибка при чтении страницы {number + 1} PDF: {e}")
+                text = ""
+            yield text
+
+def _iter_pdf_pages_pdfium(file_path: str, start: int, end: Optional[int]) -> Iterator[str]:
+    """Текстовый слой страниц PDF через pypdfium2 (PDFium)"""
+    try:
+        pdf = pypdfium2.PdfDocument(file_path)
+    except Exception as e:
+        print(f"Ошибка при чтении файла PDF: {e}")
+        return
+    
+    try:
+        for number in range(start, min(end if end is not None else len(pdf), len(pdf))):
+            try:
+                page = pdf[number]
+                textpage = page.get_textpage()
+                text = textpage.get_text_range().replace("\r\n", "\n")
+                textpage.close()
+                page.close()
+            except Exception as e:
+                print(f"Ошибка при чтении страницы {number + 1} PDF: {e}")
+                text = ""
+            yield text
+    finally:
+        pdf.close()
+
+def _iter_pdf_pages_pdfminer(file_path: str, start: int, end: Optional[int]) -> Iterator[str]:
+    """Текстовый слой страниц PDF через pdfminer.six (медленнее, но точнее сохраняет порядок колонок)"""
+    from pdfminer.high_level import extract_pages
+    from pdfminer.layout import LTTextContainer
+    
+    page_count = count_pdf_pages(file_path)
+    try:
+        for page in extract_pages(file_path, page_numbers=range(start, min(end if end is not None else page_count, page_count))):
+            yield "".join(element.get_text() for element in page if isinstance(element, LTTextContainer))
+    except Exception as e:
+        print(f"Ошибка при чтении файла PDF: {e}")
+
+def _ocr_tesseract(image: Image.Image, lang: str) -> str:
+    """Распознавание изображения через Tesseract"""
+    return pytesseract.image_to_string(image, lang=lang)
+
+# Реестр движков извлечения по форматам: имя -> (функция, модуль, который должен быть установлен).
+# Первый движок в словаре используется по умолчанию
+PDF_BACKENDS: Dict[str, Tuple[Callable, str]] = {
+    "pypdf2": (_iter_pdf_pages_pypdf2, "PyPDF2"),
+    "pypdfium2": (_iter_pdf_pages_pdfium, "pypdfium2"),
+    "pdfminer": (_iter_pdf_pages_pdfminer, "pdfminer")
+}
+DOCX_BACKENDS: Dict[str, Tuple[Callable, str]] = {
+    "stream": (_iter_docx_stream, "xml"),
+    "python-docx": (_iter_docx_python_docx, "docx")
+}
+OCR_BACKENDS: Dict[str, Tuple[Callable, str]] = {
+    "tesseract": (_ocr_tesseract, "pytesseract")
+}
+
+def resolve_backend(backends: Dict[str, Tuple[Callable, str]], name: str) -> Callable:
+    """
+    Возвращает функцию движка по имени
+    
+    Неизвестный или не установленный движок заменяется движком по умолчанию,
+    чтобы опечатка в настройках не ломала обработку файлов.
+    
+    Args:
+        backends: Реестр движков формата
+        name: Имя движка
+        
+    Returns:
+        Функция движка
+    """
+    default = next(iter(backends))
+    if name not in backends:
+        print(f"Неизвестный движок извлечения {name!r}, используется {default!r}")
+        name = default
+    func, module = backends[name]
+    if name != default and importlib.util.find_spec(module) is None:
+        print(f"Движок извлечения {name!r} не установлен (нет модуля {module}), используется {default!r}")
+        func = backends[default][0]
+    return func
+
+def available_backends(backends: Dict[str, Tuple[Callable, str]]) -> List[str]:
+    """
+    Возвращает имена установленных движков формата
+    
+    Args:
+        backends: Реестр движков формата
+        
+    Returns:
+        Список имен движков
+    """
+    return [name for name, (_, module) in backends.items() if importlib.util.find_spec(module) is not None]
+
+def iter_pages_from_pdf(file_path: str, start: int = 0, end: Optional[int] = None, backend: str = "pypdf2") -> Iterator[str]:
+    """
+    Извлекает текстовый слой страниц PDF по одной, не разбирая остальные страницы
+    
+    Args:
+        file_path: Путь к файлу
+        start: Номер первой страницы (с нуля)
+        end: Номер страницы после последней (None - до конца документа)
+        backend: Движок из PDF_BACKENDS
+        
+    Yields:
+        Текст страницы
+    """
+    return resolve_backend(PDF_BACKENDS, backend)(file_path, start, end)
+
+def extract_pages_from_pdf(file_path: str, backend: str = "pypdf2") -> List[str]:
+    """
+    Извлекает текст из файла PDF постранично
+
+    Args:
+        file_path: Путь к файлу
+        backend: Движок из PDF_BACKENDS
+
+    Returns:
+        Список текстов страниц
+    """
+    return list(iter_pages_from_pdf(file_path, backend=backend))
+
+def _read_relationships(archive: zipfile.ZipFile, part_name: str) -> Dict[str, Tuple[str, str]]:
+    """Читает связи части OOXML: ID -> (тип, путь к целевой части в архиве)"""
+    directory, name = posixpath.split(part_name)
+    rels_name = posixpath.join(directory, "_rels", name + ".rels")
+    if rels_name not in archive.namelist():
+        return {}
+    
+    relationships = {}
+    root = ET.fromstring(archive.read(rels_name))
+    for rel in root.iter(REL):
+        target = rel.get("Target", "")
+        # Путь задается относительно части или от корня архива
+        path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(directory, target))
+        relationships[rel.get("Id")] = (rel.get("Type", ""), path)
+    return relationships
+
+def list_pptx_slides(file_path: str) -> List[List[str]]:
+    """
+    Возвращает слайды презентации в порядке показа
+    
+    Args:
+        file_path: Путь к файлу
+        
+    Returns:
+        Список пар [часть слайда, часть заметок или пустая строка]
+    """
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            presentation = ET.fromstring(archive.read("ppt/presentation.xml"))
+            relationships = _read_relationships(archive, "ppt/presentation.xml")
+            slides = []
+            for slide_id in presentation.iter(P_SLD_ID):
+                relationship = relationships.get(slide_id.get(R_ID))
+                if not relationship:
+                    continue
+                slide_part = relationship[1]
+                notes_part = next(
+                    (path for rel_type, path in _read_relationships(archive, slide_part).values() if rel_type == REL_NOTES),
+                    ""
+                )
+                slides.append([slide_part, notes_part])
+            return slides
+    except Exception as e:
+        print(f"Ошибка при чтении файла pptx: {e}")
+        return []
+
+def _pptx_paragraph_text(paragraph: ET.Element) -> str:
+    """Собирает текст абзаца DrawingML, пропуская поле с номером слайда"""
+    parts = []
+    for child in paragraph:
+        if child.tag == A_R:
+            parts.append("".join(node.text or "" for node in child.iter(A_T)))
+        elif child.tag == A_FLD and child.get("type") != "slidenum":
+            parts.append("".join(node.text or "" for node in child.iter(A_T)))
+        elif child.tag == A_BR:
+            parts.append(" ")
+    return "".join(parts).strip()
+
+def _pptx_part_text(archive: zipfile.ZipFile, part_name: str) -> str:
+    """Потоково извлекает текст слайда или заметок: абзацы фигур и таблицы (TSV)"""
+    lines = []
+    row = None
+    cell = None
+    
+    with archive.open(part_name) as f:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                if tag == A_TR:
+                    row = []
+                elif tag == A_TC:
+                    cell = []
+                continue
+            
+            if tag == A_P:
+                text = _pptx_paragraph_text(elem)
+                if cell is not None:
+                    cell.append(text)
+                elif text:
+                    lines.append(text)
+                elem.clear()
+            elif tag == A_TC and row is not None:
+                row.append(" ".join(text for text in cell or [] if text).replace("\t", " "))
+                cell = None
+                elem.clear()
+            elif tag == A_TR:
+                if any(row):
+                    lines.append("\t".join(row))
+                row = None
+                elem.clear()
+    
+    return "\n".join(lines)
+
+def extract_pptx_slides(file_path: str, slides: List[List[str]], first_number: int = 1) -> List[str]:
+    """
+    Извлекает текст слайдов с заметками докладчика
+    
+    Args:
+        file_path: Путь к файлу
+        slides: Пары [часть слайда, часть заметок] из list_pptx_slides
+        first_number: Номер первого слайда в списке
+        
+    Returns:
+        Тексты слайдов в исходном порядке
+    """
+    texts = []
+    with zipfile.ZipFile(file_path) as archive:
+        for number, (slide_part, notes_part) in enumerate(slides, start=first_number):
+            try:
+                text = _pptx_part_text(archive, slide_part)
+                notes = _pptx_part_text(archive, notes_part) if notes_part else ""
+            except (KeyError, ET.ParseError) as e:
+                print(f"Ошибка при чтении слайда {number} pptx: {e}")
+                text, notes = "", ""
+            
+            slide_text = f"Слайд {number}:\n{text}" if text else f"Слайд {number}:"
+            if notes:
+                slide_text += f"\nЗаметки: {notes}"
+            texts.append(slide_text)
+    return texts
+
+def extract_text_from_pptx(file_path: str) -> str:
+    """
+    Извлекает текст презентации .pptx в одном процессе
+    
+    Args:
+        file_path: Путь к файлу
+        
+    Returns:
+        Извлеченный текст
+    """
+    slides = list_pptx_slides(file_path)
+    return "".join(text + "\n\n" for text in extract_pptx_slides(file_path, slides)) if slides else ""
+
+def count_pdf_pages(file_path: str) -> int:
+    """
+    Возвращает количество страниц PDF
+    
+    Args:
+        file_path: Путь к файлу
+        
+    Returns:
+        Количество страниц (0, если файл не читается)
+    """
+    try:
+        with open(file_path, "rb") as f:
+            return len(PyPDF2.PdfReader(f).pages)
+    except Exception as e:
+        print(f"Ошибка при чтении файла PDF: {e}")
+        return 0
+
+def extract_pdf_page_range(file_path: str, start: int, end: int, backend: str = "pypdf2") -> List[str]:
+    """
+    Извлекает текстовый слой страниц PDF из диапазона [start, end)
+    
+    Args:
+        file_path: Путь к файлу
+        start: Номер первой страницы (с нуля)
+        end: Номер страницы после последней
+        backend: Движок из PDF_BACKENDS
+        
+    Returns:
+        Список текстов страниц диапазона
+    """
+    return list(iter_pages_from_pdf(file_path, start, end, backend))
+
+def _otsu_threshold(image: Image.Image) -> int:
+    """Порог бинаризации по методу Оцу (по гистограмме изображения в оттенках серого)"""
+    histogram = image.histogram()
+    total = sum(histogram)
+    sum_all = sum(level * count for level, count in enumerate(histogram))
+    
+    weight_background = sum_background = 0
+    best_variance, threshold = 0.0, 127
+    for level, count in enumerate(histogram):
+        weight_background += count
+        weight_foreground = total - weight_background
+        if not weight_background:
+            continue
+        if not weight_foreground:
+            break
+        sum_background += level * count
+        mean_background = sum_background / weight_background
+        mean_foreground = (sum_all - sum_background) / weight_foreground
+        variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_variance, threshold = variance, level
+    return threshold
+
+def _row_profile(image: Image.Image) -> List[float]:
+    """Средняя яркость каждой строки пикселей"""
+    return list(image.resize((1, image.height), Image.BOX).getdata())
+
+def _estimate_skew(image: Image.Image) -> float:
+    """
+    Оценивает наклон текста методом проекций
+    
+    При правильном повороте строки текста и промежутки между ними дают
+    наибольший разброс средней яркости строк пикселей.
+    """
+    small = image.copy()
+    small.thumbnail((1000, 1000))
+    
+    best_angle, best_score = 0.0, -1.0
+    steps = int(DESKEW_MAX_ANGLE / DESKEW_STEP)
+    for step in range(-steps, steps + 1):
+        angle = step * DESKEW_STEP
+        profile = _row_profile(small.rotate(angle, resample=Image.NEAREST, fillcolor=255))
+        mean = sum(profile) / len(profile)
+        score = sum((value - mean) ** 2 for value in profile)
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+def prepare_for_ocr(image: Image.Image, scale: float = 1.0, deskew: bool = True) -> Image.Image:
+    """
+    Готовит изображение к OCR: оттенки серого, масштаб, бинаризация и выравнивание наклона
+    
+    Args:
+        image: Исходное изображение
+        scale: Коэффициент масштабирования
+        deskew: Выравнивать ли наклон текста
+        
+    Returns:
+        Черно-белое изображение с темным текстом на светлом фоне
+    """
+    gray = image.convert("L")
+    if abs(scale - 1.0) > 0.05:
+        gray = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))), Image.LANCZOS)
+    gray = ImageOps.autocontrast(gray, cutoff=1)
+    
+    threshold = _otsu_threshold(gray)
+    binary = gray.point([0] * (threshold + 1) + [255] * (255 - threshold))
+    # Темная тема интерфейса: светлый текст на темном фоне инвертируем
+    if sum(_row_profile(binary)) / binary.height < 128:
+        binary = ImageOps.invert(binary)
+    
+    if deskew:
+        angle = _estimate_skew(binary)
+        if angle:
+            binary = binary.rotate(angle, resample=Image.NEAREST, expand=True, fillcolor=255)
+    return binary
+
+def _ocr_scale(image: Image.Image, dpi: int) -> float:
+    """Коэффициент масштабирования до целевого разрешения OCR"""
+    source_dpi = (image.info.get("dpi") or (0, 0))[0] or SCREEN_DPI
+    scale = min(max(dpi / source_dpi, OCR_MIN_SCALE), OCR_MAX_SCALE)
+    # Огромные изображения не увеличиваем сверх предела по памяти
+    pixels = image.width * image.height
+    if pixels * scale ** 2 > OCR_MAX_PIXELS:
+        scale = max(min(scale, math.sqrt(OCR_MAX_PIXELS / pixels)), OCR_MIN_SCALE)
+    return scale
+
+def _tile_boxes(image: Image.Image, tile_height: int) -> List[Tuple[int, int, int, int]]:
+    """
+    Делит изображение на горизонтальные полосы для параллельного OCR
+    
+    Границы полос ищутся в пустых промежутках между строками текста,
+    чтобы не разрезать строку пополам.
+    """
+    # Полоса должна вмещать несколько строк текста (и непустое окно поиска границы)
+    tile_height = max(tile_height, MIN_OCR_TILE_HEIGHT)
+    if image.height <= tile_height * 1.25:
+        return [(0, 0, image.width, image.height)]
+    
+    profile = _row_profile(image)
+    boxes = []
+    top = 0
+    while image.height - top > tile_height * 1.25:
+        target = top + tile_height
+        # Самая светлая строка в последней пятой части полосы, при равенстве - ближайшая к границе
+        cut = max(range(target - tile_height // 5, target), key=lambda row: (profile[row], row))
+        boxes.append((0, top, image.width, cut))
+        top = cut
+    boxes.append((0, top, image.width, image.height))
+    return boxes
+
+def _load_for_ocr(file_path: str, dpi: int) -> Image.Image:
+    """Открывает изображение с учетом ориентации из EXIF и готовит его к OCR"""
+    with Image.open(file_path) as image:
+        image = ImageOps.exif_transpose(image)
+        return prepare_for_ocr(image, _ocr_scale(image, dpi))
+
+def prepare_image_for_ocr(file_path: str, target_path: str, dpi: int = 300, tile_height: int = 2000) -> List[Tuple[int, int, int, int]]:
+    """
+    Подготавливает изображение к OCR, сохраняет результат и делит его на полосы
+    
+    Args:
+        file_path: Путь к исходному изображению
+        target_path: Путь для подготовленного изображения (PNG)
+        dpi: Целевое разрешение
+        tile_height: Высота полосы в пикселях подготовленного изображения
+        
+    Returns:
+        Границы полос (left, top, right, bottom) сверху вниз
+    """
+    try:
+        image = _load_for_ocr(file_path, dpi)
+        image.save(target_path, format="PNG")
+        return _tile_boxes(image, tile_height)
+    except Exception as e:
+        print(f"Ошибка при подготовке изображения к OCR: {e}")
+        return []
+
+def ocr_image_tile(image_path: str, box: Tuple[int, int, int, int], lang: str = "rus+eng", backend: str = "tesseract") -> Optional[str]:
+    """
+    Распознает полосу подготовленного изображения
+    
+    Args:
+        image_path: Путь к подготовленному изображению
+        box: Границы полосы (left, top, right, bottom)
+        lang: Языки Tesseract
+        backend: Движок из OCR_BACKENDS
+        
+    Returns:
+        Распознанный текст или None, если распознать полосу не удалось
+    """
+    try:
+        with Image.open(image_path) as image:
+            return resolve_backend(OCR_BACKENDS, backend)(image.crop(tuple(box)), lang)
+    except Exception as e:
+        print(f"Ошибка при распознавании фрагмента изображения: {e}")
+        return None
+
+def ocr_pdf_pages(file_path: str, page_numbers: List[int], dpi: int = 200, lang: str = "rus+eng", backend: str = "tesseract") -> List[Optional[str]]:
+    """
+    Распознает страницы PDF без текстового слоя (сканы): растеризация и Tesseract
+    
+    Args:
+        file_path: Путь к файлу
+        page_numbers: Номера страниц (с нуля)
+        dpi: Разрешение растеризации
+        lang: Языки Tesseract
+        backend: Движок из OCR_BACKENDS
+        
+    Returns:
+        Список распознанных текстов в порядке page_numbers (None для страниц, распознать которые не удалось)
+    """
+    recognize = resolve_backend(OCR_BACKENDS, backend)
+    pdf = pypdfium2.PdfDocument(file_path)
+    try:
+        texts = []
+        for number in page_numbers:
+            page = pdf[number]
+            try:
+                image = page.render(scale=dpi / 72, grayscale=True).to_pil()
+                texts.append(recognize(prepare_for_ocr(image), lang))
+            except Exception as e:
+                print(f"Ошибка при распознавании страницы {number + 1} PDF: {e}")
+                texts.append(None)
+            finally:
+                page.close()
+        return texts
+    finally:
+        pdf.close()
+
+def extract_text_from_image(file_path: str, lang: str = "rus+eng", backend: str = "tesseract", dpi: int = 300, tile_height: int = 2000) -> str:
+    """
+    Извлекает текст из изображения с помощью OCR в текущем процессе
+    
+    Args:
+        file_path: Путь к файлу
+        lang: Языки Tesseract
+        backend: Движок из OCR_BACKENDS
+        dpi: Целевое разрешение
+        tile_height: Высота полосы в пикселях подготовленного изображения
+        
+    Returns:
+        Извлеченный текст
+    """
+    try:
+        recognize = resolve_backend(OCR_BACKENDS, backend)
+        image = _load_for_ocr(file_path, dpi)
+        texts = [recognize(image.crop(box), lang).strip() for box in _tile_boxes(image, tile_height)]
+        return "\n".join(text for text in texts if text)
+    except Exception as e:
+        print(f"Ошибка при извлечении текста из изображения: {e}")
+        return ""
+
+def probe_audio_duration(file_path: str) -> float:
+    """
+    Возвращает длительность аудио в секундах (по заголовкам, без декодирования)
+    
+    Args:
+        file_path: Путь к файлу
+        
+    Returns:
+        Длительность в секундах (0.0, если определить не удалось)
+    """
+    try:
+        return float(pydub.utils.mediainfo(file_path).get("duration") or 0.0)
+    except Exception as e:
+        print(f"Ошибка при определении длительности аудио: {e}")
+        return 0.0
+
+def detect_silences(file_path: str, noise_db: float = -35.0, min_silence: float = 0.5) -> List[Tuple[float, float]]:
+    """
+    Находит паузы в аудио фильтром silencedetect ffmpeg
+    
+    ffmpeg декодирует файл потоково, поэтому память не зависит от длительности записи.
+    
+    Args:
+        file_path: Путь к файлу
+        noise_db: Уровень, ниже которого звук считается тишиной (дБ)
+        min_silence: Минимальная длительность паузы в секундах
+        
+    Returns:
+        Список пауз (начало, конец) в секундах
+    """
+    command = [
+        pydub.utils.get_encoder_name(), "-hide_banner", "-nostats", "-vn", "-i", file_path,
+        "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}", "-f", "null", "-"
+    ]
+    silences = []
+    start = None
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors="replace")
+        for line in process.stderr:
+            match = SILENCE_START_RE.search(line)
+            if match:
+                start = max(float(match.group(1)), 0.0)
+                continue
+            match = SILENCE_END_RE.search(line)
+            if match and start is not None:
+                silences.append((start, float(match.group(1))))
+                start = None
+        process.wait()
+    except Exception as e:
+        print(f"Ошибка при поиске пауз в аудио: {e}")
+    return silences
+
+def normalize_audio(file_path: str, target_base: str, codec: str = "opus") -> str:
+    """
+    Перекодирует аудио в моно 16 кГц (Opus или FLAC) для распознавания речи
+    
+    ffmpeg читает и пишет файл потоково, запись не загружается в память целиком.
+    
+    Args:
+        file_path: Путь к исходному файлу
+        target_base: Путь к результату без расширения
+        codec: Кодек из AUDIO_CODECS
+        
+    Returns:
+        Путь к перекодированному файлу
+    """
+    extension, codec_args = AUDIO_CODECS.get(codec, AUDIO_CODECS["opus"])
+    target_path = target_base + extension
+    command = [
+        pydub.utils.get_encoder_name(), "-hide_banner", "-loglevel", "error", "-y", "-i", file_path,
+        "-vn", "-ac", "1", "-ar", str(SPEECH_SAMPLE_RATE), *codec_args, target_path
+    ]
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    return target_path
+
+def cut_audio_segment(file_path: str, target_path: str, start: float = 0.0, duration: Optional[float] = None) -> str:
+    """
+    Вырезает фрагмент аудио без перекодирования (копированием пакетов)
+    
+    Args:
+        file_path: Путь к исходному файлу
+        target_path: Путь к результату (с тем же расширением, что и исходный файл)
+        start: Начало фрагмента в секундах
+        duration: Длительность фрагмента в секундах (None - до конца файла)
+        
+    Returns:
+        Путь к фрагменту
+    """
+    command = [pydub.utils.get_encoder_name(), "-hide_banner", "-loglevel", "error", "-y"]
+    if start:
+        command += ["-ss", f"{start:.3f}"]
+    command += ["-i", file_path]
+    if duration is not None:
+        command += ["-t", f"{duration:.3f}"]
+    command += ["-vn", "-c:a", "copy", target_path]
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    return target_path
+
+# Модель распознавания речи рабочего процесса (загружается один раз при запуске процесса)
+_whisper_model = None
+
+def load_whisper_model(model_name: str = "small", compute_type: str = "int8", cpu_threads: int = 4) -> None:
+    """
+    Загружает модель faster-whisper в рабочем процессе (инициализатор пула)
+    
+    Args:
+        model_name: Имя или путь модели (tiny, base, small, medium, large-v3)
+        compute_type: Тип вычислений CTranslate2 (int8 - самый быстрый на CPU)
+        cpu_threads: Количество потоков на процесс
+    """
+    global _whisper_model
+    from faster_whisper import WhisperModel
+    _whisper_model = WhisperModel(model_name, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+
+def transcribe_with_whisper(file_path: str, language: Optional[str] = None) -> Dict:
+    """
+    Распознает речь локальной моделью faster-whisper
+    
+    Args:
+        file_path: Путь к аудио файлу (любой формат, который читает ffmpeg)
+        language: Код языка (None - авто-определение)
+        
+    Returns:
+        Словарь {text, language, segments: [{start, end, text}]}
+    """
+    # Жадный поиск (beam_size=1) на CPU в разы быстрее поиска по лучу при небольшой потере точности,
+    # фильтр VAD пропускает паузы, не тратя на них время
+    segments, info = _whisper_model.transcribe(file_path, language=language, beam_size=1, vad_filter=True)
+    parts = [{"start": segment.start, "end": segment.end, "text": segment.text.strip()} for segment in segments]
+    return {
+        "text": " ".join(part["text"] for part in parts if part["text"]),
+        "language": info.language,
+        "segments": parts
+    }
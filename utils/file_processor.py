@@ -1,29 +1,63 @@
 import os
 import sys
+import logging
 import json
-import docx
-import pydub
-import pytesseract
-import PyPDF2
-from PIL import Image
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
 import io
 import re
-from elevenlabs import client
-from elevenlabs.client import ElevenLabs
+import hashlib
+import tempfile
 
 # Добавляем корневую директорию проекта в sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config import MAX_FILE_SIZE_MB, ELEVEN_LABS_API_KEY
-from ai.claude_api import analyze_document
+from config import (
+    MAX_FILE_SIZE_MB, MAX_DOCUMENT_CHARS, DOCUMENT_CHUNK_CHARS,
+    PDF_PAGES_PER_TASK, PDF_OCR_ENABLED, PDF_OCR_MIN_CHARS, PDF_OCR_DPI, PDF_OCR_PAGES_PER_TASK, OCR_LANGUAGES,
+    EXTRACTION_WORKERS, DOCUMENT_READ_MAX_CHARS,
+    SPREADSHEET_CHUNK_ROWS, SPREADSHEET_SAMPLE_ROWS, SPREADSHEET_TOP_N, SPREADSHEET_FULL_ROWS,
+    PPTX_SLIDES_PER_TASK, PDF_BACKEND, DOCX_BACKEND, OCR_BACKEND, OCR_IMAGE_DPI, OCR_TILE_HEIGHT
+)
+from ai.claude_api import analyze_document, load_summary_tree, build_summary_tree, analyze_document_with_tree
 from ai.gemini_api import analyze_image
+from utils.extraction_cache import extract_with_cache, get_cached, file_sha256
+from utils.extraction_service import run_extraction, map_extraction
+from utils import extractors
+from utils.extractors import collect_text
+from utils import spreadsheets
+from utils.spreadsheets import SPREADSHEET_EXTENSIONS
+from utils.transcription import transcribe_cached
 
 # Максимальный размер файла в байтах
 MAX_FILE_SIZE = MAX_FILE_SIZE_MB * 1024 * 1024
 
-# Инициализация ElevenLabs клиента
-eleven_labs_client = ElevenLabs(api_key=ELEVEN_LABS_API_KEY)
+# Форматы, текст которых делится на страницы (слайды) с сохранением смещений
+PAGED_EXTENSIONS = (".pdf", ".pptx")
+
+# Движки извлечения, выбранные в настройках, по расширению файла
+EXTRACTION_BACKENDS = {".pdf": PDF_BACKEND, ".docx": DOCX_BACKEND, ".doc": DOCX_BACKEND}
+
+def get_save_path(file_name: str, directory: str = "temp_files", prefix: Optional[str] = None) -> str:
+    """
+    Возвращает путь для сохранения файла, создавая директорию при необходимости
+    
+    Args:
+        file_name: Имя файла
+        directory: Директория для сохранения
+        prefix: Уникальный префикс имени, чтобы файлы с одинаковыми именами не перезаписывали друг друга (опционально)
+        
+    Returns:
+        Путь к файлу
+    """
+    # Проверяем, существует ли директория
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    
+    # Имя файла от пользователя не должно выводить за пределы директории
+    name = os.path.basename(file_name)
+    if prefix:
+        name = f"{os.path.basename(prefix)}_{name}"
+    return os.path.join(directory, name)
 
 def save_file(file_data: bytes, file_name: str, directory: str = "temp_files") -> str:
     """
@@ -38,12 +72,8 @@ def save_file(file_data: bytes, file_name: str, directory: str = "temp_files") -
         Путь к сохраненному файлу
     """
     try:
-        # Проверяем, существует ли директория
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-        
         # Сохраняем файл
-        file_path = os.path.join(directory, file_name)
+        file_path = get_save_path(file_name, directory)
         with open(file_path, "wb") as f:
             f.write(file_data)
         
@@ -67,7 +97,7 @@ def get_file_type(file_path: str) -> str:
     ext = ext.lower()
     
     # Текстовые файлы
-    if ext in [".txt", ".csv", ".json", ".xml", ".html", ".md"]:
+    if ext in [".txt", ".csv", ".tsv", ".json", ".xml", ".html", ".md"]:
         return "text"
     
     # Изображения
@@ -79,7 +109,7 @@ def get_file_type(file_path: str) -> str:
         return "audio"
     
     # Документы
-    elif ext in [".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx"]:
+    elif ext in [".pdf", ".doc", ".docx", ".xls", ".xlsx", ".xlsm", ".ppt", ".pptx"]:
         return "document"
     
     # Неизвестный тип
@@ -102,148 +132,472 @@ def check_file_size(file_path: str) -> bool:
     # Проверяем размер
     return file_size <= MAX_FILE_SIZE
 
-def extract_text_from_txt(file_path: str) -> str:
+def extract_text_from_docx(file_path: str, max_chars: Optional[int] = None) -> str:
     """
-    Извлекает текст из текстового файла
+    Извлекает текст из файла .docx (в пуле процессов извлечения)
     
     Args:
         file_path: Путь к файлу
+        max_chars: Максимальное количество символов (опционально)
         
     Returns:
         Извлеченный текст
     """
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            return f.read()
-    except UnicodeDecodeError:
-        # Пробуем другие кодировки
-        try:
-            with open(file_path, "r", encoding="cp1251") as f:
-                return f.read()
-        except UnicodeDecodeError:
-            try:
-                with open(file_path, "r", encoding="latin-1") as f:
-                    return f.read()
-            except Exception as e:
-                print(f"Ошибка при чтении текстового файла: {e}")
-                return ""
-    except Exception as e:
-        print(f"Ошибка при чтении текстового файла: {e}")
-        return ""
+    return run_extraction(extractors.extract_text_from_docx, file_path, max_chars, DOCX_BACKEND, default="")
 
-def extract_text_from_docx(file_path: str) -> str:
+def extract_text_from_pdf(file_path: str, page_range: Optional[Tuple[int, int]] = None, max_chars: Optional[int] = None) -> str:
     """
-    Извлекает текст из файла .docx
+    Извлекает текст из файла PDF (в пуле процессов извлечения)
     
     Args:
         file_path: Путь к файлу
+        page_range: Диапазон страниц (первая, последняя), нумерация с 1 (опционально)
+        max_chars: Максимальное количество символов (опционально)
         
     Returns:
         Извлеченный текст
     """
-    try:
-        doc = docx.Document(file_path)
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text
-    except Exception as e:
-        print(f"Ошибка при чтении файла docx: {e}")
-        return ""
+    return collect_text((page + "\n" for page in iter_pages_from_pdf(file_path, page_range)), max_chars)
+
+def _recognize_scanned_pages(file_path: str, pages: List[str], first_number: int, failures: Optional[List[str]] = None) -> None:
+    """Заменяет текст страниц без текстового слоя (сканов) результатом OCR, сбои групп и страниц добавляет в failures"""
+    scanned = [index for index, text in enumerate(pages) if len(text.strip()) < PDF_OCR_MIN_CHARS]
+    if not PDF_OCR_ENABLED or not scanned:
+        return
+    
+    logging.info(f"PDF {os.path.basename(file_path)}: страниц без текстового слоя {len(scanned)}, запускаю OCR")
+    groups = [scanned[i:i + PDF_OCR_PAGES_PER_TASK] for i in range(0, len(scanned), PDF_OCR_PAGES_PER_TASK)]
+    results = map_extraction(
+        extractors.ocr_pdf_pages,
+        [(file_path, [first_number + index for index in group], PDF_OCR_DPI, OCR_LANGUAGES, OCR_BACKEND) for group in groups],
+        default=None
+    )
+    for group, texts in zip(groups, results):
+        if texts is None and failures is not None:
+            failures.append(f"OCR страниц {first_number + group[0] + 1}-{first_number + group[-1] + 1}")
+        for index, text in zip(group, texts or []):
+            if text is None:
+                if failures is not None:
+                    failures.append(f"OCR страницы {first_number + index + 1}")
+                continue
+            # Оставляем текстовый слой, если OCR дал меньше текста
+            if len(text.strip()) > len(pages[index].strip()):
+                pages[index] = text
 
-def extract_text_from_pdf(file_path: str) -> str:
+def iter_pages_from_pdf(file_path: str, page_range: Optional[Tuple[int, int]] = None, failures: Optional[List[str]] = None) -> Iterator[str]:
     """
-    Извлекает текст из файла PDF
+    Лениво извлекает страницы PDF параллельно в пуле процессов
+    
+    Страницы разбираются волнами: пачки по PDF_PAGES_PER_TASK страниц, по одной
+    на процесс. Следующая волна запускается, только когда вызывающий код дочитал
+    предыдущую, поэтому при остановке чтения остаток файла не разбирается.
+    Страницы без текстового слоя (сканы) распознаются через OCR.
+    
+    Args:
+        file_path: Путь к файлу
+        page_range: Диапазон страниц (первая, последняя), нумерация с 1 (опционально)
+        failures: Список, в который добавляются описания пачек и групп OCR, завершившихся ошибкой (опционально)
+        
+    Yields:
+        Текст страницы, в исходном порядке
+    """
+    page_count = run_extraction(extractors.count_pdf_pages, file_path, default=0)
+    first, last = page_range or (1, page_count)
+    first, last = max(first - 1, 0), min(last, page_count)
+    
+    ranges = [
+        (file_path, start, min(start + PDF_PAGES_PER_TASK, last), PDF_BACKEND)
+        for start in range(first, last, PDF_PAGES_PER_TASK)
+    ]
+    for i in range(0, len(ranges), EXTRACTION_WORKERS):
+        wave = ranges[i:i + EXTRACTION_WORKERS]
+        pages = []
+        for (_, start, end, _), batch in zip(wave, map_extraction(extractors.extract_pdf_page_range, wave, default=None)):
+            if batch is None and failures is not None:
+                failures.append(f"страницы {start + 1}-{end}")
+            batch = batch or []
+            # Недочитанная пачка дополняется пустыми страницами, чтобы не сбить нумерацию
+            pages.extend(batch + [""] * (end - start - len(batch)))
+        
+        _recognize_scanned_pages(file_path, pages, wave[0][1], failures)
+        yield from pages
+
+def iter_slides_from_pptx(file_path: str, slide_range: Optional[Tuple[int, int]] = None, failures: Optional[List[str]] = None) -> Iterator[str]:
+    """
+    Извлекает текст слайдов презентации с заметками, для больших презентаций - параллельно
+    
+    Args:
+        file_path: Путь к файлу
+        slide_range: Диапазон слайдов (первый, последний), нумерация с 1 (опционально)
+        failures: Список, в который добавляются описания пачек слайдов, завершившихся ошибкой (опционально)
+        
+    Yields:
+        Текст слайда, в порядке показа
+    """
+    # Список слайдов - это чтение двух небольших XML, его выполняем на месте
+    slides = extractors.list_pptx_slides(file_path)
+    first, last = slide_range or (1, len(slides))
+    first, last = max(first, 1), min(last, len(slides))
+    
+    batches = [
+        (file_path, slides[start - 1:min(start - 1 + PPTX_SLIDES_PER_TASK, last)], start)
+        for start in range(first, last + 1, PPTX_SLIDES_PER_TASK)
+    ]
+    for (_, names, start), batch in zip(batches, map_extraction(extractors.extract_pptx_slides, batches, default=None)):
+        if batch is None:
+            if failures is not None:
+                failures.append(f"слайды {start}-{start + len(names) - 1}")
+            batch = []
+        # Недочитанная пачка дополняется пустыми слайдами, чтобы не сбить нумерацию
+        batch = batch + [""] * (len(names) - len(batch))
+        yield from (text + "\n" for text in batch)
+
+def extract_pages_from_pdf(file_path: str) -> List[str]:
+    """
+    Извлекает текст из файла PDF постранично, параллельно в пуле процессов
     
     Args:
         file_path: Путь к файлу
         
     Returns:
-        Извлеченный текст
+        Список текстов страниц
     """
+    return list(iter_pages_from_pdf(file_path))
+
+def _recognize_image(file_path: str) -> Dict[str, Any]:
+    """Готовит изображение к OCR и распознает его полосы параллельно в пуле процессов"""
+    descriptor, prepared_path = tempfile.mkstemp(suffix=".png", dir=os.path.dirname(file_path) or None)
+    os.close(descriptor)
     try:
-        text = ""
-        with open(file_path, "rb") as f:
-            pdf_reader = PyPDF2.PdfReader(f)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text
-    except Exception as e:
-        print(f"Ошибка при чтении файла PDF: {e}")
-        return ""
+        boxes = run_extraction(extractors.prepare_image_for_ocr, file_path, prepared_path, OCR_IMAGE_DPI, OCR_TILE_HEIGHT, default=None)
+        failures = [] if boxes is not None else ["подготовка изображения"]
+        boxes = boxes or []
+        texts = map_extraction(
+            extractors.ocr_image_tile,
+            [(prepared_path, box, OCR_LANGUAGES, OCR_BACKEND) for box in boxes],
+            default=None
+        )
+    finally:
+        try:
+            os.remove(prepared_path)
+        except OSError:
+            pass
+    
+    failures.extend(f"полоса {index}" for index, text in enumerate(texts, 1) if text is None)
+    if failures:
+        logging.warning(f"Не удалось распознать часть изображения {os.path.basename(file_path)}: {', '.join(failures)}")
+    
+    text = "\n".join(text.strip() for text in texts if text and text.strip())
+    return {
+        "text": text,
+        "page_offsets": [0],
+        # Результат со сбоями неполон и не кэшируется (см. extract_with_cache)
+        "complete": not failures,
+        "failed": failures,
+        "metadata": {
+            "file_type": "image",
+            "file_size": os.path.getsize(file_path),
+            "tiles": len(boxes),
+            "languages": OCR_LANGUAGES,
+            "chars": len(text)
+        }
+    }
 
 def extract_text_from_image(file_path: str) -> str:
     """
     Извлекает текст из изображения с помощью OCR
     
+    Изображение переводится в черно-белое с выравниванием наклона и
+    приведением к разрешению OCR_IMAGE_DPI, крупные снимки (например, экраны
+    рекламных кабинетов) делятся на полосы, которые распознаются параллельно.
+    Результат кэшируется по хэшу изображения и языкам распознавания.
+    
     Args:
         file_path: Путь к файлу
         
     Returns:
         Извлеченный текст
     """
-    try:
-        # Открываем изображение
-        image = Image.open(file_path)
+    return extract_with_cache(file_path, _recognize_image, kind=f"ocr-{OCR_BACKEND}-{OCR_LANGUAGES}")["text"]
+
+def parse_page_range(question: Optional[str]) -> Optional[Tuple[int, int]]:
+    """
+    Находит в вопросе пользователя диапазон страниц или слайдов ("стр. 5", "страницы 10-20", "слайды 3-5", "pages 3 to 4")
+    
+    Args:
+        question: Текст вопроса
+        
+    Returns:
+        Диапазон (первая, последняя) с нумерацией с 1 или None
+    """
+    if not question:
+        return None
+    
+    match = re.search(
+        r"\b(?:стр(?:аниц[а-я]*)?\.?|слайд[а-я]*|pages?|slides?|p\.)\s*(\d+)(?:\s*(?:-|–|—|по|до|to)\s*(\d+))?",
+        question,
+        re.IGNORECASE
+    )
+    if not match:
+        return None
+    
+    first = int(match.group(1))
+    last = int(match.group(2) or first)
+    if first < 1 or last < first:
+        return None
+    return first, last
+
+def iter_document_units(
+    file_path: str,
+    page_range: Optional[Tuple[int, int]] = None,
+    max_chars: Optional[int] = None,
+    failures: Optional[List[str]] = None
+) -> Iterator[str]:
+    """
+    Лениво извлекает текст документа: страницы PDF, слайды PPTX, блоки текстового файла,
+    текст DOCX или сводку таблицы (CSV, Excel)
+    
+    Args:
+        file_path: Путь к файлу
+        page_range: Диапазон страниц PDF или слайдов PPTX, нумерация с 1 (опционально)
+        max_chars: Бюджет символов для форматов, которые разбираются целиком в пуле процессов
+        failures: Список для описаний частей документа, которые не удалось извлечь (опционально)
         
-        # Применяем OCR
-        text = pytesseract.image_to_string(image, lang='rus+eng')
+    Yields:
+        Фрагменты текста
+    """
+    file_type = get_file_type(file_path)
+    ext = os.path.splitext(file_path)[1].lower()
+    
+    if ext in SPREADSHEET_EXTENSIONS:
+        # Вместо строк таблицы модель получает сводку: профиль столбцов, агрегаты и пример
+        yield run_extraction(
+            spreadsheets.summarize_spreadsheet, file_path,
+            SPREADSHEET_CHUNK_ROWS, SPREADSHEET_SAMPLE_ROWS, SPREADSHEET_TOP_N, SPREADSHEET_FULL_ROWS,
+            default=""
+        )
+    elif file_type == "text":
+        yield from extractors.iter_text_from_txt(file_path)
+    elif ext == ".pdf":
+        yield from iter_pages_from_pdf(file_path, page_range, failures)
+    elif ext == ".pptx":
+        yield from iter_slides_from_pptx(file_path, page_range, failures)
+    elif ext in [".docx", ".doc"]:
+        yield extract_text_from_docx(file_path, max_chars)
+
+def _extract_document(file_path: str, page_range: Optional[Tuple[int, int]] = None, max_chars: Optional[int] = None) -> Dict[str, Any]:
+    """Извлекает текст, смещения страниц и метаданные файла без использования кэша"""
+    file_type = get_file_type(file_path)
+    ext = os.path.splitext(file_path)[1].lower()
+    is_paged = ext in PAGED_EXTENSIONS
+    
+    # Смещение начала каждой страницы PDF или слайда в итоговом тексте
+    page_offsets = [] if is_paged else [0]
+    parts = []
+    total = 0
+    complete = True
+    failures = []
+    units = iter_document_units(file_path, page_range, max_chars, failures)
+    for unit in units:
+        if is_paged:
+            page_offsets.append(total)
+            unit += "\n"
+        parts.append(unit)
+        total += len(unit)
+        if max_chars and total >= max_chars:
+            # Бюджет исчерпан - остаток файла не разбираем
+            units.close()
+            complete = False
+            break
+    
+    text = "".join(parts)
+    if failures:
+        logging.warning(f"Не удалось извлечь часть документа {os.path.basename(file_path)}: {', '.join(failures)}")
+    return {
+        "text": text if text.strip() else "",
+        "page_offsets": page_offsets,
+        # Документ со сбоями извлечения неполон и не кэшируется (см. extract_with_cache)
+        "complete": complete and not failures,
+        "failed": failures,
+        "metadata": {
+            "file_type": file_type,
+            "extension": ext,
+            "file_size": os.path.getsize(file_path),
+            "pages": len(page_offsets),
+            "page_range": list(page_range) if page_range else None,
+            "chars": len(text),
+            "backend": EXTRACTION_BACKENDS.get(ext)
+        }
+    }
+
+def _slice_pages(record: Dict[str, Any], page_range: Tuple[int, int]) -> Optional[Dict[str, Any]]:
+    """Вырезает диапазон страниц (слайдов) из полного результата извлечения"""
+    offsets = record.get("page_offsets") or []
+    first, last = page_range
+    if first > len(offsets) or (last > len(offsets) and not record.get("complete", True)):
+        return None
+    
+    start = offsets[first - 1]
+    end = offsets[last] if last < len(offsets) else len(record["text"])
+    text = record["text"][start:end]
+    return {
+        "text": text,
+        "page_offsets": [offset - start for offset in offsets[first - 1:last]],
+        "complete": True,
+        "metadata": dict(record.get("metadata", {}), page_range=[first, last], chars=len(text)),
+        "content_hash": record.get("content_hash")
+    }
+
+def extract_document(file_path: str, page_range: Optional[Tuple[int, int]] = None, max_chars: Optional[int] = DOCUMENT_READ_MAX_CHARS) -> Dict[str, Any]:
+    """
+    Извлекает текст документа, используя кэш по хэшу содержимого
+
+    Один и тот же файл (даже загруженный повторно под другим именем)
+    разбирается только один раз. Чтение останавливается, когда набран
+    бюджет символов, а для диапазона страниц PDF или слайдов PPTX разбираются только они.
+
+    Args:
+        file_path: Путь к файлу
+        page_range: Диапазон страниц или слайдов (первая, последняя), нумерация с 1 (опционально)
+        max_chars: Бюджет символов (None - весь документ)
+
+    Returns:
+        Словарь {text, page_offsets, complete, failed, metadata, content_hash}
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    is_paged = ext in PAGED_EXTENSIONS
+    
+    def same_backend(record: Dict[str, Any]) -> bool:
+        # Результат другого движка (после смены настроек) извлекаем заново
+        return record.get("metadata", {}).get("backend") == EXTRACTION_BACKENDS.get(ext)
+    
+    if page_range and is_paged:
+        # Нужные страницы берем из уже извлеченного документа, иначе разбираем только их
+        cached = get_cached(file_sha256(file_path))
+        sliced = _slice_pages(cached, page_range) if cached and same_backend(cached) else None
+        if sliced:
+            return sliced
+        return extract_with_cache(
+            file_path,
+            lambda path: _extract_document(path, page_range),
+            kind=f"pages-{page_range[0]}-{page_range[1]}",
+            accept=same_backend
+        )
+    
+    return extract_with_cache(
+        file_path,
+        lambda path: _extract_document(path, max_chars=max_chars),
+        # Результат, обрезанный меньшим бюджетом, не подходит для большего
+        accept=lambda record: same_backend(record) and (
+            record.get("complete", True) or (max_chars is not None and len(record["text"]) >= max_chars)
+        )
+    )
+
+def split_text_into_chunks(text: str, max_chars: int = DOCUMENT_CHUNK_CHARS) -> List[str]:
+    """
+    Разбивает текст на фрагменты по структурным границам
+    
+    Сначала текст делится по страницам и пустым строкам (абзацы, разделы),
+    слишком длинные блоки - по строкам, а затем по предложениям.
+    
+    Args:
+        text: Исходный текст
+        max_chars: Максимальная длина фрагмента в символах
         
-        return text
-    except Exception as e:
-        print(f"Ошибка при извлечении текста из изображения: {e}")
-        return ""
+    Returns:
+        Список фрагментов
+    """
+    def split_block(block: str) -> List[str]:
+        if len(block) <= max_chars:
+            return [block]
+        # Пробуем более мелкие границы: строки, затем предложения
+        for pattern in (r"\n", r"(?<=[.!?])\s+"):
+            parts = [part for part in re.split(pattern, block) if part.strip()]
+            if len(parts) > 1:
+                return [piece for part in parts for piece in split_block(part)]
+        # Границ нет - режем по длине
+        return [block[i:i + max_chars] for i in range(0, len(block), max_chars)]
+    
+    blocks = [block for block in re.split(r"\f|\n\s*\n", text) if block.strip()]
+    
+    chunks = []
+    current = ""
+    for block in blocks:
+        for piece in split_block(block.strip()):
+            if current and len(current) + len(piece) + 2 > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    
+    return chunks
 
-def transcribe_audio(file_path: str, language: str = None) -> str:
+def analyze_text_with_ai(text: str, question: Optional[str] = None, file_path: Optional[str] = None) -> str:
     """
-    Преобразует аудио в текст с использованием Eleven Labs API
+    Анализирует текст документа, при необходимости через дерево резюме
+    
+    Args:
+        text: Текст документа
+        question: Вопрос о документе (опционально)
+        file_path: Путь к файлу документа (опционально)
+        
+    Returns:
+        Результат анализа
+    """
+    if len(text) <= MAX_DOCUMENT_CHARS:
+        return analyze_document(text, question, file_path)
+    
+    # Документ не помещается в контекст - используем map-reduce по фрагментам
+    document_key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    tree = load_summary_tree(document_key)
+    if not tree:
+        try:
+            tree = build_summary_tree(split_text_into_chunks(text), document_key)
+        except Exception as e:
+            logging.error(f"Ошибка при построении дерева резюме: {e}")
+            return f"Ошибка при анализе документа: {e}"
+    
+    return analyze_document_with_tree(tree, question, file_path)
+
+def transcribe_audio(
+    file_path: str,
+    language: str = None,
+    on_segment: Optional[Callable[[Dict[str, Any], int, int], None]] = None
+) -> Tuple[str, List[str]]:
+    """
+    Преобразует аудио в текст через ElevenLabs API или локальную модель (TRANSCRIPTION_BACKEND)
+    
+    Длинные записи делятся по паузам на фрагменты, которые распознаются
+    параллельно; в тексте у каждого фрагмента стоит метка времени.
+    Повторная транскрибация той же записи берется из кэша.
     
     Args:
         file_path: Путь к файлу
         language: Код языка (опционально, авто-определение если не указан)
+        on_segment: Вызывается для каждого готового фрагмента по порядку (опционально)
         
     Returns:
-        Транскрибированный текст
+        Транскрибированный текст и ошибки нераспознанных фрагментов (текст с ошибками не стоит сохранять)
     """
     try:
         # Проверяем размер файла
         if not check_file_size(file_path):
-            return f"Файл слишком большой. Максимальный размер: {MAX_FILE_SIZE_MB} МБ."
+            error = f"Файл слишком большой. Максимальный размер: {MAX_FILE_SIZE_MB} МБ."
+            return error, [error]
         
-        # Конвертируем в формат MP3, если нужно
-        audio_format = os.path.splitext(file_path)[1].lower()
+        transcription = transcribe_cached(file_path, language, on_segment)
         
-        # Если файл не MP3, конвертируем его
-        audio_path = file_path
-        if audio_format != ".mp3":
-            sound = pydub.AudioSegment.from_file(file_path)
-            audio_path = file_path + ".mp3"
-            sound.export(audio_path, format="mp3")
-        
-        # Открываем аудио файл
-        with open(audio_path, "rb") as audio_file:
-            audio_data = audio_file.read()
-        
-        # Параметры запроса
-        params = {}
-        if language:
-            params["language"] = language
-            
-        # Отправляем запрос на транскрибацию
-        response = eleven_labs_client.speech_to_text.convert(
-            audio=audio_data,
-            **params
-        )
-        
-        # Удаляем временный файл, если он был создан
-        if audio_path != file_path and os.path.exists(audio_path):
-            os.remove(audio_path)
+        # Если не распознан ни один фрагмент, возвращаем ошибку
+        errors = [segment["error"] for segment in transcription["segments"] if segment["error"]]
+        if len(errors) == len(transcription["segments"]):
+            return f"Ошибка при обработке аудио файла: {errors[0]}", errors
         
         # Возвращаем транскрибированный текст
-        return response.text
+        return transcription["text"], errors
     except Exception as e:
         print(f"Ошибка при транскрибации аудио: {e}")
-        return f"Ошибка при обработке аудио файла: {e}"
+        return f"Ошибка при обработке аудио файла: {e}", [str(e)]
 
 def process_file(file_path: str) -> Dict[str, Any]:
     """
@@ -270,14 +624,10 @@ def process_file(file_path: str) -> Dict[str, Any]:
         
         # Обрабатываем файл в зависимости от типа
         text = ""
-        if file_type == "text":
-            text = extract_text_from_txt(file_path)
-        elif file_type == "document":
-            ext = os.path.splitext(file_path)[1].lower()
-            if ext == ".pdf":
-                text = extract_text_from_pdf(file_path)
-            elif ext in [".docx", ".doc"]:
-                text = extract_text_from_docx(file_path)
+        extraction = {}
+        if file_type in ["text", "document"]:
+            extraction = extract_document(file_path)
+            text = extraction["text"]
         elif file_type == "image":
             # Для изображений возвращаем путь, анализировать будем отдельно
             return {
@@ -303,7 +653,9 @@ def process_file(file_path: str) -> Dict[str, Any]:
                 "success": True,
                 "message": "Файл успешно обработан",
                 "text": text,
-                "file_type": file_type
+                "file_type": file_type,
+                "content_hash": extraction.get("content_hash"),
+                "page_offsets": extraction.get("page_offsets", [])
             }
         else:
             return {
@@ -338,36 +690,44 @@ def analyze_file_with_ai(file_path: str, question: Optional[str] = None) -> str:
         
         # Обрабатываем файл в зависимости от типа
         if file_type in ["text", "document"]:
-            # Извлекаем текст
-            text = ""
-            ext = os.path.splitext(file_path)[1].lower()
-            if file_type == "text":
-                text = extract_text_from_txt(file_path)
-            elif ext == ".pdf":
-                text = extract_text_from_pdf(file_path)
-            elif ext in [".docx", ".doc"]:
-                text = extract_text_from_docx(file_path)
+            # Извлекаем текст (повторно загруженный файл берется из кэша);
+            # если в вопросе указаны страницы PDF, разбираем только их.
+            # Сначала читаем только то, что помещается в промпт, и лишь документ
+            # больше контекста дочитываем для дерева резюме
+            page_range = parse_page_range(question)
+            extraction = extract_document(file_path, page_range, max_chars=MAX_DOCUMENT_CHARS)
+            if not page_range and not extraction["complete"] and not extraction.get("failed"):
+                extraction = extract_document(file_path)
+            text = extraction["text"]
             
             # Анализируем текст с помощью Claude
             if text:
-                return analyze_document(text, question)
+                return analyze_text_with_ai(text, question, file_path)
             else:
                 return "Не удалось извлечь текст из файла."
         
         elif file_type == "image":
+            # Распознанный текст (цифры отчетов, скриншоты рекламных кабинетов) дополняет
+            # изображение: мелкий текст модель по картинке читает с ошибками
+            try:
+                ocr_text = extract_text_from_image(file_path)
+            except Exception as e:
+                logging.error(f"Ошибка при распознавании текста на изображении: {e}")
+                ocr_text = ""
+            
             # Анализируем изображение с помощью Gemini
-            return analyze_image(file_path, question)
+            return analyze_image(file_path, question, ocr_text)
         
         elif file_type == "audio":
             # Транскрибируем аудио и затем анализируем текст
-            transcription = transcribe_audio(file_path)
+            transcription, _ = transcribe_audio(file_path)
             if transcription and not transcription.startswith("Ошибка"):
                 # Добавляем префикс, чтобы указать, что это транскрипция
                 analysis_text = f"Транскрипция аудио:\n\n{transcription}\n\n"
                 
                 # Если есть вопрос, анализируем с его помощью
                 if question:
-                    analysis = analyze_document(transcription, question)
+                    analysis = analyze_text_with_ai(transcription, question, file_path)
                     analysis_text += f"Анализ транскрипции:\n\n{analysis}"
                     return analysis_text
                 else:
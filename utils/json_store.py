@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import threading
+from typing import Any, Optional, Tuple
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def write_json_atomic(path: str, data: Any) -> int:
+    """
+    Сохраняет данные в JSON-файл так, чтобы при сбое не осталось поврежденной записи
+
+    Args:
+        path: Путь к файлу
+        data: Сериализуемые в JSON данные
+
+    Returns:
+        Размер записанного файла в байтах
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Пишем во временный файл и переименовываем: замена файла атомарна
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+    return os.path.getsize(path)
+
+def evict_lru(directory: str, max_bytes: Optional[int] = None, max_entries: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Удаляет давно не использовавшиеся JSON-записи каталога (по времени изменения), пока он не уложится в лимиты
+
+    Читающий код обновляет время изменения записи при каждом обращении (os.utime),
+    поэтому первыми удаляются записи, к которым дольше всего не обращались.
+
+    Args:
+        directory: Каталог с записями (обходится рекурсивно)
+        max_bytes: Максимальный суммарный размер записей (опционально)
+        max_entries: Максимальное количество записей (опционально)
+
+    Returns:
+        Кортеж (количество удаленных записей, суммарный размер оставшихся записей в байтах)
+    """
+    entries = []
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+    count = len(entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if (max_bytes is None or total <= max_bytes) and (max_entries is None or count <= max_entries):
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+        count -= 1
+
+    return removed, total
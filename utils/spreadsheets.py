@@ -0,0 +1,394 @@
+import os
+import sys
+import csv
+import warnings
+from collections import Counter
+from typing import Dict, Iterator, List, Tuple
+import numpy as np
+import pandas as pd
+import openpyxl
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.extractors import detect_text_encoding
+
+# Модуль выполняется в рабочих процессах извлечения (utils.extraction_service):
+# таблица читается потоково, частями, а модели отправляется только компактная сводка
+
+SPREADSHEET_EXTENSIONS = (".csv", ".tsv", ".xlsx", ".xlsm", ".xls")
+
+# Доля значений, при которой столбец считается числовым или датой
+KIND_THRESHOLD = 0.9
+
+# Сколько различных значений текстового столбца отслеживается для топа
+MAX_TRACKED_VALUES = 20000
+
+# Максимальное количество листов книги и периодов в динамике
+MAX_SHEETS = 10
+MAX_PERIODS = 36
+
+# Разбивка по категориям строится по текстовому столбцу с небольшим числом значений
+MAX_GROUP_VALUES = 30
+MAX_GROUPS_SHOWN = 15
+
+def _format_number(value: float) -> str:
+    """Форматирует число с разделением разрядов"""
+    if value is None or not np.isfinite(value):
+        return "-"
+    if float(value).is_integer() and abs(value) < 1e15:
+        return f"{int(value):,}".replace(",", " ")
+    return f"{value:,.2f}".replace(",", " ")
+
+def _strip_number(series: pd.Series) -> pd.Series:
+    """Убирает из записи чисел пробелы в разрядах и знак процента"""
+    text = series.astype(str).str.replace("\u00a0", "", regex=False).str.replace(" ", "", regex=False)
+    return text.str.strip().str.rstrip("%")
+
+def _detect_decimal(series: pd.Series) -> str:
+    """
+    Определяет десятичный разделитель столбца по записи его значений
+
+    Если в числе есть и запятая, и точка, десятичный - последний знак (1,234.56 и 1.234,56).
+    Запятые перед группами из трех цифр (1,234 и 12,345,678) и несколько точек
+    (1.234.567) разделяют разряды, а одиночная запятая или точка - десятичная.
+
+    Args:
+        series: Значения столбца
+
+    Returns:
+        "." (американская запись) или "," (русская запись)
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return "."
+    text = _strip_number(_non_empty(series))
+    last_comma = text.str.rfind(",")
+    last_dot = text.str.rfind(".")
+
+    both = (last_comma >= 0) & (last_dot >= 0)
+    dot_votes = int((both & (last_dot > last_comma)).sum())
+    comma_votes = int((both & (last_comma > last_dot)).sum())
+
+    comma_grouping = text[(last_comma >= 0) & (last_dot < 0)].str.fullmatch(r"[-+]?\d{1,3}(?:,\d{3})+")
+    dot_votes += int(comma_grouping.sum())
+    comma_votes += int((~comma_grouping).sum())
+
+    dot_grouping = text[(last_dot >= 0) & (last_comma < 0)].str.fullmatch(r"[-+]?\d{1,3}(?:\.\d{3}){2,}")
+    comma_votes += int(dot_grouping.sum())
+    dot_votes += int((~dot_grouping).sum())
+
+    # При равенстве сохраняем русскую запись (десятичная запятая)
+    return "." if dot_votes > comma_votes else ","
+
+def _to_numeric(series: pd.Series, decimal: str = ",") -> pd.Series:
+    """Приводит столбец к числам с учетом разделителей разрядов и десятичного разделителя столбца"""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.astype(float)
+    text = _strip_number(series)
+    grouping = "," if decimal == "." else "."
+    # Разделитель разрядов убираем только перед группой из трех цифр, остальное считаем десятичным знаком
+    text = text.str.replace(rf"\{grouping}(?=\d{{3}}(?:[.,]|$))", "", regex=True)
+    text = text.str.replace(",", ".", regex=False)
+    return pd.to_numeric(text, errors="coerce")
+
+def _to_datetime(series: pd.Series) -> pd.Series:
+    """Приводит столбец к датам"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return pd.to_datetime(series, errors="coerce", format="mixed", dayfirst=True)
+
+def _is_text(series: pd.Series) -> bool:
+    """Проверяет, хранит ли столбец строки (object или строковый тип pandas)"""
+    return series.dtype == object or pd.api.types.is_string_dtype(series)
+
+def _non_empty(series: pd.Series) -> pd.Series:
+    """Возвращает непустые значения столбца"""
+    series = series.dropna()
+    if _is_text(series):
+        series = series[series.astype(str).str.strip() != ""]
+    return series
+
+def _detect_kind(series: pd.Series) -> str:
+    """Определяет тип столбца по первой части таблицы: number, date или text"""
+    values = _non_empty(series)
+    if values.empty:
+        return "text"
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return "date"
+    if _to_numeric(values, _detect_decimal(values)).notna().mean() >= KIND_THRESHOLD:
+        return "number"
+    if _is_text(values) and _to_datetime(values).notna().mean() >= KIND_THRESHOLD:
+        return "date"
+    return "text"
+
+class ColumnProfile:
+    """Накопительный профиль столбца: заполненность, статистики, топ значений"""
+
+    def __init__(self, name: str, kind: str, decimal: str = ","):
+        self.name = name
+        self.kind = kind
+        self.decimal = decimal
+        self.count = 0
+        self.empty = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.values = Counter()
+        self.values_truncated = False
+
+    def update(self, series: pd.Series) -> None:
+        """Добавляет в профиль очередную часть столбца"""
+        if self.kind == "number":
+            values = _to_numeric(series, self.decimal).dropna().to_numpy(dtype=float)
+            values = values[np.isfinite(values)]
+            if values.size:
+                self.total += float(values.sum())
+                self.total_sq += float(np.square(values).sum())
+                self.minimum = min(self.minimum, float(values.min())) if self.minimum is not None else float(values.min())
+                self.maximum = max(self.maximum, float(values.max())) if self.maximum is not None else float(values.max())
+        elif self.kind == "date":
+            values = _to_datetime(series).dropna()
+            if not values.empty:
+                self.minimum = min(self.minimum, values.min()) if self.minimum is not None else values.min()
+                self.maximum = max(self.maximum, values.max()) if self.maximum is not None else values.max()
+        else:
+            values = _non_empty(series).astype(str).str.strip()
+            self.values.update(values.value_counts().to_dict())
+            if len(self.values) > MAX_TRACKED_VALUES:
+                # Оставляем самые частые значения, топ становится приближенным
+                self.values = Counter(dict(self.values.most_common(MAX_TRACKED_VALUES // 2)))
+                self.values_truncated = True
+
+        self.count += len(values)
+        self.empty += len(series) - len(values)
+
+    def describe(self, top_n: int) -> str:
+        """Возвращает описание столбца одной строкой"""
+        filled = f"заполнено {_format_number(self.count)}, пусто {_format_number(self.empty)}"
+        if self.kind == "number" and self.count:
+            mean = self.total / self.count
+            std = np.sqrt(max(self.total_sq / self.count - mean ** 2, 0.0))
+            return (
+                f"- {self.name} (число): {filled}; сумма {_format_number(self.total)}, среднее {_format_number(mean)}, "
+                f"мин {_format_number(self.minimum)}, макс {_format_number(self.maximum)}, ст. откл. {_format_number(std)}"
+            )
+        if self.kind == "date" and self.count:
+            return f"- {self.name} (дата): {filled}; с {self.minimum:%Y-%m-%d} по {self.maximum:%Y-%m-%d}"
+
+        unique = f"{'более ' if self.values_truncated else ''}{_format_number(len(self.values))}"
+        top = ", ".join(f"{value[:60]} ({_format_number(count)})" for value, count in self.values.most_common(top_n))
+        return f"- {self.name} (текст): {filled}; уникальных {unique}; топ-{top_n}: {top or '-'}"
+
+def _unique_names(header: List) -> List[str]:
+    """Делает названия столбцов непустыми и уникальными"""
+    names = []
+    for index, value in enumerate(header):
+        name = str(value).strip() if value is not None and str(value).strip() else f"Столбец {index + 1}"
+        while name in names:
+            name += "_"
+        names.append(name)
+    return names
+
+def _iter_csv_chunks(file_path: str, chunk_rows: int) -> Iterator[Tuple[str, Iterator[pd.DataFrame]]]:
+    """Читает CSV частями, определив кодировку и разделитель по началу файла"""
+    encoding = detect_text_encoding(file_path)
+    with open(file_path, "r", encoding=encoding, errors="replace", newline="") as f:
+        sample = f.read(64 * 1024)
+    try:
+        separator = csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+    except csv.Error:
+        separator = "\t" if file_path.lower().endswith(".tsv") else ","
+
+    reader = pd.read_csv(
+        file_path, sep=separator, encoding=encoding, encoding_errors="replace",
+        chunksize=chunk_rows, on_bad_lines="skip", skipinitialspace=True
+    )
+    yield os.path.basename(file_path), reader
+
+def _iter_xlsx_chunks(file_path: str, chunk_rows: int) -> Iterator[Tuple[str, Iterator[pd.DataFrame]]]:
+    """Читает листы книги Excel потоково (openpyxl в режиме только для чтения)"""
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets[:MAX_SHEETS]:
+            yield sheet.title, _iter_sheet_rows(sheet, chunk_rows)
+    finally:
+        workbook.close()
+
+def _iter_sheet_rows(sheet, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Собирает строки листа в части DataFrame"""
+    rows = sheet.iter_rows(values_only=True)
+
+    # Заголовок - первая непустая строка
+    header = None
+    for row in rows:
+        if any(value is not None for value in row):
+            header = row
+            break
+    if header is None:
+        return
+
+    names = _unique_names(header)
+    width = len(names)
+    buffer = []
+    for row in rows:
+        if not any(value is not None for value in row):
+            continue
+        row = tuple(row[:width]) + (None,) * (width - len(row))
+        buffer.append(row)
+        if len(buffer) >= chunk_rows:
+            yield pd.DataFrame(buffer, columns=names)
+            buffer = []
+    if buffer:
+        yield pd.DataFrame(buffer, columns=names)
+
+def _iter_xls_chunks(file_path: str, chunk_rows: int) -> Iterator[Tuple[str, Iterator[pd.DataFrame]]]:
+    """Читает старый формат .xls (не более 65 536 строк на лист, нужен xlrd) целиком и делит на части"""
+    sheets = pd.read_excel(file_path, sheet_name=None)
+    for title, frame in list(sheets.items())[:MAX_SHEETS]:
+        yield title, (frame.iloc[start:start + chunk_rows] for start in range(0, len(frame), chunk_rows))
+
+def _rollup_period(span_days: int) -> Tuple[str, str]:
+    """Выбирает шаг динамики по длительности периода"""
+    if span_days > 62:
+        return "MS", "месяцам"
+    if span_days > 14:
+        return "W-MON", "неделям"
+    return "D", "дням"
+
+def summarize_table(title: str, chunks: Iterator[pd.DataFrame], sample_rows: int = 5, top_n: int = 5, full_rows: int = 200) -> str:
+    """
+    Строит компактную сводку таблицы, читая ее по частям
+
+    Args:
+        title: Название таблицы или листа
+        chunks: Части таблицы
+        sample_rows: Количество строк в примере
+        top_n: Количество самых частых значений текстовых столбцов
+        full_rows: Таблица не длиннее этого количества строк выводится целиком
+
+    Returns:
+        Текст сводки
+    """
+    profiles: Dict[str, ColumnProfile] = {}
+    head = None
+    rows = 0
+    time_axis = None
+    rollup = None
+    group_by = None
+    groups = None
+
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        chunk.columns = _unique_names(list(chunk.columns))
+
+        if head is None:
+            head = chunk.head(full_rows + 1)
+            profiles = {
+                name: ColumnProfile(name, _detect_kind(chunk[name]), _detect_decimal(chunk[name]))
+                for name in chunk.columns
+            }
+            time_axis = next((name for name, profile in profiles.items() if profile.kind == "date"), None)
+            group_by = next((
+                name for name, profile in profiles.items()
+                if profile.kind == "text" and 1 < _non_empty(chunk[name]).nunique() <= MAX_GROUP_VALUES
+            ), None)
+
+        rows += len(chunk)
+        for name, profile in profiles.items():
+            if name in chunk:
+                profile.update(chunk[name])
+
+        if not (time_axis or group_by):
+            continue
+        numeric_names = [name for name, profile in profiles.items() if profile.kind == "number" and name in chunk]
+        frame = pd.DataFrame({name: _to_numeric(chunk[name], profiles[name].decimal) for name in numeric_names}, index=chunk.index)
+        frame["строк"] = 1
+
+        # Динамика: суммы числовых столбцов и количество строк по дням
+        if time_axis and time_axis in chunk:
+            days = _to_datetime(chunk[time_axis]).dt.floor("D")
+            daily = frame[days.notna()].groupby(days[days.notna()]).sum()
+            rollup = daily if rollup is None else rollup.add(daily, fill_value=0)
+
+        # Разбивка: те же суммы по значениям категориального столбца
+        if group_by and group_by in chunk:
+            keys = chunk[group_by].astype(str).str.strip()
+            grouped = frame[chunk[group_by].notna()].groupby(keys[chunk[group_by].notna()]).sum()
+            groups = grouped if groups is None else groups.add(grouped, fill_value=0)
+
+    if head is None:
+        return f"Таблица «{title}»: нет данных\n"
+
+    lines = [f"Таблица «{title}»: {_format_number(rows)} строк, {len(profiles)} столбцов", "Столбцы:"]
+    lines.extend(profile.describe(top_n) for profile in profiles.values())
+
+    if rollup is not None and not rollup.empty:
+        rollup = rollup.sort_index()
+        span_days = (rollup.index.max() - rollup.index.min()).days
+        frequency, label = _rollup_period(span_days)
+        periods = rollup.resample(frequency).sum()
+        periods = periods[periods["строк"] > 0]
+        shown = periods.tail(MAX_PERIODS)
+        date_format = "%Y-%m" if frequency == "MS" else "%Y-%m-%d"
+        lines.append("")
+        note = f", последние {MAX_PERIODS}" if len(periods) > MAX_PERIODS else ""
+        lines.append(f"Динамика по {label} (столбец «{time_axis}», суммы{note}):")
+        lines.append("\t".join(["период"] + list(shown.columns)))
+        for period, values in shown.iterrows():
+            lines.append("\t".join([period.strftime(date_format)] + [_format_number(value) for value in values]))
+
+    if groups is not None and not groups.empty:
+        groups = groups.sort_values("строк", ascending=False)
+        note = f", первые {MAX_GROUPS_SHOWN} из {len(groups)}" if len(groups) > MAX_GROUPS_SHOWN else ""
+        lines.append("")
+        lines.append(f"Разбивка по «{group_by}» (суммы{note}):")
+        lines.append("\t".join([group_by] + list(groups.columns)))
+        for key, values in groups.head(MAX_GROUPS_SHOWN).iterrows():
+            lines.append("\t".join([str(key)[:60]] + [_format_number(value) for value in values]))
+
+    lines.append("")
+    if rows <= full_rows:
+        lines.append("Таблица целиком:")
+        lines.append(head.to_csv(sep="\t", index=False).strip())
+    else:
+        lines.append(f"Пример строк (первые {sample_rows}):")
+        lines.append(head.head(sample_rows).to_csv(sep="\t", index=False).strip())
+
+    return "\n".join(lines) + "\n"
+
+def summarize_spreadsheet(file_path: str, chunk_rows: int = 50000, sample_rows: int = 5, top_n: int = 5, full_rows: int = 200) -> str:
+    """
+    Читает CSV или книгу Excel потоково и возвращает сводку для модели
+
+    Вместо сырых строк модель получает профиль столбцов, агрегаты, топ значений,
+    динамику по датам и несколько строк для примера: выгрузка на сотни тысяч
+    строк занимает в промпте несколько килобайт.
+
+    Args:
+        file_path: Путь к файлу
+        chunk_rows: Размер части в строках
+        sample_rows: Количество строк в примере
+        top_n: Количество самых частых значений текстовых столбцов
+        full_rows: Таблица не длиннее этого количества строк выводится целиком
+
+    Returns:
+        Текст сводки (пустая строка при ошибке)
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in (".csv", ".tsv"):
+        tables = _iter_csv_chunks(file_path, chunk_rows)
+    elif ext == ".xls":
+        tables = _iter_xls_chunks(file_path, chunk_rows)
+    else:
+        tables = _iter_xlsx_chunks(file_path, chunk_rows)
+
+    try:
+        summaries = [summarize_table(title, chunks, sample_rows, top_n, full_rows) for title, chunks in tables]
+        return "\n".join(summaries)
+    except Exception as e:
+        print(f"Ошибка при чтении таблицы: {e}")
+        return ""
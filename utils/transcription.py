@@ -0,0 +1,478 @@
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+import threading
+import importlib.util
+import multiprocessing
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from elevenlabs.client import ElevenLabs
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (
+    ELEVEN_LABS_API_KEY, TRANSCRIPTION_SEGMENT_SECONDS, TRANSCRIPTION_MIN_SEGMENT_SECONDS,
+    TRANSCRIPTION_SILENCE_DB, TRANSCRIPTION_SILENCE_SECONDS, TRANSCRIPTION_CONCURRENCY, TRANSCRIPTION_RETRIES,
+    TRANSCRIPTION_AUDIO_CODEC, TRANSCRIPTION_BACKEND, TRANSCRIPTION_LOCAL_MAX_SECONDS,
+    WHISPER_MODEL, WHISPER_COMPUTE_TYPE, WHISPER_WORKERS, WHISPER_CPU_THREADS, WHISPER_TIMEOUT
+)
+from utils import extractors
+from utils.extraction_cache import file_sha256, get_cached, store_cached
+from utils.extraction_service import register_worker, terminate_workers
+
+# Инициализация ElevenLabs клиента
+eleven_labs_client = ElevenLabs(api_key=ELEVEN_LABS_API_KEY)
+
+# Сжатые форматы, которые API распознавания принимает без перекодирования (голосовые Telegram - .ogg Opus).
+# WAV тоже поддерживается, но несжатый звук выгоднее один раз перекодировать, чем отправлять целиком
+NATIVE_AUDIO_EXTENSIONS = (".mp3", ".ogg", ".oga", ".opus", ".flac", ".m4a", ".aac", ".webm")
+
+# Движок после BACKEND_FAILURE_LIMIT ошибок подряд считается неисправным на BACKEND_COOLDOWN секунд
+BACKEND_FAILURE_LIMIT = 3
+BACKEND_COOLDOWN = 120
+# Ожидаемое время распознавания секунды записи, пока движок не измерен
+DEFAULT_RTF = {"elevenlabs": 0.15, "local": 0.5}
+
+# Пул процессов локального распознавания: модель загружается в каждом процессе один раз
+_local_executor: Optional[ProcessPoolExecutor] = None
+# Задачи пулов и очереди PID их процессов (для остановки пула с зависшей задачей)
+_local_futures: Dict[Future, ProcessPoolExecutor] = {}
+_local_pids: Dict[ProcessPoolExecutor, Any] = {}
+_local_lock = threading.Lock()
+# Задача отправляется в пул, только когда свободен один из WHISPER_WORKERS процессов,
+# поэтому WHISPER_TIMEOUT отсчитывается от начала распознавания, а не от постановки в очередь
+_local_slots = threading.BoundedSemaphore(max(1, WHISPER_WORKERS))
+
+# Состояние движков: ошибки подряд, время последней ошибки, скользящее среднее RTF
+_health = {name: {"calls": 0, "failures": 0, "last_failure": 0.0, "rtf": None} for name in DEFAULT_RTF}
+_health_lock = threading.Lock()
+
+def format_timestamp(seconds: float) -> str:
+    """Форматирует время в [ЧЧ:]ММ:СС"""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+def plan_segments(duration: float, silences: List[Tuple[float, float]], max_seconds: float, min_seconds: float) -> List[Tuple[float, float]]:
+    """
+    Делит запись на фрагменты не длиннее max_seconds, разрезая ее по паузам
+
+    Фрагмент заканчивается на середине последней паузы, попавшей в окно
+    [min_seconds, max_seconds] от его начала. Если пауз в окне нет (музыка,
+    непрерывная речь), запись режется ровно по max_seconds.
+
+    Args:
+        duration: Длительность записи в секундах
+        silences: Паузы (начало, конец) в секундах
+        max_seconds: Максимальная длительность фрагмента
+        min_seconds: Минимальная длительность фрагмента
+
+    Returns:
+        Список фрагментов (начало, конец) в секундах
+    """
+    cut_points = sorted((start + end) / 2 for start, end in silences)
+    segments = []
+    start = 0.0
+    while duration - start > max_seconds:
+        candidates = [point for point in cut_points if start + min_seconds <= point <= start + max_seconds]
+        end = candidates[-1] if candidates else start + max_seconds
+        segments.append((start, end))
+        start = end
+    segments.append((start, duration))
+    return segments
+
+def _transcribe_elevenlabs(file_path: str, language: Optional[str] = None) -> Dict[str, Any]:
+    """Распознавание через ElevenLabs API"""
+    params = {}
+    if language:
+        params["language"] = language
+
+    # Файл передается открытым: клиент отправляет его с диска потоком, не читая в память
+    with open(file_path, "rb") as audio_file:
+        response = eleven_labs_client.speech_to_text.convert(audio=audio_file, **params)
+    return {"text": response.text, "language": getattr(response, "language_code", language)}
+
+def _get_local_executor() -> ProcessPoolExecutor:
+    """Возвращает пул процессов faster-whisper, создавая его при первом обращении"""
+    global _local_executor
+    with _local_lock:
+        if _local_executor is None:
+            context = multiprocessing.get_context("spawn")
+            pid_queue = context.SimpleQueue()
+            _local_executor = ProcessPoolExecutor(
+                max_workers=WHISPER_WORKERS,
+                mp_context=context,
+                initializer=register_worker,
+                initargs=(pid_queue, extractors.load_whisper_model, WHISPER_MODEL, WHISPER_COMPUTE_TYPE, WHISPER_CPU_THREADS)
+            )
+            _local_pids[_local_executor] = pid_queue
+            logging.info(f"Запущен пул локального распознавания: {WHISPER_WORKERS} x {WHISPER_CPU_THREADS} потоков, модель {WHISPER_MODEL}")
+        return _local_executor
+
+def _retire_local_executor(executor: ProcessPoolExecutor, hung_future: Optional[Future] = None) -> None:
+    """
+    Выводит из работы сломанный пул или пул с зависшей задачей
+
+    Новые задачи сразу уходят в новый пул, а задачи других вызывающих в старом
+    пуле дорабатывают: его процессы завершаются принудительно только после этого.
+    Слот зависшей задачи освобождается, когда ее процесс остановлен.
+    """
+    global _local_executor
+    with _local_lock:
+        if _local_executor is executor:
+            _local_executor = None
+        pid_queue = _local_pids.pop(executor, None)
+        others = [future for future, owner in _local_futures.items() if owner is executor and future is not hung_future]
+
+    def terminate_when_idle():
+        concurrent.futures.wait(others, timeout=WHISPER_TIMEOUT)
+        if pid_queue is not None:
+            terminate_workers(pid_queue)
+        executor.shutdown(wait=False, cancel_futures=True)
+        if hung_future is not None:
+            _local_slots.release()
+
+    threading.Thread(target=terminate_when_idle, daemon=True).start()
+
+def _forget_local_future(future: Future) -> None:
+    """Убирает завершенную задачу из учета задач пулов"""
+    with _local_lock:
+        _local_futures.pop(future, None)
+
+def _transcribe_local(file_path: str, language: Optional[str] = None) -> Dict[str, Any]:
+    """Распознавание локальной моделью faster-whisper в пуле процессов"""
+    _local_slots.acquire()
+    executor = _get_local_executor()
+    future = None
+    try:
+        future = executor.submit(extractors.transcribe_with_whisper, file_path, language)
+        with _local_lock:
+            _local_futures[future] = executor
+        future.add_done_callback(_forget_local_future)
+        result = future.result(timeout=WHISPER_TIMEOUT)
+    except concurrent.futures.TimeoutError:
+        # Слот освободится, когда процесс с зависшей задачей будет остановлен
+        _retire_local_executor(executor, future)
+        raise
+    except BrokenProcessPool:
+        _retire_local_executor(executor)
+        _local_slots.release()
+        raise
+    except Exception:
+        _local_slots.release()
+        raise
+    _local_slots.release()
+    return result
+
+# Движки распознавания речи: имя -> функция (путь к файлу, язык) -> {text, language}
+TRANSCRIPTION_BACKENDS: Dict[str, Callable[[str, Optional[str]], Dict[str, Any]]] = {
+    "elevenlabs": _transcribe_elevenlabs,
+    "local": _transcribe_local
+}
+
+def available_backends() -> List[str]:
+    """Возвращает движки распознавания, которые можно использовать"""
+    names = ["elevenlabs"]
+    if importlib.util.find_spec("faster_whisper") is not None:
+        names.append("local")
+    return names
+
+def is_backend_healthy(name: str) -> bool:
+    """Проверяет, не отключен ли движок после серии ошибок"""
+    with _health_lock:
+        state = _health[name]
+        return state["failures"] < BACKEND_FAILURE_LIMIT or time.time() - state["last_failure"] > BACKEND_COOLDOWN
+
+def _record_result(name: str, success: bool, seconds: float = 0.0, audio_seconds: float = 0.0) -> None:
+    """Учитывает результат вызова движка в его состоянии"""
+    with _health_lock:
+        state = _health[name]
+        state["calls"] += 1
+        if not success:
+            state["failures"] += 1
+            state["last_failure"] = time.time()
+            return
+        state["failures"] = 0
+        if audio_seconds > 0:
+            rtf = seconds / audio_seconds
+            state["rtf"] = rtf if state["rtf"] is None else 0.7 * state["rtf"] + 0.3 * rtf
+
+def choose_backend(duration: float, avoid: Optional[str] = None) -> str:
+    """
+    Выбирает движок распознавания для записи
+
+    В режиме auto короткие голосовые уходят локальной модели (без сетевой
+    задержки и очереди API), а длинные записи - исправному движку с меньшим
+    ожидаемым временем распознавания.
+
+    Args:
+        duration: Длительность записи в секундах
+        avoid: Движок, который только что завершился ошибкой (при повторе выбирается другой)
+
+    Returns:
+        Имя движка из TRANSCRIPTION_BACKENDS
+    """
+    available = available_backends()
+    if TRANSCRIPTION_BACKEND != "auto":
+        if TRANSCRIPTION_BACKEND in available:
+            return TRANSCRIPTION_BACKEND
+        logging.warning(f"Движок распознавания {TRANSCRIPTION_BACKEND!r} недоступен, используется elevenlabs")
+        return "elevenlabs"
+
+    candidates = [name for name in available if name != avoid and is_backend_healthy(name)]
+    if not candidates:
+        return avoid if avoid in available else "elevenlabs"
+    if "local" in candidates and 0 < duration <= TRANSCRIPTION_LOCAL_MAX_SECONDS:
+        return "local"
+
+    with _health_lock:
+        expected = {name: _health[name]["rtf"] or DEFAULT_RTF[name] for name in candidates}
+    return min(candidates, key=expected.get)
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Проверяет, имеет ли смысл повторять запрос после ошибки
+
+    Ошибки запроса (4xx: неверный файл, ключ API, квота) при повторе не исчезнут,
+    кроме таймаута (408) и ограничения частоты запросов (429).
+
+    Args:
+        error: Исключение движка распознавания
+
+    Returns:
+        True для сетевых ошибок, ошибок сервера и таймаутов
+    """
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int) and 400 <= status < 500:
+        return status in (408, 429)
+    return not isinstance(error, (FileNotFoundError, PermissionError, ValueError))
+
+def transcribe_segment(file_path: str, language: Optional[str] = None, duration: float = 0.0, backend: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Отправляет один фрагмент на распознавание, повторяя запрос при временных ошибках
+
+    При повторе в режиме auto выбирается другой исправный движок, если он есть.
+
+    Args:
+        file_path: Путь к фрагменту
+        language: Код языка (опционально)
+        duration: Длительность фрагмента в секундах (для выбора движка и учета RTF)
+        backend: Движок первой попытки (по умолчанию - choose_backend)
+
+    Returns:
+        Словарь {text, language, backend}
+    """
+    name = backend or choose_backend(duration)
+    for attempt in range(TRANSCRIPTION_RETRIES + 1):
+        start = time.perf_counter()
+        try:
+            result = TRANSCRIPTION_BACKENDS[name](file_path, language)
+            _record_result(name, True, time.perf_counter() - start, duration)
+            result["backend"] = name
+            return result
+        except Exception as e:
+            _record_result(name, False)
+            if attempt == TRANSCRIPTION_RETRIES or not is_transient_error(e):
+                raise
+            delay = 2 ** attempt
+            logging.warning(f"Ошибка распознавания {os.path.basename(file_path)} движком {name} (попытка {attempt + 1}), повтор через {delay} с: {e}")
+            time.sleep(delay)
+            name = choose_backend(duration, avoid=name)
+
+def get_transcription_stats() -> Dict[str, Any]:
+    """
+    Возвращает состояние движков распознавания
+
+    Returns:
+        Словарь {движок: {calls, failures, rtf, healthy}}
+    """
+    with _health_lock:
+        stats = {name: dict(state) for name, state in _health.items()}
+    for name, state in stats.items():
+        state.pop("last_failure")
+        state["healthy"] = is_backend_healthy(name)
+    return stats
+
+def shutdown_transcription_service() -> None:
+    """Останавливает пул локального распознавания"""
+    global _local_executor
+    with _local_lock:
+        if _local_executor is not None:
+            _local_executor.shutdown(wait=False, cancel_futures=True)
+            _local_pids.pop(_local_executor, None)
+            _local_executor = None
+
+def prepare_audio(file_path: str, work_dir: str) -> str:
+    """
+    Возвращает файл для отправки на распознавание
+
+    Форматы, которые API принимает сам, отправляются как есть, остальные
+    один раз перекодируются в моно 16 кГц (TRANSCRIPTION_AUDIO_CODEC).
+
+    Args:
+        file_path: Путь к исходному файлу
+        work_dir: Директория для временных файлов
+
+    Returns:
+        Путь к исходному или перекодированному файлу
+    """
+    if os.path.splitext(file_path)[1].lower() in NATIVE_AUDIO_EXTENSIONS:
+        return file_path
+    return extractors.normalize_audio(file_path, os.path.join(work_dir, "normalized"), TRANSCRIPTION_AUDIO_CODEC)
+
+def _transcribe_planned_segment(
+    audio_path: str, work_dir: str, index: int, start: float, end: float, whole: bool, language: Optional[str], backend: str
+) -> Dict[str, Any]:
+    """Вырезает фрагмент записи (без перекодирования) и распознает его"""
+    if whole:
+        return transcribe_segment(audio_path, language, end - start, backend)
+
+    segment_path = os.path.join(work_dir, f"{index:04d}{os.path.splitext(audio_path)[1]}")
+    extractors.cut_audio_segment(audio_path, segment_path, start, end - start)
+    try:
+        return transcribe_segment(segment_path, language, end - start, backend)
+    finally:
+        os.remove(segment_path)
+
+def transcribe_long_audio(
+    file_path: str,
+    language: Optional[str] = None,
+    on_segment: Optional[Callable[[Dict[str, Any], int, int], None]] = None
+) -> Dict[str, Any]:
+    """
+    Транскрибирует запись любой длины по фрагментам
+
+    Запись приводится к формату, который принимает API (см. prepare_audio),
+    и делится по паузам на фрагменты до TRANSCRIPTION_SEGMENT_SECONDS,
+    которые вырезаются и распознаются параллельно (не более
+    TRANSCRIPTION_CONCURRENCY одновременно). Ошибка одного фрагмента не
+    теряет остальные: фрагмент повторяется, а при окончательной неудаче
+    в тексте остается отметка о пропуске. Движок распознавания выбирается
+    для записи один раз (см. choose_backend).
+
+    Args:
+        file_path: Путь к файлу
+        language: Код языка (опционально, авто-определение если не указан)
+        on_segment: Вызывается для каждого готового фрагмента строго по порядку:
+            on_segment(фрагмент, номер готового фрагмента с 1, всего фрагментов)
+
+    Returns:
+        Словарь {text, segments: [{start, end, text, backend, error}], duration, language}
+    """
+    work_dir = tempfile.mkdtemp(prefix="transcription_", dir=os.path.dirname(file_path) or None)
+    try:
+        audio_path = prepare_audio(file_path, work_dir)
+        duration = extractors.probe_audio_duration(audio_path)
+        silences = []
+        if duration > TRANSCRIPTION_SEGMENT_SECONDS:
+            silences = extractors.detect_silences(audio_path, TRANSCRIPTION_SILENCE_DB, TRANSCRIPTION_SILENCE_SECONDS)
+        # Если длительность неизвестна, отправляем запись одним фрагментом
+        plan = plan_segments(duration, silences, TRANSCRIPTION_SEGMENT_SECONDS, TRANSCRIPTION_MIN_SEGMENT_SECONDS)
+        backend = choose_backend(duration)
+        logging.info(f"Аудио {os.path.basename(file_path)} ({format_timestamp(duration)}): фрагментов {len(plan)}, движок {backend}")
+
+        segments: List[Optional[Dict[str, Any]]] = [None] * len(plan)
+        detected_language = language
+        with ThreadPoolExecutor(max_workers=max(1, TRANSCRIPTION_CONCURRENCY)) as executor:
+            futures = {
+                executor.submit(_transcribe_planned_segment, audio_path, work_dir, index, start, end, len(plan) == 1, language, backend): index
+                for index, (start, end) in enumerate(plan)
+            }
+            next_index = 0
+            for future in as_completed(futures):
+                index = futures[future]
+                start, end = plan[index]
+                try:
+                    result = future.result()
+                    segments[index] = {"start": start, "end": end, "text": result["text"].strip(), "backend": result["backend"], "error": None}
+                    detected_language = detected_language or result.get("language")
+                except Exception as e:
+                    logging.error(f"Не удалось распознать фрагмент {format_timestamp(start)}-{format_timestamp(end)}: {e}")
+                    segments[index] = {"start": start, "end": end, "text": "", "backend": None, "error": str(e)}
+
+                # Готовые фрагменты отдаем по порядку, не дожидаясь всей записи
+                while next_index < len(plan) and segments[next_index] is not None:
+                    if on_segment:
+                        on_segment(segments[next_index], next_index + 1, len(plan))
+                    next_index += 1
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "text": stitch_segments(segments),
+        "segments": segments,
+        "duration": duration,
+        "language": detected_language
+    }
+
+def _transcript_kind(language: Optional[str]) -> str:
+    """Вид записи кэша для транскрипции на языке (auto - с авто-определением)"""
+    return f"transcript-{language or 'auto'}"
+
+def transcribe_cached(
+    file_path: str,
+    language: Optional[str] = None,
+    on_segment: Optional[Callable[[Dict[str, Any], int, int], None]] = None
+) -> Dict[str, Any]:
+    """
+    Транскрибирует запись, используя кэш по хэшу содержимого и языку
+
+    Одна и та же запись (повторный вопрос, пересланное голосовое, тот же файл
+    под другим именем) распознается один раз. Транскрипция хранится вместе
+    с фрагментами и их метками времени. Транскрипция на выбранном языке
+    подходит и для запроса с авто-определением языка.
+
+    Args:
+        file_path: Путь к файлу
+        language: Код языка (опционально, авто-определение если не указан)
+        on_segment: Вызывается для каждого готового фрагмента по порядку (только при распознавании)
+
+    Returns:
+        Результат transcribe_long_audio с полями content_hash и cached
+    """
+    content_hash = file_sha256(file_path)
+    kind = _transcript_kind(language)
+
+    cached = get_cached(content_hash, kind)
+    if cached is not None:
+        logging.info(f"Транскрипция {os.path.basename(file_path)} взята из кэша ({content_hash[:12]}, {kind})")
+        cached["cached"] = True
+        return cached
+
+    result = transcribe_long_audio(file_path, language, on_segment)
+    result["content_hash"] = content_hash
+    result["cached"] = False
+
+    # Транскрипцию с нераспознанными фрагментами не кэшируем, чтобы можно было повторить попытку
+    if result["text"] and not any(segment["error"] for segment in result["segments"]):
+        store_cached(content_hash, result, kind)
+        if language and get_cached(content_hash, _transcript_kind(None)) is None:
+            store_cached(content_hash, result, _transcript_kind(None))
+    return result
+
+def stitch_segments(segments: List[Dict[str, Any]]) -> str:
+    """
+    Склеивает фрагменты в одну транскрипцию с метками времени
+
+    Args:
+        segments: Фрагменты по порядку
+
+    Returns:
+        Текст транскрипции (для записи из одного фрагмента - без меток)
+    """
+    if len(segments) == 1:
+        return segments[0]["text"]
+    return "\n\n".join(format_segment(segment) for segment in segments)
+
+def format_segment(segment: Dict[str, Any]) -> str:
+    """Текст фрагмента с меткой времени начала (или отметка о пропуске)"""
+    if segment.get("error"):
+        return f"[{format_timestamp(segment['start'])}-{format_timestamp(segment['end'])}] (фрагмент не распознан)"
+    return f"[{format_timestamp(segment['start'])}] {segment['text']}"
@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import UPLOAD_INDEX_DIR, UPLOAD_INDEX_MAX_ENTRIES
+from utils.json_store import write_json_atomic, evict_lru
+
+# Загруженные файлы: file_unique_id Telegram -> сведения о сохраненном файле и результатах его обработки.
+# Каждая запись хранится в своем файле, поэтому обновление одной загрузки не переписывает весь индекс
+_uploads_lock = threading.Lock()
+
+def _entry_path(file_unique_id: str) -> str:
+    """Возвращает путь к записи индекса (file_unique_id состоит из символов, допустимых в имени файла)"""
+    return os.path.join(UPLOAD_INDEX_DIR, f"{os.path.basename(file_unique_id)}.json")
+
+def _read(file_unique_id: str) -> Optional[Dict[str, Any]]:
+    """Читает запись индекса с диска"""
+    path = _entry_path(file_unique_id)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.error(f"Ошибка при чтении записи индекса загрузок {path}: {e}")
+        return None
+
+def _write(file_unique_id: str, entry: Dict[str, Any]) -> None:
+    """Сохраняет запись индекса на диск"""
+    path = _entry_path(file_unique_id)
+    try:
+        write_json_atomic(path, entry)
+    except Exception as e:
+        logging.error(f"Ошибка при сохранении записи индекса загрузок {path}: {e}")
+
+def _remove(file_unique_id: str) -> None:
+    """Удаляет запись индекса"""
+    try:
+        os.remove(_entry_path(file_unique_id))
+    except FileNotFoundError:
+        pass
+
+def _evict(max_entries: int = UPLOAD_INDEX_MAX_ENTRIES) -> int:
+    """
+    Удаляет давно не использовавшиеся записи сверх лимита
+
+    Args:
+        max_entries: Максимальное количество записей
+
+    Returns:
+        Количество удаленных записей
+    """
+    removed, _ = evict_lru(UPLOAD_INDEX_DIR, max_entries=max_entries)
+    if removed:
+        logging.info(f"Из индекса загрузок удалено записей: {removed}")
+    return removed
+
+def get_upload(file_unique_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Возвращает сведения о ранее загруженном файле
+
+    Args:
+        file_unique_id: Постоянный идентификатор файла в Telegram
+
+    Returns:
+        Запись или None, если файл не загружался, удален или изменен на диске
+    """
+    if not file_unique_id:
+        return None
+
+    with _uploads_lock:
+        entry = _read(file_unique_id)
+        if entry is None:
+            return None
+        # Временные файлы могли быть удалены или заменены - такую запись считаем устаревшей
+        file_path = entry.get("file_path", "")
+        if not os.path.exists(file_path) or os.path.getsize(file_path) != entry.get("file_size"):
+            _remove(file_unique_id)
+            return None
+        # Обновляем время изменения - по нему работает вытеснение давно не используемых записей
+        os.utime(_entry_path(file_unique_id), None)
+        return entry
+
+def register_upload(file_unique_id: str, file_path: str, file_name: str, file_type: str) -> None:
+    """
+    Запоминает сохраненный на диск файл
+
+    Args:
+        file_unique_id: Постоянный идентификатор файла в Telegram
+        file_path: Путь к сохраненному файлу
+        file_name: Имя файла, под которым его прислал пользователь
+        file_type: Тип файла
+    """
+    if not file_unique_id:
+        return
+
+    with _uploads_lock:
+        _write(file_unique_id, {
+            "file_path": file_path,
+            "file_name": file_name,
+            "file_type": file_type,
+            "file_size": os.path.getsize(file_path),
+            "content_hash": None,
+            "documents": {},
+            "transcriptions": {},
+            "analyses": {}
+        })
+        _evict()
+
+def update_upload(file_unique_id: str, section: Optional[str] = None, key: Optional[str] = None, value: Any = None, **fields) -> None:
+    """
+    Дополняет запись о загрузке результатами обработки
+
+    Args:
+        file_unique_id: Постоянный идентификатор файла в Telegram
+        section: Раздел записи (documents, transcriptions, analyses)
+        key: Ключ внутри раздела (ID проекта, язык, вид анализа)
+        value: Сохраняемое значение
+        **fields: Поля записи верхнего уровня (например, content_hash)
+    """
+    if not file_unique_id:
+        return
+
+    with _uploads_lock:
+        entry = _read(file_unique_id)
+        if entry is None:
+            return
+        entry.update(fields)
+        if section and key is not None:
+            entry.setdefault(section, {})[str(key)] = value
+        _write(file_unique_id, entry)